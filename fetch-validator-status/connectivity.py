@@ -0,0 +1,119 @@
+def bft_quorum(node_count: int) -> int:
+    """The number of nodes needed to order transactions; n - f, where f is
+    the number of faulty nodes the pool tolerates."""
+    return node_count - (node_count - 1) // 3
+
+
+class ConnectivityMatrix(object):
+    """Which nodes of a pool can reach each other, as reported by the nodes in
+    their Pool_info.  Each row of the matrix is an int used as a bitset, bit j
+    of row i being set when node i lists node j as unreachable, so the whole
+    matrix of a 1000 node pool is a thousand ints and a row is combined with
+    another in a single operation.
+
+    Two nodes are linked when neither lists the other as unreachable; both
+    directions are needed for consensus.  Nodes that did not report (i.e.
+    timed out) are silent; nothing is known of their links, so they aren't
+    taken to be linked to any node, but they still count towards the size of
+    the pool, and so its quorum.  The partitions of the pool are the
+    connected components of the nodes that reported.
+    """
+
+    def __init__(self, nodes: list):
+        self.nodes = list(nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.all = (1 << len(self.nodes)) - 1
+        self.unreachable = [0] * len(self.nodes)
+        # The transpose; the nodes that list each node as unreachable.
+        self.listed_by = [0] * len(self.nodes)
+        # The nodes that reported their unreachable nodes.
+        self.reported = 0
+
+    @classmethod
+    def from_unreachable(cls, unreachable: dict, nodes: list = ()):
+        """Build the matrix from the unreachable nodes listed by each node.
+        nodes are all of the nodes of the pool, those that didn't report
+        included; nodes that are only listed by other nodes are added."""
+        names = list(nodes)
+        known = set(names)
+        for node, unreachable_nodes in unreachable.items():
+            for name in [node] + list(unreachable_nodes):
+                if name not in known:
+                    known.add(name)
+                    names.append(name)
+        matrix = cls(names)
+        for node, unreachable_nodes in unreachable.items():
+            matrix.set_unreachable(node, unreachable_nodes)
+        return matrix
+
+    def set_unreachable(self, node: str, unreachable_nodes: list):
+        i = self.index[node]
+        bit = 1 << i
+        if self.unreachable[i]:
+            self.set_listed_by(self.unreachable[i], bit, False)
+        mask = 0
+        for name in unreachable_nodes:
+            j = self.index.get(name)
+            if j is not None:
+                mask |= 1 << j
+                self.listed_by[j] |= bit
+        self.unreachable[i] = mask
+        self.reported |= bit
+
+    def set_listed_by(self, mask: int, bit: int, listed: bool):
+        while mask:
+            low = mask & -mask
+            j = low.bit_length() - 1
+            self.listed_by[j] = (self.listed_by[j] | bit) if listed else (self.listed_by[j] & ~bit)
+            mask ^= low
+
+    def links(self) -> list:
+        """The linked nodes of every node, as bitsets.  A silent node is only
+        linked to itself."""
+        reported = self.reported
+        return [(reported & ~(unreachable | listed_by)) if (reported >> i) & 1 else (1 << i) for i, (unreachable, listed_by) in enumerate(zip(self.unreachable, self.listed_by))]
+
+    def components(self) -> list:
+        """The connected components of the nodes that reported, as lists of
+        node names, largest first."""
+        links = self.links()
+        remaining = self.reported
+        components = []
+        while remaining:
+            component = frontier = remaining & -remaining
+            while frontier:
+                reached = 0
+                while frontier:
+                    low = frontier & -frontier
+                    reached |= links[low.bit_length() - 1]
+                    frontier ^= low
+                frontier = reached & ~component
+                component |= frontier
+            remaining &= ~component
+            components.append(self.names(component))
+        components.sort(key=len, reverse=True)
+        return components
+
+    def names(self, bits: int) -> list:
+        names = []
+        while bits:
+            low = bits & -bits
+            names.append(self.nodes[low.bit_length() - 1])
+            bits ^= low
+        return names
+
+    def partitions(self) -> dict:
+        """The partitions of the pool and whether each of them still holds
+        a BFT quorum (n - f) of the pool's nodes, the silent nodes included.
+        has_quorum is None when none of the nodes reported."""
+        quorum = bft_quorum(len(self.nodes))
+        partitions = [{"nodes": component, "size": len(component), "quorum": len(component) >= quorum} for component in self.components()]
+        silent = self.all & ~self.reported
+        return {
+            "nodes": len(self.nodes),
+            "quorum": quorum,
+            "silent": self.names(silent),
+            "partitioned": len(partitions) > 1,
+            "has_quorum": any(partition["quorum"] for partition in partitions) if self.reported else None,
+            "partitions": partitions,
+        }
@@ -0,0 +1,110 @@
+import asyncio
+import collections
+import os
+import socket
+import sys
+import time
+import urllib.parse
+
+ENDPOINTS = (("client", "client_addr"), ("node", "node_addr"))
+
+
+class EndpointProber(object):
+    """Checks that the client and node addresses of a pool's nodes, as listed
+    by get_verifiers, accept TCP connections, so a node that doesn't reply can
+    be told apart as a host or port that is down rather than a problem with
+    the node itself.
+
+    Every address is probed at the same time, at most concurrency at once
+    across all of the networks, and each connection is given timeout seconds.
+    The connect times of each address are kept across polls, the last window
+    of them, and their percentiles are reported along with how many of the
+    probes succeeded (availability).  The time spent waiting for a turn isn't
+    counted.
+    """
+
+    def __init__(self, concurrency: int = 100, timeout: float = 3, window: int = 100, verbose: bool = False):
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.window = window
+        self.verbose = verbose
+        # Created on first use, on the loop that runs the probes.
+        self.semaphore = None
+        # The connect times of each (network, node, endpoint); None for a failed probe.
+        self.samples = {}
+
+    async def probe_nodes(self, network_name: str, verifiers: dict, nodes: list = None) -> dict:
+        """Probe the endpoints of the given nodes (or all of them); returns
+        {node: {"client": {...}, "node": {...}}}."""
+        probes = []
+        for node in (verifiers if nodes is None else nodes):
+            for endpoint, key in ENDPOINTS:
+                address = verifiers.get(node, {}).get(key)
+                if address:
+                    probes.append((node, endpoint, address))
+        results = await asyncio.gather(*[self.probe(network_name, node, endpoint, address) for node, endpoint, address in probes])
+        probed = {}
+        for (node, endpoint, _), result in zip(probes, results):
+            probed.setdefault(node, {})[endpoint] = result
+        return probed
+
+    async def probe(self, network_name: str, node: str, endpoint: str, address: str) -> dict:
+        result = {"address": address, "reachable": False}
+        try:
+            host, port = split_address(address)
+        except ValueError:
+            result["error"] = "Invalid address"
+            return result
+
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        latency = None
+        async with self.semaphore:
+            started = time.perf_counter()
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.timeout)
+                latency = time.perf_counter() - started
+                writer.close()
+            except asyncio.TimeoutError:
+                result["error"] = "No connection after {0}s".format(self.timeout)
+            except socket.gaierror as e:
+                # The host name didn't resolve; its (negative) errno isn't one os.strerror knows.
+                result["error"] = str(e)
+            except OSError as e:
+                # i.e. "Connection refused", rather than asyncio's "Connect call failed (...)".
+                result["error"] = os.strerror(e.errno) if e.errno else str(e)
+
+        samples = self.samples.get((network_name or "pool", node, endpoint))
+        if samples is None:
+            samples = self.samples[(network_name or "pool", node, endpoint)] = collections.deque(maxlen=self.window)
+        samples.append(latency)
+        result["reachable"] = latency is not None
+        if latency is not None:
+            result["latency"] = round(latency, 6)
+        else:
+            self.log(f"Unable to connect to the {endpoint} address of '{node}', {address}: {result['error']}")
+        result.update(self.get_stats(samples))
+        return result
+
+    @staticmethod
+    def get_stats(samples) -> dict:
+        latencies = sorted(latency for latency in samples if latency is not None)
+        stats = {"availability": round(len(latencies) / len(samples), 3)}
+        if latencies:
+            for percent in (50, 95, 99):
+                stats[f"p{percent}"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))], 6)
+        return stats
+
+    def log(self, *args):
+        if self.verbose:
+            print(*args, "\n", file=sys.stderr)
+
+
+def split_address(address: str):
+    """An address as listed by get_verifiers, 'tcp://host:port' (or
+    'tcp://[v6 host]:port'), as (host, port).  The scheme may be left out."""
+    url = urllib.parse.urlsplit(address if "://" in address else "tcp://" + address)
+    # url.port raises ValueError for a port that isn't a number.
+    if not url.hostname or url.port is None:
+        raise ValueError(address)
+    return url.hostname, url.port
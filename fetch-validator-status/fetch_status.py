@@ -1,10 +1,14 @@
 import argparse
 import asyncio
+import atexit
+import cProfile
 # import base58
 # import base64
 import json
 import os
 import sys
+import time
+import tracemalloc
 # import datetime
 import urllib.request
 # from typing import Tuple
@@ -17,12 +21,21 @@ from indy_vdr.ledger import (
     build_get_txn_request,
     # Request,
 )
-from indy_vdr.pool import open_pool
 from plugin_collection import PluginCollection
-# import time
+from pool_collection import PoolCollection
+from node_latency import LatencyTracker
+from ledger_crawler import LEDGERS, LedgerCrawler, CrawlError
+from genesis_cache import GenesisCache
+from timings import timings
+import serialization
 from DidKey import DidKey
 
 verbose = False
+genesis_cache = None
+compact = False
+fields = []
+capture_dir = None
+latency_tracker = None
 
 
 def log(*args):
@@ -30,52 +43,269 @@ def log(*args):
         print(*args, "\n", file=sys.stderr)
 
 
-async def fetch_status(genesis_path: str, nodes: str = None, ident: DidKey = None, network_name: str = None):
+async def fetch_status(monitor_plugins: PluginCollection, pool, nodes: str = None, ident: DidKey = None, network_name: str = None):
     # Start Of Engine
-    attempt = 3
-    while attempt:
+    result = []
+    verifiers = {}
+
+    request = build_request(ident)
+
+    from_nodes = []
+    if nodes:
+        from_nodes = nodes.split(",")
+    if latency_tracker:
+        # The nodes are queried one by one, so each gets its own timeout.  That needs the list of nodes up front.
         try:
-            pool = await open_pool(transactions_path=genesis_path)
-        except:
-            log("Pool Timed Out! Trying again...")
-            if not attempt:
-                print("Unable to get pool Response! 3 attempts where made. Exiting...")
-                exit()
-            attempt -= 1
-            continue
-        break
+            with timings.phase(f"{network_name or 'pool'}/get_verifiers"):
+                verifiers = await pool.get_verifiers()
+        except AttributeError:
+            pass
+    if latency_tracker and (from_nodes or verifiers):
+        with timings.phase(f"{network_name or 'pool'}/submit_action"):
+            replies = await asyncio.gather(*[query_node(pool, node, ident, network_name) for node in (from_nodes or list(verifiers.keys()))])
+        response = dict(replies)
+    else:
+        with timings.phase(f"{network_name or 'pool'}/submit_action"):
+            response = await pool.submit_action(request, node_aliases = from_nodes)
+        try:
+            # Introduced in https://github.com/hyperledger/indy-vdr/commit/ce0e7c42491904e0d563f104eddc2386a52282f7
+            with timings.phase(f"{network_name or 'pool'}/get_verifiers"):
+                verifiers = await pool.get_verifiers()
+        except AttributeError:
+            pass
+    # End Of Engine
 
-    result = []
+    if capture_dir:
+        capture_response(network_name, response, verifiers)
+
+    result = await monitor_plugins.apply_all_plugins_on_value(result, network_name, response, verifiers)
+    return result
+
+
+async def fetch_status_stream(monitor_plugins: PluginCollection, pool, nodes: str = None, ident: DidKey = None, network_name: str = None):
+    """Query every node on its own and analyze and emit each node's reply as
+    soon as it arrives, so a slow node doesn't hold back the others.  The
+    cross node checks are emitted as a final summary record.
+    """
     verifiers = {}
+    try:
+        with timings.phase(f"{network_name or 'pool'}/get_verifiers"):
+            verifiers = await pool.get_verifiers()
+    except AttributeError:
+        pass
+
+    if nodes:
+        from_nodes = nodes.split(",")
+    elif verifiers:
+        from_nodes = list(verifiers.keys())
+    else:
+        # Without get_verifiers there is no way to list the nodes up front.
+        result = await fetch_status(monitor_plugins, pool, nodes, ident, network_name)
+        for entry in result:
+            emit_record(network_name, entry)
+        return
+
+    analysis = monitor_plugins.get_plugin("Analysis")
+    pool_data = analysis.new_pool_data()
+    response = {}
+    result = []
+
+    async def query_and_probe(node: str):
+        # The node's endpoints are probed (--probe) while it is queried.
+        (node, reply), probes = await asyncio.gather(query_node(pool, node, ident, network_name), analysis.probe_endpoints(network_name, verifiers, [node]))
+        return node, reply, probes.get(node)
+
+    for next_reply in asyncio.as_completed([query_and_probe(node) for node in from_nodes]):
+        node, reply, probe = await next_reply
+        response[node] = reply
+        entry = await analysis.analyze_node(node, reply, verifiers, None, pool_data, probe)
+        # Sinks only see the complete result, once all of the nodes have replied.
+        node_result = await monitor_plugins.apply_all_plugins_on_value([entry], network_name, {node: reply}, verifiers, exclude = [analysis], run_sinks = False)
+        for entry in node_result:
+            emit_record(network_name, entry)
+        result.extend(node_result)
+
+    emit_record(network_name, await analysis.summarize(pool_data, network_name, from_nodes))
+    if capture_dir:
+        capture_response(network_name, response, verifiers)
+    # The transforms already ran on every node as it replied; summarize() merged the findings of the cross node checks into the same entries.
+    order = {node: i for i, node in enumerate(from_nodes)}
+    result.sort(key=lambda entry: order.get(entry.get("name"), len(order)))
+    await monitor_plugins.apply_all_sinks_on_value(result, network_name, response, verifiers, exclude = [analysis])
+
 
+async def query_node(pool, node: str, ident: DidKey = None, network_name: str = None):
+    """Query a single node, with an adaptive timeout and hedging when
+    --adaptive-timeouts is on.  Returns the node name and its reply."""
+    async def send():
+        response = await pool.submit_action(build_request(ident), node_aliases = [node])
+        return response.get(node, "timeout")
+
+    started = time.perf_counter()
+    try:
+        if latency_tracker:
+            reply = await latency_tracker.submit(network_name, node, send)
+        else:
+            reply = await send()
+    except Exception as e:
+        return node, str(e)
+    finally:
+        timings.node_latency(network_name, node, time.perf_counter() - started)
+    return node, reply
+
+
+def build_request(ident: DidKey = None):
     if ident:
         request = build_get_validator_info_request(ident.did)
         ident.sign_request(request)
     else:
         request = build_get_txn_request(None, 1, 1)
+    return request
 
-    from_nodes = []
-    if nodes:
-        from_nodes = nodes.split(",")
-    response = await pool.submit_action(request, node_aliases = from_nodes)
+
+def capture_response(network_name: str, response: dict, verifiers: dict):
+    """Record the raw pool response and verifiers so the run can be replayed
+    offline with --replay."""
+    captured_at = time.time()
+    safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in (network_name or "pool"))
+    capture_path = os.path.join(capture_dir, "{0}-{1}{2:03d}.json".format(safe_name, time.strftime("%Y%m%dT%H%M%S", time.gmtime(captured_at)), int(captured_at * 1000) % 1000))
+    os.makedirs(capture_dir, exist_ok=True)
+    with open(capture_path, "w") as capture_file:
+        capture_file.write(serialization.dumps({
+            "network": network_name,
+            "captured_at": captured_at,
+            "response": response,
+            "verifiers": verifiers,
+        }))
+    log(f"Response captured to {capture_path}")
+
+
+def load_capture(capture_path: str) -> dict:
+    with open(capture_path) as capture_file:
+        capture = serialization.loads(capture_file.read())
+    if "response" not in capture:
+        raise ValueError(f"'{capture_path}' is not a captured response.")
+    return capture
+
+
+async def replay_captures(monitor_plugins: PluginCollection, capture_paths: list):
+    """Feed captured responses through the plug-ins, without a pool."""
+    results = {}
+    for capture_path in capture_paths:
+        capture = load_capture(capture_path)
+        with timings.phase(f"{capture['network'] or 'pool'}/replay"):
+            results[capture_path] = await monitor_plugins.apply_all_plugins_on_value([], capture["network"], capture["response"], capture.get("verifiers") or {})
+    return results
+
+
+def emit_record(network_name: str, record: dict):
+    if fields and ("summary" not in record):
+        record = serialization.project(record, fields)
+    print(serialization.dumps({"network": network_name, **record}, compact = True), flush=True)
+
+
+async def fetch_network_status(monitor_plugins: PluginCollection, pools: PoolCollection, target: dict, nodes: str = None, ident: DidKey = None, stream: bool = False):
     try:
-        # Introduced in https://github.com/hyperledger/indy-vdr/commit/ce0e7c42491904e0d563f104eddc2386a52282f7
-        verifiers = await pool.get_verifiers()
-    except AttributeError:
-        pass
-    # End Of Engine
+        if target["genesis_url"]:
+            # The download blocks, so run it off the event loop to keep the other networks moving.
+            # Within the cache TTL this doesn't touch the network at all.
+            with timings.phase(f"{target['name'] or 'pool'}/download_genesis_file"):
+                await asyncio.get_event_loop().run_in_executor(None, download_genesis_file, target["genesis_url"], target["genesis_path"], target["id"])
+        with timings.phase(f"{target['name'] or 'pool'}/open_pool"):
+            pool = await pools.get_pool(target["id"], target["genesis_path"])
+    except Exception as e:
+        log("Unable to open the pool for '{0}': {1}".format(target["name"], e))
+        return network_error(target, e, stream)
+
+    try:
+        if stream:
+            return await fetch_status_stream(monitor_plugins, pool, nodes, ident, target["name"])
+        return await fetch_status(monitor_plugins, pool, nodes, ident, target["name"])
+    except Exception as e:
+        # The pool is refreshed on the next poll.
+        log("Unable to get a response from '{0}': {1}".format(target["name"], e))
+        pools.reset(target["id"])
+        return network_error(target, e, stream)
+
+
+def network_error(target: dict, error: Exception, stream: bool = False):
+    result = {"error": "Unable to get pool response: {0}".format(error)}
+    if stream:
+        emit_record(target["name"], result)
+    return result
+
+
+async def fetch_all_networks_status(monitor_plugins: PluginCollection, pools: PoolCollection, targets: list, nodes: str = None, ident: DidKey = None, stream: bool = False):
+    results = await asyncio.gather(*[fetch_network_status(monitor_plugins, pools, target, nodes, ident, stream) for target in targets])
+    return dict(zip([target["id"] for target in targets], results))
+
+
+async def run_daemon(monitor_plugins: PluginCollection, pools: PoolCollection, targets: list, interval: int, nodes: str = None, ident: DidKey = None, keyed: bool = False, stream: bool = False):
+    loop = asyncio.get_event_loop()
+    while True:
+        started = loop.time()
+        results = await fetch_all_networks_status(monitor_plugins, pools, targets, nodes, ident, stream)
+        print_results(results if keyed else results[targets[0]["id"]], stream)
+        elapsed = loop.time() - started
+        log("Poll completed in {0:.2f}s, next poll in {1:.2f}s ...".format(elapsed, max(0, interval - elapsed)))
+        timings.dump()
+        timings.reset()
+        await asyncio.sleep(max(0, interval - elapsed))
 
-    result = await monitor_plugins.apply_all_plugins_on_value(result, network_name, response, verifiers)
-    print(json.dumps(result, indent=2))
+
+def start_daemon(daemon, pools: PoolCollection):
+    try:
+        asyncio.get_event_loop().run_until_complete(daemon)
+    except KeyboardInterrupt:
+        log("Stopping daemon ...")
+    finally:
+        pools.close()
+    exit()
+
+
+def write_diagnostics(profiler: cProfile.Profile = None, profile_path: str = None, trace_memory_path: str = None):
+    timings.dump()
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+        log(f"Profile written to {profile_path}")
+    if trace_memory_path and tracemalloc.is_tracing():
+        with open(trace_memory_path, "w") as trace_file:
+            for stat in tracemalloc.take_snapshot().statistics("lineno")[:50]:
+                print(stat, file=trace_file)
+        log(f"Memory trace written to {trace_memory_path}")
+
+
+def print_results(results, stream: bool = False):
+    # In stream mode the records have already been emitted as they arrived.
+    if not stream:
+        print(serialization.dumps(serialization.project(results, fields), compact = compact), flush=True)
+
+
+def get_network_target(net_id: str, network: dict):
+    return {
+        "id": net_id,
+        "name": network["name"],
+        "genesis_url": network["genesisUrl"],
+        "genesis_path": get_network_genesis_path(net_id),
+    }
 
 def get_script_dir():
     return os.path.dirname(os.path.realpath(__file__))
 
               
-def download_genesis_file(url: str, target_local_path: str):
+def get_network_genesis_path(net_id: str):
+    return f"{get_script_dir()}/genesis/{net_id}.txn"
+
+def download_genesis_file(url: str, target_local_path: str, network_id: str = None):
+    if genesis_cache:
+        return genesis_cache.fetch(network_id or url, url, target_local_path)
     log("Fetching genesis file ...")
-    target_local_path = f"{get_script_dir()}/genesis.txn"
+    target_dir = os.path.dirname(target_local_path)
+    if target_dir:
+        os.makedirs(target_dir, exist_ok=True)
     urllib.request.urlretrieve(url, target_local_path)
+    return target_local_path
 
 def load_network_list():
     with open(f"{get_script_dir()}/networks.json") as json_file:
@@ -86,22 +316,96 @@ def list_networks():
     networks = load_network_list()
     return networks.keys()
 
-if __name__ == "__main__":
-    monitor_plugins = PluginCollection('plugins')
+def parse_network_ids(nets: str):
+    known_networks = list(list_networks())
+    if nets == "all":
+        return known_networks
+    net_ids = [net_id.strip() for net_id in nets.split(",") if net_id.strip()]
+    unknown_networks = [net_id for net_id in net_ids if net_id not in known_networks]
+    if unknown_networks:
+        raise ValueError("Unknown network id(s): {0}. Known networks: {1}".format(", ".join(unknown_networks), ", ".join(known_networks)))
+    return net_ids
 
+def get_parser(monitor_plugins: PluginCollection) -> argparse.ArgumentParser:
+    """The command line arguments of the monitor, including those of the plug-ins."""
     parser = argparse.ArgumentParser(description="Fetch the status of all the indy-nodes within a given pool.")
     parser.add_argument("--net", choices=list_networks(), help="Connect to a known network using an ID.")
+    parser.add_argument("--nets", help="Connect to several known networks at once, either 'all' or a comma delimited list of network IDs (i.e. sbn,ssn).  The pools are queried concurrently and the results are keyed by network ID.")
     parser.add_argument("--list-nets", action="store_true", help="List known networks.")
     parser.add_argument("--genesis-url", default=os.environ.get('GENESIS_URL') , help="The url to the genesis file describing the ledger pool.  Can be specified using the 'GENESIS_URL' environment variable.")
-    parser.add_argument("--genesis-path", default=os.getenv("GENESIS_PATH") or f"{get_script_dir()}/genesis.txn" , help="The path to the genesis file describing the ledger pool.  Can be specified using the 'GENESIS_PATH' environment variable.")
+    parser.add_argument("--genesis-path", default=os.getenv("GENESIS_PATH"), help="The path to the genesis file describing the ledger pool.  Defaults to 'genesis/<netId>.txn' for known networks and 'genesis.txn' otherwise.  Can be specified using the 'GENESIS_PATH' environment variable.")
+    parser.add_argument("--genesis-ttl", type=int, default=int(os.environ.get('GENESIS_TTL') or 3600), help="The number of seconds a downloaded genesis file is used without checking the server for changes.  Defaults to 3600.  Use 0 to always check.  Can be specified using the 'GENESIS_TTL' environment variable.")
+    parser.add_argument("--genesis-cache-dir", default=os.environ.get('GENESIS_CACHE_DIR') or f"{get_script_dir()}/genesis", help="The folder in which the genesis cache metadata is kept.  Can be specified using the 'GENESIS_CACHE_DIR' environment variable.")
     parser.add_argument("-s", "--seed", default=os.environ.get('SEED') , help="The privileged DID seed to use for the ledger requests.  Can be specified using the 'SEED' environment variable. If DID seed is not given the request will run anonymously.")
     parser.add_argument("--nodes", help="The comma delimited list of the nodes from which to collect the status.  The default is all of the nodes in the pool.")
+    parser.add_argument("--daemon", action="store_true", help="Keep running and poll the network(s) every '--interval' seconds.  The pools and plug-ins are loaded once and re-used for every poll.")
+    parser.add_argument("--interval", type=int, default=int(os.environ.get('INTERVAL') or 60), help="The number of seconds between polls in daemon mode.  Defaults to 60.  Can be specified using the 'INTERVAL' environment variable.")
+    parser.add_argument("--stream", action="store_true", help="Query the nodes individually and print each node's result as soon as its reply arrives, one JSON record per line (NDJSON).  The cross node checks (primary mismatch, package mismatch and connection issues) are printed as a final summary record.")
+    parser.add_argument("--adaptive-timeouts", action="store_true", help="Query the nodes individually and give each node as long to reply as its past replies suggest, rather than waiting the full timeout for every node.  Slow nodes are sent the request a second time (hedged) once most of the nodes have replied.  Most useful with '--daemon', since the reply times are kept between polls.")
+    parser.add_argument("--node-timeout", type=float, default=float(os.environ.get('NODE_TIMEOUT') or 20), help="The longest time to wait for a node to reply with '--adaptive-timeouts', and the time given to nodes that haven't replied before.  Defaults to 20.  Can be specified using the 'NODE_TIMEOUT' environment variable.")
+    parser.add_argument("--timings", action="store_true", help="Print the wall time, CPU time and peak memory of each phase of the run and each plug-in, and the latency of each node's reply (in '--stream' mode), as a JSON block on stderr.")
+    parser.add_argument("--profile", help="Profile the run with cProfile and write the stats to the given file, for use with pstats or snakeviz.")
+    parser.add_argument("--trace-memory", help="Trace memory allocations with tracemalloc and write the top allocations to the given file.  Also makes '--timings' report traced rather than resident memory.")
+    parser.add_argument("--capture", default=os.environ.get('CAPTURE_DIR'), help="Record the raw response and verifiers of every poll to a file in the given folder, for use with '--replay'.  Can be specified using the 'CAPTURE_DIR' environment variable.")
+    parser.add_argument("--replay", nargs="+", help="Run the plug-ins on one or more captured responses (see '--capture') instead of querying a network.  The results of several captures are keyed by file name.")
+    parser.add_argument("--crawl", choices=list(LEDGERS), help="Fetch the transactions of the given ledger, rather than the status of the nodes, and append them to '--crawl-output'.  A crawl that was stopped is resumed from where it left off.")
+    parser.add_argument("--crawl-from", type=int, default=1, help="The sequence number of the first transaction to fetch with '--crawl'.  Defaults to 1.")
+    parser.add_argument("--crawl-to", type=int, help="The sequence number of the last transaction to fetch with '--crawl'.  Defaults to the end of the ledger.")
+    parser.add_argument("--crawl-window", type=int, default=int(os.environ.get('CRAWL_WINDOW') or 10), help="The number of transactions requested at once with '--crawl', spread across the nodes.  Defaults to 10.  Can be specified using the 'CRAWL_WINDOW' environment variable.")
+    parser.add_argument("--crawl-verify", action="store_true", help="Have every transaction fetched with '--crawl' verified by the pool (by its state proof, or f + 1 nodes agreeing on it), rather than taking the reply of a single node.  Slower, as a request may go to several nodes.")
+    parser.add_argument("--crawl-output", default=os.environ.get('CRAWL_OUTPUT'), help="The file the transactions are appended to with '--crawl', one JSON record per line.  Defaults to 'ledgers/<netId>-<ledger>.jsonl'.  Can be specified using the 'CRAWL_OUTPUT' environment variable.")
+    parser.add_argument("--compact", action="store_true", help="Print the results as compact JSON, without indentation.")
+    parser.add_argument("--fields", default=os.environ.get('FIELDS'), help="A comma delimited list of the fields to include in each node's result, as dotted paths (i.e. name,status.ok,status.software.indy-node).  Can be specified using the 'FIELDS' environment variable.")
+    parser.add_argument("--json-backend", choices=serialization.BACKENDS, default=os.environ.get('JSON_BACKEND'), help="The JSON library used to decode the replies and encode the results.  Defaults to the fastest one installed (orjson, ujson, then json).  Can be specified using the 'JSON_BACKEND' environment variable.")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose logging.")
 
     monitor_plugins.get_parse_args(parser)
-    args, unknown = parser.parse_known_args()
+    return parser
+
 
+def configure(args):
+    """Apply the command line arguments to the settings of the monitor.
+    Raises ImportError when the requested JSON backend is not installed.
+    """
+    global verbose, compact, fields, capture_dir, latency_tracker, genesis_cache
     verbose = args.verbose
+    compact = args.compact
+    fields = serialization.parse_fields(args.fields)
+    if args.json_backend:
+        serialization.use_backend(args.json_backend)
+    capture_dir = args.capture
+    if args.adaptive_timeouts:
+        latency_tracker = LatencyTracker(max_timeout=args.node_timeout, verbose=verbose)
+    genesis_cache = GenesisCache(args.genesis_cache_dir, args.genesis_ttl, verbose=verbose)
+
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    started_cpu = time.process_time()
+    monitor_plugins = PluginCollection('plugins')
+    load_plugins_times = (time.perf_counter() - started, time.process_time() - started_cpu)
+
+    parser = get_parser(monitor_plugins)
+    args, unknown = parser.parse_known_args()
+
+    try:
+        configure(args)
+    except ImportError:
+        print(f"The '{args.json_backend}' JSON library is not installed.", file=sys.stderr)
+        exit()
+    if args.stream and args.delta:
+        print("'--delta' can't be used with '--stream'; the nodes are printed as their replies arrive, before the cross node checks tell whether they changed.", file=sys.stderr)
+        exit()
+    log(f"Using the '{serialization.backend.name}' JSON backend.")
+
+    if args.timings or args.trace_memory:
+        timings.enable(trace_memory = bool(args.trace_memory))
+        timings.record("load_plugins", *load_plugins_times)
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    atexit.register(write_diagnostics, profiler, args.profile, args.trace_memory)
 
     monitor_plugins.load_all_parse_args(args)
 
@@ -109,6 +413,42 @@ if __name__ == "__main__":
         print(json.dumps(load_network_list(), indent=2))
         exit()
 
+    if args.replay:
+        try:
+            results = asyncio.get_event_loop().run_until_complete(replay_captures(monitor_plugins, args.replay))
+        except (OSError, ValueError) as e:
+            print("Unable to replay the captured response: {0}".format(e), file=sys.stderr)
+            exit()
+        print_results(results if len(args.replay) > 1 else results[args.replay[0]])
+        exit()
+
+    did_seed = None if not args.seed else args.seed
+
+    log("indy-vdr version:", indy_vdr.version())
+    if did_seed:
+        ident = DidKey(did_seed)
+        log("DID:", ident.did, " Verkey:", ident.verkey)
+    else:
+        ident = None
+
+    pools = PoolCollection(verbose=verbose)
+
+    if args.nets:
+        try:
+            net_ids = parse_network_ids(args.nets)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            exit()
+        log("Connecting to {0} ...".format(", ".join(net_ids)))
+        networks = load_network_list()
+        targets = [get_network_target(net_id, networks[net_id]) for net_id in net_ids]
+        # Nodes are named differently on every network, so --nodes only applies to a single network.
+        if args.daemon:
+            start_daemon(run_daemon(monitor_plugins, pools, targets, args.interval, ident=ident, keyed=True, stream=args.stream), pools)
+        results = asyncio.get_event_loop().run_until_complete(fetch_all_networks_status(monitor_plugins, pools, targets, ident=ident, stream=args.stream))
+        print_results(results, args.stream)
+        exit()
+
     network_name = None 
     if args.net:
         log("Loading known network list ...")
@@ -117,9 +457,18 @@ if __name__ == "__main__":
             log("Connecting to '{0}' ...".format(networks[args.net]["name"]))
             args.genesis_url = networks[args.net]["genesisUrl"]
             network_name = networks[args.net]["name"]
+            if not args.genesis_path:
+                args.genesis_path = get_network_genesis_path(args.net)
+    if not args.genesis_path:
+        args.genesis_path = f"{get_script_dir()}/genesis.txn"
 
     if args.genesis_url:
-        download_genesis_file(args.genesis_url, args.genesis_path)
+        try:
+            with timings.phase(f"{network_name or 'pool'}/download_genesis_file"):
+                download_genesis_file(args.genesis_url, args.genesis_path, args.net)
+        except Exception as e:
+            print("Unable to fetch the genesis file: {0}\n".format(e), file=sys.stderr)
+            exit()
         if not network_name: 
             network_name = args.genesis_url
     if not os.path.exists(args.genesis_path):
@@ -127,13 +476,42 @@ if __name__ == "__main__":
         parser.print_help()
         exit()
 
-    did_seed = None if not args.seed else args.seed
+    if args.crawl:
+        loop = asyncio.get_event_loop()
+        try:
+            pool = loop.run_until_complete(pools.get_pool(network_name or args.genesis_path, args.genesis_path))
+            nodes = args.nodes.split(",") if args.nodes else list(loop.run_until_complete(pool.get_verifiers()).keys())
+        except Exception as e:
+            print("Unable to open the pool: {0}".format(e), file=sys.stderr)
+            exit()
+        crawl_output = args.crawl_output or f"{get_script_dir()}/ledgers/{args.net or 'pool'}-{args.crawl}.jsonl"
+        crawler = LedgerCrawler(pool, nodes, args.crawl, crawl_output, args.crawl_from, args.crawl_to, args.crawl_window, timeout=args.node_timeout, verify=args.crawl_verify, verbose=verbose)
+        try:
+            summary = loop.run_until_complete(crawler.crawl())
+        except CrawlError as e:
+            print(e, file=sys.stderr)
+            exit(1)
+        print(serialization.dumps(summary, compact = compact), flush=True)
+        exit()
 
-    log("indy-vdr version:", indy_vdr.version())
-    if did_seed:
-        ident = DidKey(did_seed)
-        log("DID:", ident.did, " Verkey:", ident.verkey)
-    else:
-        ident = None
+    if args.daemon:
+        target = {
+            "id": args.net or network_name or args.genesis_path,
+            "name": network_name,
+            "genesis_url": args.genesis_url,
+            "genesis_path": args.genesis_path,
+        }
+        start_daemon(run_daemon(monitor_plugins, pools, [target], args.interval, args.nodes, ident, stream=args.stream), pools)
 
-    asyncio.get_event_loop().run_until_complete(fetch_status(args.genesis_path, args.nodes, ident, network_name))
\ No newline at end of file
+    loop = asyncio.get_event_loop()
+    try:
+        with timings.phase(f"{network_name or 'pool'}/open_pool"):
+            pool = loop.run_until_complete(pools.get_pool(network_name or args.genesis_path, args.genesis_path))
+    except:
+        print("Unable to get pool Response! 3 attempts where made. Exiting...")
+        exit()
+    if args.stream:
+        loop.run_until_complete(fetch_status_stream(monitor_plugins, pool, args.nodes, ident, network_name))
+        exit()
+    result = loop.run_until_complete(fetch_status(monitor_plugins, pool, args.nodes, ident, network_name))
+    print_results(result)
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+
+class GenesisCache(object):
+    """Keeps track of the genesis files that have been downloaded, keyed by
+    network id, so they are only fetched again when they may have changed.
+
+    Within the time to live a cached genesis file is used without contacting
+    the server at all.  After that a conditional request (ETag /
+    If-Modified-Since) is made and the file is only re-written when its
+    content has actually changed.  Files are written to a temp file and
+    renamed into place so concurrent runs never see a partial file.  If the
+    server can't be reached the last good copy is used.
+    """
+
+    def __init__(self, cache_dir: str, ttl: int = 3600, timeout: int = 30, verbose: bool = False):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.timeout = timeout
+        self.verbose = verbose
+
+    def fetch(self, key: str, url: str, target_path: str) -> str:
+        """Make sure target_path holds an up to date copy of the genesis file
+        at url and return target_path.
+        """
+        metadata = self.load_metadata(key)
+        cached = self.is_cached(metadata, url, target_path)
+
+        if cached and (time.time() - metadata.get("fetched_at", 0) < self.ttl):
+            self.log(f"Using cached genesis file for '{key}' ...")
+            return target_path
+
+        self.log("Fetching genesis file ...")
+        request = urllib.request.Request(url)
+        if cached:
+            if metadata.get("etag"):
+                request.add_header("If-None-Match", metadata["etag"])
+            if metadata.get("last_modified"):
+                request.add_header("If-Modified-Since", metadata["last_modified"])
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                content = response.read()
+                headers = response.headers
+        except urllib.error.HTTPError as e:
+            if cached and e.code == 304:
+                self.log(f"Genesis file for '{key}' has not changed.")
+                metadata["fetched_at"] = time.time()
+                self.save_metadata(key, metadata)
+                return target_path
+            return self.fallback(key, target_path, e)
+        except (urllib.error.URLError, OSError) as e:
+            return self.fallback(key, target_path, e)
+
+        digest = hashlib.sha256(content).hexdigest()
+        if not cached or digest != metadata.get("sha256"):
+            # Only replace the file when the content has changed so the pools
+            # using it are not refreshed for nothing.
+            self.atomic_write(target_path, content)
+        stat = os.stat(target_path)
+        self.save_metadata(key, {
+            "url": url,
+            "path": os.path.realpath(target_path),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "sha256": digest,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "fetched_at": time.time(),
+        })
+        return target_path
+
+    def fallback(self, key: str, target_path: str, error: Exception) -> str:
+        if os.path.exists(target_path):
+            print(f"Unable to fetch the genesis file for '{key}' ({error}), using the last good copy.", file=sys.stderr)
+            return target_path
+        raise error
+
+    @staticmethod
+    def is_cached(metadata: dict, url: str, target_path: str) -> bool:
+        """The cached copy is only valid if it is the file we wrote, from the same url."""
+        if not metadata or (metadata.get("url") != url) or (metadata.get("path") != os.path.realpath(target_path)):
+            return False
+        try:
+            stat = os.stat(target_path)
+        except OSError:
+            return False
+        return (stat.st_mtime_ns == metadata.get("mtime_ns")) and (stat.st_size == metadata.get("size"))
+
+    def metadata_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{self.safe_key(key)}.json")
+
+    def load_metadata(self, key: str) -> dict:
+        try:
+            with open(self.metadata_path(key)) as metadata_file:
+                return json.load(metadata_file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_metadata(self, key: str, metadata: dict):
+        self.atomic_write(self.metadata_path(key), json.dumps(metadata, indent=2).encode("utf-8"))
+
+    @staticmethod
+    def safe_key(key: str) -> str:
+        if key.replace("-", "").replace("_", "").isalnum():
+            return key
+        # Genesis urls given on the command line.
+        return "url-" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def atomic_write(path: str, content: bytes):
+        target_dir = os.path.dirname(os.path.abspath(path))
+        os.makedirs(target_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=target_dir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(content)
+            os.replace(temp_path, path)
+        except:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def log(self, *args):
+        if self.verbose:
+            print(*args, "\n", file=sys.stderr)
@@ -0,0 +1,226 @@
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+
+from indy_vdr.ledger import build_get_txn_request
+
+import serialization
+
+LEDGERS = {"pool": 0, "domain": 1, "config": 2}
+
+
+class CrawlError(Exception):
+    pass
+
+
+class LedgerCrawler(object):
+    """Fetches the transactions of a ledger, one GET_TXN request per
+    transaction, and appends them in order to a local NDJSON file.
+
+    Up to window requests are in flight at once, each sent to a single node,
+    taking turns across the nodes; a request that fails is sent to the next
+    node, up to attempts times.  The replies of single nodes are not
+    verified; with verify, every request is sent through the pool, which
+    checks the reply's state proof or has f + 1 nodes agree on it.  A node
+    that doesn't have a transaction may only be behind, so the end of the
+    ledger is only taken to be reached when f + 1 nodes don't have it.
+    Transactions that arrive out of order are
+    held back until the ones before them are in.  Every checkpoint_every
+    transactions, and when the crawl stops, the sequence number of the last
+    transaction written and the size of the file are checkpointed, so a crawl
+    that is stopped (or crashes) resumes from where it left off; anything
+    written after the last checkpoint is cut off first.  The crawl stops at
+    to_seq_no, or at the end of the ledger.
+    """
+
+    def __init__(self, pool, nodes: list, ledger: str, output_path: str, from_seq_no: int = 1, to_seq_no: int = None, window: int = 10, attempts: int = 5, timeout: int = 20, checkpoint_every: int = 100, verify: bool = False, verbose: bool = False):
+        if ledger not in LEDGERS:
+            raise ValueError("Unknown ledger '{0}'. Known ledgers: {1}".format(ledger, ", ".join(LEDGERS)))
+        if not nodes:
+            raise ValueError("There are no nodes to send the requests to.")
+        self.pool = pool
+        self.nodes = itertools.cycle(nodes)
+        self.node_count = len(nodes)
+        # f + 1 nodes; at least one of them is honest and up to date.
+        self.confirmations = min(self.node_count, (self.node_count - 1) // 3 + 1)
+        self.verify = verify
+        self.ledger = ledger
+        self.output_path = output_path
+        self.checkpoint_path = output_path + ".checkpoint"
+        self.from_seq_no = max(1, from_seq_no)
+        self.to_seq_no = to_seq_no
+        self.window = max(1, window)
+        self.attempts = max(1, attempts)
+        self.timeout = timeout
+        self.checkpoint_every = checkpoint_every
+        self.verbose = verbose
+        self.completed = {}
+        self.last_seq_no = self.from_seq_no - 1
+        self.written = 0
+        self.retries = 0
+
+    def load_checkpoint(self) -> dict:
+        try:
+            with open(self.checkpoint_path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return None
+        if checkpoint.get("ledger") != self.ledger:
+            raise CrawlError(f"'{self.checkpoint_path}' is the checkpoint of the '{checkpoint.get('ledger')}' ledger.")
+        return checkpoint
+
+    def save_checkpoint(self, output_file):
+        output_file.flush()
+        os.fsync(output_file.fileno())
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, "w") as checkpoint_file:
+            json.dump({"ledger": self.ledger, "last_seq_no": self.last_seq_no, "offset": output_file.tell(), "updated": time.time()}, checkpoint_file)
+        os.replace(temp_path, self.checkpoint_path)
+
+    async def crawl(self) -> dict:
+        """Run the crawl and return a summary of it."""
+        resumed_from = None
+        checkpoint = self.load_checkpoint()
+        target_dir = os.path.dirname(os.path.abspath(self.output_path))
+        os.makedirs(target_dir, exist_ok=True)
+        output_file = open(self.output_path, "a+b")
+        try:
+            if checkpoint:
+                # Cut off whatever was written after the checkpoint.
+                output_file.truncate(checkpoint["offset"])
+                self.last_seq_no = max(self.last_seq_no, checkpoint["last_seq_no"])
+                resumed_from = self.last_seq_no + 1
+                self.log(f"Resuming the '{self.ledger}' ledger from {resumed_from} ...")
+            elif output_file.seek(0, os.SEEK_END):
+                raise CrawlError(f"'{self.output_path}' already exists, but there is no checkpoint to resume it from.")
+            output_file.seek(0, os.SEEK_END)
+
+            started = time.perf_counter()
+            end_seq_no = await self.fetch_all(output_file)
+            elapsed = time.perf_counter() - started
+        finally:
+            output_file.close()
+
+        return {
+            "ledger": self.ledger,
+            "output": self.output_path,
+            "resumed_from": resumed_from,
+            "last_seq_no": self.last_seq_no,
+            "end_of_ledger": end_seq_no is not None,
+            "verified": self.verify,
+            "txns": self.written,
+            "retries": self.retries,
+            "seconds": round(elapsed, 3),
+            "txns_per_second": round(self.written / elapsed, 2) if elapsed else None,
+        }
+
+    async def fetch_all(self, output_file) -> int:
+        """Keep up to window requests in flight until the range, or the
+        ledger, runs out.  Returns the first sequence number past the end of
+        the ledger, or None when the end wasn't reached."""
+        next_seq_no = self.last_seq_no + 1
+        end_seq_no = None
+        pending = {}
+        unsaved = 0
+        try:
+            while True:
+                while (len(pending) < self.window) and ((end_seq_no is None) or (next_seq_no < end_seq_no)) and ((self.to_seq_no is None) or (next_seq_no <= self.to_seq_no)):
+                    pending[asyncio.ensure_future(self.fetch(next_seq_no))] = next_seq_no
+                    next_seq_no += 1
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(list(pending), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    seq_no = pending.pop(task)
+                    txn = task.result()
+                    if txn is None:
+                        # The ledger only grows, so nothing past this exists yet either.
+                        end_seq_no = seq_no if end_seq_no is None else min(end_seq_no, seq_no)
+                    else:
+                        self.completed[seq_no] = txn
+                if end_seq_no is not None:
+                    for task, seq_no in list(pending.items()):
+                        if seq_no > end_seq_no:
+                            task.cancel()
+                            del pending[task]
+                written = self.write_completed(output_file)
+                unsaved += written
+                if written and (unsaved >= self.checkpoint_every):
+                    self.save_checkpoint(output_file)
+                    unsaved = 0
+        finally:
+            for task in pending:
+                task.cancel()
+            # Keep what has been written so far, even when the crawl failed.
+            self.write_completed(output_file)
+            self.save_checkpoint(output_file)
+        return end_seq_no
+
+    def write_completed(self, output_file) -> int:
+        """Write the transactions that follow on from the last one written."""
+        written = 0
+        while (self.last_seq_no + 1) in self.completed:
+            self.last_seq_no += 1
+            txn = self.completed.pop(self.last_seq_no)
+            output_file.write((serialization.dumps({"seqNo": self.last_seq_no, "txn": txn}, compact = True) + "\n").encode("utf-8"))
+            written += 1
+        self.written += written
+        return written
+
+    async def fetch(self, seq_no: int):
+        """Fetch a single transaction; None when it doesn't exist (yet)."""
+        if self.verify:
+            return await self.fetch_from(seq_no, None)
+        missing = []
+        while True:
+            node, txn = await self.fetch_from(seq_no, missing)
+            if txn is not None:
+                if missing:
+                    self.log(f"{', '.join(missing)} don't have transaction {seq_no} of the '{self.ledger}' ledger, '{node}' does; they may be behind.")
+                return txn
+            missing.append(node)
+            if len(missing) >= self.confirmations:
+                return None
+
+    async def fetch_from(self, seq_no: int, exclude: list):
+        """Fetch a single transaction from the next node not in exclude, and
+        return the node and the transaction (None when the node doesn't have
+        it); or, when exclude is None, through the pool, verified, and return
+        the transaction."""
+        error = None
+        for attempt in range(self.attempts):
+            request = build_get_txn_request(None, LEDGERS[self.ledger], seq_no)
+            if exclude is None:
+                node = "the pool"
+            else:
+                node = next(self.nodes)
+                while node in exclude:
+                    node = next(self.nodes)
+            try:
+                if exclude is None:
+                    result = await self.pool.submit_request(request)
+                    return result["data"]
+                response = await self.pool.submit_action(request, node_aliases = [node], timeout = self.timeout)
+                value = response.get(node)
+                try:
+                    reply = serialization.loads(value)
+                except (serialization.JSONDecodeError, TypeError):
+                    raise CrawlError(value or "no reply")
+                if "REPLY" not in reply["op"]:
+                    raise CrawlError(reply.get("reason") or reply["op"])
+                return node, reply["result"]["data"]
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # i.e. a node that timed out or refused the request; try the next one.
+                error = e
+                self.retries += 1
+                self.log(f"Unable to get transaction {seq_no} of the '{self.ledger}' ledger from {node if exclude is None else repr(node)}: {e}")
+        raise CrawlError(f"Unable to get transaction {seq_no} of the '{self.ledger}' ledger after {self.attempts} attempts: {error}")
+
+    def log(self, *args):
+        if self.verbose:
+            print(*args, "\n", file=sys.stderr)
@@ -0,0 +1,135 @@
+import asyncio
+import collections
+import math
+import sys
+import time
+
+
+class LatencyTracker(object):
+    """Keeps track of how long each node takes to reply, across polls, and
+    uses it to decide how long to wait for a node and when to hedge.
+
+    The expected latency of a node is kept as an exponentially weighted
+    moving average (EWMA) of its reply times, along with the EWMA of their
+    deviation, in the same way TCP estimates round trip times.  A node is
+    given its EWMA plus four deviations to reply, within min_timeout and
+    max_timeout.  Nodes that have not replied before get max_timeout, and
+    nodes that failed to reply last time only get a few times the median
+    latency of the pool, so a dead node can't hold back the result.  The time
+    given doubles with each failure in a row, up to max_timeout, so a node
+    that comes back slower than the rest of the pool gets to reply again;
+    after max_timeout it starts over, so a dead node only gets the full
+    timeout once every few polls.
+
+    When a node has not replied by the time the pool's healthy nodes
+    usually have (their 95th percentile), the request is sent to it once
+    more (hedged) and whichever reply arrives first is used.
+    """
+
+    def __init__(self, max_timeout: float = 20, min_timeout: float = 0.5, alpha: float = 0.125, beta: float = 0.25, window: int = 100, dead_multiplier: float = 5, verbose: bool = False):
+        self.max_timeout = max_timeout
+        self.min_timeout = min_timeout
+        self.alpha = alpha
+        self.beta = beta
+        self.dead_multiplier = dead_multiplier
+        self.verbose = verbose
+        self.window = window
+        self.nodes = {}
+        self.samples = {}
+
+    def get_node(self, network_name: str, node: str) -> dict:
+        key = (network_name or "pool", node)
+        if key not in self.nodes:
+            self.nodes[key] = {"ewma": None, "deviation": 0.0, "failures": 0, "hedged": 0}
+        return self.nodes[key]
+
+    def record(self, network_name: str, node: str, seconds: float):
+        state = self.get_node(network_name, node)
+        if state["ewma"] is None:
+            state["ewma"] = seconds
+            state["deviation"] = seconds / 2
+        else:
+            state["deviation"] = (1 - self.beta) * state["deviation"] + self.beta * abs(seconds - state["ewma"])
+            state["ewma"] = (1 - self.alpha) * state["ewma"] + self.alpha * seconds
+        state["failures"] = 0
+        samples = self.samples.get(network_name or "pool")
+        if samples is None:
+            samples = self.samples[network_name or "pool"] = collections.deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def record_failure(self, network_name: str, node: str):
+        self.get_node(network_name, node)["failures"] += 1
+
+    def percentile(self, network_name: str, percent: float):
+        """The given percentile of the recent reply times of the pool's nodes."""
+        samples = self.samples.get(network_name or "pool")
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def timeout(self, network_name: str, node: str) -> float:
+        state = self.get_node(network_name, node)
+        if state["failures"]:
+            # The median, as a few slow replies shouldn't stretch the time given to a dead node.
+            healthy = self.percentile(network_name, 50)
+            if healthy is None:
+                return self.max_timeout
+            short = self.clamp(healthy * self.dead_multiplier)
+            doublings = math.ceil(math.log2(self.max_timeout / short)) if short < self.max_timeout else 0
+            return self.clamp(short * 2 ** ((state["failures"] - 1) % (doublings + 1)))
+        if state["ewma"] is None:
+            return self.max_timeout
+        return self.clamp(state["ewma"] + 4 * state["deviation"])
+
+    def hedge_delay(self, network_name: str, node: str):
+        """How long to wait for a node before sending the request again, or
+        None when there is nothing to go on yet."""
+        return self.percentile(network_name, 95)
+
+    def clamp(self, seconds: float) -> float:
+        return max(self.min_timeout, min(self.max_timeout, seconds))
+
+    async def submit(self, network_name: str, node: str, send):
+        """Send a request to a single node using its adaptive timeout, hedging
+        it when the node is slow.  send is a coroutine function returning the
+        node's reply; "timeout" is returned when the node doesn't reply in time.
+        """
+        started = time.perf_counter()
+        deadline = started + self.timeout(network_name, node)
+        hedge_delay = self.hedge_delay(network_name, node)
+        pending = {asyncio.ensure_future(send())}
+        hedged = False
+        error = None
+        try:
+            while pending:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                wait = remaining
+                if not hedged and (hedge_delay is not None):
+                    wait = min(remaining, max(0, started + hedge_delay - time.perf_counter()))
+                done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif task.result() != "timeout":
+                        self.record(network_name, node, time.perf_counter() - started)
+                        return task.result()
+                if not hedged and (hedge_delay is not None) and (time.perf_counter() - started >= hedge_delay):
+                    hedged = True
+                    self.get_node(network_name, node)["hedged"] += 1
+                    self.log(f"No reply from '{node}' after {hedge_delay:.2f}s, sending the request again ...")
+                    pending.add(asyncio.ensure_future(send()))
+        finally:
+            for task in pending:
+                task.cancel()
+
+        self.record_failure(network_name, node)
+        if error is not None:
+            raise error
+        return "timeout"
+
+    def log(self, *args):
+        if self.verbose:
+            print(*args, "\n", file=sys.stderr)
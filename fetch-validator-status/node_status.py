@@ -0,0 +1,171 @@
+import time
+
+import serialization
+from timings import timings
+
+
+class NodeStatus(object):
+    """The parts of a node's validator info reply the monitor uses, parsed
+    once from the reply, along with the result of the per node checks.
+
+    Only the raw reply is kept, the decoded reply (response) is decoded
+    again when it is asked for, unless it was kept when the reply was parsed
+    (keep_response); release() lets go of it once the entry has been built.
+    to_dict() returns the node's entry in the result.
+    """
+
+    __slots__ = (
+        "name", "reply", "decoded", "op", "reason",
+        "client_address", "node_address", "probe",
+        "has_node_info", "primary", "view_no", "vc_in_progress", "replica_primaries", "mode", "uptime", "transaction_counts", "ledger_statuses", "write_consensus",
+        "timestamp", "software", "packages",
+        "has_pool_info", "unreachable_count", "unreachable_nodes", "blacklisted_nodes",
+        "has_extractions", "upgrade_status",
+        "status", "errors", "warnings", "info", "primary_check_at",
+        "_response",
+    )
+
+    def __init__(self, name: str, reply: str = None):
+        self.name = name
+        self.reply = reply
+        self.decoded = False
+        self.op = None
+        self.reason = None
+        self.client_address = None
+        self.node_address = None
+        self.probe = None
+        self.has_node_info = False
+        self.primary = ""
+        self.view_no = None
+        self.vc_in_progress = False
+        self.replica_primaries = []
+        self.mode = None
+        self.uptime = None
+        self.transaction_counts = None
+        self.ledger_statuses = {}
+        self.write_consensus = {}
+        self.timestamp = None
+        self.software = None
+        self.packages = {}
+        self.has_pool_info = False
+        self.unreachable_count = 0
+        self.unreachable_nodes = []
+        self.blacklisted_nodes = []
+        self.has_extractions = False
+        self.upgrade_status = None
+        self.status = {}
+        self.errors = []
+        self.warnings = []
+        self.info = []
+        self.primary_check_at = None
+        self._response = None
+
+    @classmethod
+    def from_reply(cls, name: str, reply: str, keep_response: bool = False):
+        node_status = cls(name, reply)
+        try:
+            with timings.phase("analysis/json_decode"):
+                jsval = serialization.loads(reply)
+        except serialization.JSONDecodeError:
+            return node_status
+        node_status.parse(jsval)
+        if keep_response:
+            node_status._response = jsval
+        return node_status
+
+    def parse(self, jsval: any):
+        self.decoded = bool(jsval)
+        self.op = jsval["op"]
+        if not self.is_reply:
+            self.reason = jsval.get("reason")
+            return
+
+        data = jsval["result"]["data"]
+        self.timestamp = data.get("timestamp")
+        if "Node_info" in data:
+            node_info = data["Node_info"]
+            self.has_node_info = True
+            self.primary = node_info["Replicas_status"][self.name + ":0"]["Primary"]
+            # The primary of each of the node's replicas, by instance; "Node1:0" is the master.
+            for replica, replica_status in node_info["Replicas_status"].items():
+                instance = int(replica.rsplit(":", 1)[1])
+                self.replica_primaries.extend([None] * (instance + 1 - len(self.replica_primaries)))
+                self.replica_primaries[instance] = replica_status.get("Primary")
+            view_change_status = node_info.get("View_change_status", {})
+            self.view_no = view_change_status.get("View_No")
+            self.vc_in_progress = bool(view_change_status.get("VC_in_progress"))
+            self.mode = node_info["Mode"]
+            self.uptime = node_info["Metrics"]["uptime"]
+            self.transaction_counts = node_info["Metrics"]["transaction-count"]
+            self.ledger_statuses = node_info["Catchup_status"]["Ledger_statuses"]
+            self.write_consensus = {ledger: freshness["Has_write_consensus"] for ledger, freshness in node_info["Freshness_status"].items()}
+        if "Software" in data:
+            self.software = {"indy-node": data["Software"]["indy-node"], "sovrin": data["Software"]["sovrin"]}
+            for installed_package in data["Software"]["Installed_packages"]:
+                package, version = installed_package.split()
+                self.packages[package] = version
+        if "Pool_info" in data:
+            self.has_pool_info = True
+            self.unreachable_count = data["Pool_info"]["Unreachable_nodes_count"]
+            self.unreachable_nodes = [unreachable_node[0] for unreachable_node in data["Pool_info"]["Unreachable_nodes"]]
+            self.blacklisted_nodes = data["Pool_info"]["Blacklisted_nodes"]
+        if "Extractions" in data:
+            self.has_extractions = True
+            upgrade_log = data["Extractions"]["upgrade_log"]
+            self.upgrade_status = upgrade_log[-1] if upgrade_log else None
+
+    @property
+    def is_reply(self) -> bool:
+        return bool(self.op) and ("REPLY" in self.op)
+
+    @property
+    def response(self):
+        """The decoded reply; None when the node didn't reply."""
+        if self._response is not None:
+            return self._response
+        if not self.decoded:
+            return None
+        return serialization.loads(self.reply)
+
+    def release(self):
+        self._response = None
+
+    def to_dict(self, include_response: bool = True) -> dict:
+        """The node's entry in the result.  The entry gets its own copies of
+        the lists, as the other plug-ins are free to change the entries.
+        """
+        entry = {"name": self.name}
+        if self.client_address is not None:
+            entry["client-address"] = self.client_address
+        if self.node_address is not None:
+            entry["node-address"] = self.node_address
+        if self.probe is not None:
+            entry["probe"] = {endpoint: dict(result) for endpoint, result in self.probe.items()}
+        # Status Summary
+        entry["status"] = dict(self.status)
+        # Info
+        if len(self.info) > 0:
+            entry["status"]["info"] = len(self.info)
+            entry["info"] = list(self.info)
+        # Errors / Warnings
+        if len(self.errors) > 0:
+            entry["status"]["errors"] = len(self.errors)
+            entry["errors"] = list(self.errors)
+        if len(self.warnings) > 0:
+            entry["status"]["warnings"] = len(self.warnings)
+            entry["warnings"] = list(self.warnings)
+        # Full Response
+        if include_response and self.decoded:
+            entry["response"] = self.response
+        return entry
+
+
+class PoolSnapshot(object):
+    """The parsed status of every node of a network at one point in time."""
+
+    __slots__ = ("network", "timestamp", "nodes")
+
+    def __init__(self, network: str, nodes: dict, timestamp: float = None):
+        self.network = network
+        self.nodes = nodes
+        self.timestamp = timestamp or time.time()
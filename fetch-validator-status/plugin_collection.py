@@ -26,10 +26,20 @@ Change History:
   - 15/01/2021 Modified from orginal.
 """
 
+import ast
+import asyncio
+import builtins
+import copy
+import heapq
 import inspect
+import json
 import os
 import sys
 import pkgutil
+from timings import timings
+
+TRANSFORM = 'transform'
+SINK = 'sink'
 
 
 class Plugin(object):
@@ -41,7 +51,15 @@ class Plugin(object):
         self.index = None
         self.name = 'UNKNOWN'
         self.description = 'UNKNOWN'
-        self.type = 'UNKNOWN'
+        # 'transform' plugins are run in order and may change the result.
+        # 'sink' plugins are run concurrently, after the transforms, on a copy of the final result.
+        self.type = TRANSFORM
+        # The names of the plugins that must run before this one.
+        self.depends_on = []
+        # Those plugins by name, set by the collection once the plugins are loaded.
+        self.dependencies = {}
+        # The number of seconds perform_operation may take; None uses the collection's default.
+        self.timeout = None
         self.enabled = False
 
     def parse_args(self, argument):
@@ -66,6 +84,7 @@ class PluginCollection(object):
         when an instance of the PluginCollection object is created
         """
         self.plugin_package = plugin_package
+        self.timeout = None
         self.reload_plugins()
 
     def reload_plugins(self):
@@ -74,21 +93,67 @@ class PluginCollection(object):
         """
         self.plugins = []
         self.seen_paths = []
+        self.manifest = PluginManifest(self.plugin_package)
         # print(f'\nLooking for plugins under package {self.plugin_package}')
         self.walk_package(self.plugin_package)
+        self.manifest.save()
         self.sort()
 
-    async def apply_all_plugins_on_value(self, result, network_name, response, verifiers):
+    async def apply_all_plugins_on_value(self, result, network_name, response, verifiers, exclude = (), run_sinks = True):
         """Apply all of the plugins with the argument supplied to this function
         """
         self.log(f'\033[38;5;37mRunning plugins...\033[0m\n')
         for plugin in self.plugins:
+            if (plugin in exclude) or (plugin.type == SINK):
+                continue
             if plugin.enabled:
                 self.log(f'\033[38;5;37mRunning {plugin.name}...\033[0m')
-                result = await plugin.perform_operation(result, network_name, response, verifiers)
+                result = await self.run_plugin(plugin, result, network_name, response, verifiers)
                 self.log((f'\033[38;5;37m{plugin.name} yields value\033[0m\n')) #{result}
             else:
                 self.log(f"\033[38;5;3m{plugin.name} disabled.\033[0m\n")
+        if run_sinks:
+            await self.apply_all_sinks_on_value(result, network_name, response, verifiers, exclude)
+        return result
+
+    async def apply_all_sinks_on_value(self, result, network_name, response, verifiers, exclude = ()):
+        """Run the enabled sink plugins concurrently on a snapshot of the result,
+        so a slow sink doesn't hold back the others and can't change the result
+        """
+        sinks = [plugin for plugin in self.plugins if (plugin.type == SINK) and plugin.enabled and (plugin not in exclude)]
+        if not sinks:
+            return
+        snapshot = copy.deepcopy(result)
+        # Sinks that depend on other sinks wait for them; the plugins are already in dependency order.
+        waves = []
+        wave_of = {}
+        for plugin in sinks:
+            wave = max([wave_of[name] + 1 for name in plugin.depends_on if name in wave_of] or [0])
+            wave_of[plugin.name] = wave
+            if wave == len(waves):
+                waves.append([])
+            waves[wave].append(plugin)
+        for wave in waves:
+            self.log(f'\033[38;5;37mRunning {", ".join(plugin.name for plugin in wave)}...\033[0m')
+            await asyncio.gather(*[self.run_plugin(plugin, snapshot, network_name, response, verifiers) for plugin in wave])
+
+    async def run_plugin(self, plugin, result, network_name, response, verifiers):
+        """Run a single plugin within its timeout.  A plugin that times out, or a
+        sink that fails, is reported and the result it was given is passed on
+        unchanged.
+        """
+        timeout = plugin.timeout if plugin.timeout is not None else self.timeout
+        try:
+            with timings.phase(f"plugin/{plugin.name}"):
+                if timeout:
+                    return await asyncio.wait_for(plugin.perform_operation(result, network_name, response, verifiers), timeout)
+                return await plugin.perform_operation(result, network_name, response, verifiers)
+        except asyncio.TimeoutError:
+            print(f"\033[1;31;40m{plugin.name} timed out after {timeout} seconds.\033[m", file=sys.stderr)
+        except Exception as e:
+            if plugin.type != SINK:
+                raise
+            print(f"\033[1;31;40m{plugin.name} failed: {e}\033[m", file=sys.stderr)
         return result
 
     def walk_package(self, package):
@@ -96,8 +161,11 @@ class PluginCollection(object):
         """
         imported_package = __import__(package, fromlist=['blah'])
 
-        for _, pluginname, ispkg in pkgutil.iter_modules(imported_package.__path__, imported_package.__name__ + '.'):
+        for finder, pluginname, ispkg in pkgutil.iter_modules(imported_package.__path__, imported_package.__name__ + '.'):
             if not ispkg:
+                # Helper modules (and the libraries they pull in) are left for the plugins to import when they need them.
+                if not self.manifest.defines_plugin(pluginname, getattr(finder, "path", None)):
+                    continue
                 plugin_module = __import__(pluginname, fromlist=['blah'])
                 clsmembers = inspect.getmembers(plugin_module, inspect.isclass)
                 for (_, c) in clsmembers:
@@ -126,16 +194,53 @@ class PluginCollection(object):
                 for child_pkg in child_pkgs:
                     self.walk_package(package + '.' + child_pkg)
 
+    def get_plugin(self, name):
+        for plugin in self.plugins:
+            if plugin.name == name:
+                return plugin
+        return None
+
     def sort(self):
+        """Order the plugins by index, while making sure every plugin comes
+        after the plugins it depends on
+        """
         self.plugins.sort(key=lambda x: x.index, reverse=False)
+        names = set(plugin.name for plugin in self.plugins)
+        dependents = {plugin.name: [] for plugin in self.plugins}
+        pending = {}
+        for plugin in self.plugins:
+            depends_on = [name for name in plugin.depends_on if name in names]
+            pending[plugin.name] = len(depends_on)
+            for name in depends_on:
+                dependents[name].append(plugin)
+
+        ready = [(plugin.index, position, plugin) for position, plugin in enumerate(self.plugins) if not pending[plugin.name]]
+        heapq.heapify(ready)
+        positions = {plugin.name: position for position, plugin in enumerate(self.plugins)}
+        ordered = []
+        while ready:
+            _, _, plugin = heapq.heappop(ready)
+            ordered.append(plugin)
+            for dependent in dependents[plugin.name]:
+                pending[dependent.name] -= 1
+                if not pending[dependent.name]:
+                    heapq.heappush(ready, (dependent.index, positions[dependent.name], dependent))
+        if len(ordered) != len(self.plugins):
+            cycle = [plugin.name for plugin in self.plugins if plugin not in ordered]
+            raise ValueError("Plugin dependency cycle between: {0}".format(", ".join(cycle)))
+        self.plugins = ordered
+        for plugin in self.plugins:
+            plugin.dependencies = {name: self.get_plugin(name) for name in plugin.depends_on if name in names}
 
     def get_parse_args(self, parser):
+        parser.add_argument("--plugin-timeout", type=float, default=float(os.environ.get('PLUGIN_TIMEOUT') or 0), help="The number of seconds a plug-in may take before it is abandoned, for plug-ins that don't set their own timeout.  Defaults to 0 (no timeout).  Can be specified using the 'PLUGIN_TIMEOUT' environment variable.")
         for plugin in self.plugins:
             plugin.parse_args(parser)
 
     def load_all_parse_args(self, args):
         global verbose
         verbose = args.verbose
+        self.timeout = args.plugin_timeout
         if verbose: self.plugin_list()
         for plugin in self.plugins:
             plugin.load_parse_args(args)
@@ -147,4 +252,76 @@ class PluginCollection(object):
     def plugin_list(self):
         self.log("\033[38;5;37m--- Plug-ins ---\033[0m")
         for plugin in self.plugins:
-            self.log(f"\033[38;5;37m{plugin.name}: {plugin.__class__.__module__}.{plugin.__class__.__name__}\033[0m")
\ No newline at end of file
+            self.log(f"\033[38;5;37m{plugin.name}: {plugin.__class__.__module__}.{plugin.__class__.__name__}\033[0m")
+
+class PluginManifest(object):
+    """Remembers which modules of the plugin package define a plugin class, so
+    only those modules are imported when the plugins are loaded.  A module is
+    looked at again (parsed, not imported) when its size or modification time
+    changes.  The manifest is kept in the package's __pycache__ folder.
+    """
+
+    def __init__(self, plugin_package):
+        package_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), *plugin_package.split('.'))
+        self.path = os.path.join(package_path, '__pycache__', 'plugin_manifest.json')
+        self.changed = False
+        try:
+            with open(self.path) as manifest_file:
+                self.modules = json.load(manifest_file)
+        except (OSError, ValueError):
+            self.modules = {}
+
+    def defines_plugin(self, module_name, module_dir):
+        if not module_dir:
+            return True
+        file_path = os.path.join(module_dir, module_name.rsplit('.', 1)[-1] + '.py')
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            # Compiled or extension modules; import them to find out.
+            return True
+        signature = [stat.st_mtime_ns, stat.st_size]
+        cached = self.modules.get(module_name)
+        if cached and cached["signature"] == signature:
+            return cached["plugin"]
+        plugin = self.parse(file_path)
+        self.modules[module_name] = {"signature": signature, "plugin": plugin}
+        self.changed = True
+        return plugin
+
+    @staticmethod
+    def parse(file_path):
+        """Whether the module may define a class deriving from Plugin.  A class
+        deriving from Plugin, or from a class the parser can't follow (one that
+        is imported, for instance), means the module has to be imported to find
+        out; classes deriving only from builtins or the module's own classes
+        don't."""
+        try:
+            with open(file_path, 'rb') as module_file:
+                tree = ast.parse(module_file.read(), file_path)
+        except (OSError, SyntaxError, ValueError):
+            # Let the import report the problem.
+            return True
+        classes = [node for node in ast.walk(tree) if isinstance(node, ast.ClassDef)]
+        known = set(dir(builtins)) | {node.name for node in classes}
+        for node in classes:
+            for base in node.bases:
+                if (isinstance(base, ast.Name) and base.id == 'Plugin') or (isinstance(base, ast.Attribute) and base.attr == 'Plugin'):
+                    return True
+                if not (isinstance(base, ast.Name) and base.id in known):
+                    return True
+        return False
+
+    def save(self):
+        if not self.changed:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w') as manifest_file:
+                json.dump(self.modules, manifest_file, indent=2)
+            os.replace(temp_path, self.path)
+            self.changed = False
+        except OSError:
+            # The manifest is only a cache; a read only install parses the modules on every run.
+            pass
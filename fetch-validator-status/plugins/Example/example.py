@@ -14,7 +14,14 @@ class main(plugin_collection.Plugin):
         self.index = 3
         self.name = 'Example Plug-in'
         self.description = ''
+        # 'transform' (the default) plug-ins run one after another and can change the result.
+        # Use plugin_collection.SINK for plug-ins that only consume the result (uploads, alerts, logs);
+        # sinks run concurrently, after all of the transforms, on a copy of the result.
         self.type = ''
+        # Names of the plug-ins that have to run before this one.
+        self.depends_on = ['Analysis']
+        # Optional; the number of seconds perform_operation may take.
+        self.timeout = None
 
     def parse_args(self, parser):
         # Declear your parser arguments here. This will add them to the fetch_status.py parser arguments.
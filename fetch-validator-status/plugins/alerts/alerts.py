@@ -10,6 +10,7 @@ class main(plugin_collection.Plugin):
         self.name = 'Alerts'
         self.description = ''
         self.type = ''
+        self.depends_on = ['Analysis']
 
     # def description(self)
     #     return self.description
@@ -1,9 +1,25 @@
 import plugin_collection
+import asyncio
+import concurrent.futures
 import json
 import datetime
+import hashlib
+import os
+import re
+import time
 from DidKey import DidKey
+import serialization
+from node_status import NodeStatus, PoolSnapshot
+from connectivity import ConnectivityMatrix
+from endpoint_probe import EndpointProber
+from state_store import StateStore
+from timings import timings
+from view_changes import ViewChangeTracker, vote
 from typing import Tuple
 
+# The fields of a reply that change on every poll; left out of the reply hash.
+VOLATILE_FIELDS = re.compile(r'("(?:reqId|timestamp|uptime)"\s*:\s*)-?[0-9.eE+-]+')
+
 class main(plugin_collection.Plugin):
 
     def __init__(self):
@@ -13,121 +29,360 @@ class main(plugin_collection.Plugin):
         self.description = ''
         self.type = ''
         self.enabled = True
+        self.delta = False
+        self.state_store = None
+        self.include_response = True
+        self.executor = None
+        self.workers = 0
+        # The last snapshot of every network, without the decoded replies.
+        self.snapshots = {}
+        self.lag_threshold = 0
+        # The transaction counts of every network's last poll, for the catch up rates.
+        self.ledger_history = {}
+        self.view_changes = ViewChangeTracker()
+        self.prober = None
 
     def parse_args(self, parser):
-        pass
+        parser.add_argument("--delta", action="store_true", help="Analysis Plug-in: Only return the nodes whose status, errors, warnings, software versions or ledger sync state have changed since the previous run.")
+        parser.add_argument("--state-file", default=os.environ.get('STATE_FILE') or os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "state", "monitor.db"), help="Analysis Plug-in: The SQLite file in which the state of the previous run is kept for '--delta'.  Can be specified using the 'STATE_FILE' environment variable.")
+        parser.add_argument("--lag-threshold", type=int, default=int(os.environ.get('LAG_THRESHOLD') or 100), help="Analysis Plug-in: Warn about nodes that are more than this number of transactions behind the most up to date node on any ledger, whether or not they report the ledger as synced.  Defaults to 100.  Use 0 to turn the warning off.  Can be specified using the 'LAG_THRESHOLD' environment variable.")
+        parser.add_argument("--view-history", type=int, default=int(os.environ.get('VIEW_HISTORY') or 1000), help="Analysis Plug-in: The number of polls of each network, and of its view changes, kept to report how often the view changes and how long the network goes without an agreed primary.  Defaults to 1000.  Can be specified using the 'VIEW_HISTORY' environment variable.")
+        parser.add_argument("--probe", action="store_true", help="Analysis Plug-in: Check that the client and node address of every node accept TCP connections, and report how long the connections take.")
+        parser.add_argument("--probe-concurrency", type=int, default=int(os.environ.get('PROBE_CONCURRENCY') or 100), help="Analysis Plug-in: The largest number of '--probe' connections open at once, across all of the networks.  Defaults to 100.  Can be specified using the 'PROBE_CONCURRENCY' environment variable.")
+        parser.add_argument("--probe-timeout", type=float, default=float(os.environ.get('PROBE_TIMEOUT') or 3), help="Analysis Plug-in: The number of seconds a '--probe' connection is given.  Defaults to 3.  Can be specified using the 'PROBE_TIMEOUT' environment variable.")
+        parser.add_argument("--workers", type=int, default=int(os.environ.get('ANALYSIS_WORKERS') or 0), help="Analysis Plug-in: The number of worker processes used to decode and check the node replies, so large or several networks don't hold up the event loop.  Defaults to 0 (no worker processes).  Can be specified using the 'ANALYSIS_WORKERS' environment variable.")
 
     def load_parse_args(self, args):
         global verbose
         verbose = args.verbose
 
+        self.delta = args.delta
+        if self.delta:
+            self.state_store = StateStore(args.state_file)
+
+        # Don't keep the decoded replies around when the output is projected onto fields that don't use them.
+        # Delta mode needs them for the fingerprints, and the sinks fall back on the raw replies.
+        fields = serialization.parse_fields(args.fields)
+        if fields and not self.delta:
+            self.include_response = any(path[0] == "response" for path in fields)
+
+        self.lag_threshold = args.lag_threshold
+        self.view_changes = ViewChangeTracker(args.view_history)
+        if args.probe:
+            self.prober = EndpointProber(args.probe_concurrency, args.probe_timeout, verbose=verbose)
+
+        self.workers = args.workers
+        if self.workers > 0:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+
     async def perform_operation(self, result, network_name, response, verifiers):
-        primary = ""
-        packages = {}
+        pool_data = self.new_pool_data()
+        previous_state = self.state_store.load(network_name) if self.delta else {}
+        reply_hashes = {}
+        analyzed = []
+        probes = await self.probe_endpoints(network_name, verifiers, list(response))
+
+        # Per node extraction
+        restored = set()
+        pending = []
         for node, val in response.items():
-            jsval = []
-            status = {}
-            errors = []
-            warnings = []
-            info = []
-            entry = {"name": node}
-            try:
-                await self.get_node_addresses(entry, verifiers)
-                jsval = json.loads(val)
-                if not primary:
-                    primary = await self.get_primary_name(jsval, node)
-                errors, warnings = await self.detect_issues(jsval, node, primary)
-                info = await self.get_info(jsval)
-                packages[node] = await self.get_package_info(jsval)
-            except json.JSONDecodeError:
-                errors = [val]  # likely "timeout"
-
-            # Status Summary
-            entry["status"] = await self.get_status_summary(jsval, errors)
-            # Info
-            if len(info) > 0:
-                entry["status"]["info"] = len(info)
-                entry["info"] = info
-            # Errors / Warnings
-            if len(errors) > 0:
-                entry["status"]["errors"] = len(errors)
-                entry["errors"] = errors
-            if len(warnings) > 0:
-                entry["status"]["warnings"] = len(warnings)
-                entry["warnings"] = warnings
-            # Full Response
-            if jsval:
-                entry["response"] = jsval # put into status plugin minus response 
-
-            result.append(entry)
-
-            # Package Mismatches
-            if packages:
-                await self.merge_package_mismatch_info(result, packages)
-
-            # Connection Issues
-            await self.detect_connection_issues(result)
+            if self.delta:
+                reply_hashes[node] = self.get_reply_hash(val, probes.get(node))
+                node_state = previous_state.get(node)
+                if node_state and (node_state["reply_hash"] == reply_hashes[node]):
+                    # Identical reply; skip parsing and re-use what was extracted last time for the cross node analysis.
+                    self.restore_extraction(node, node_state["extraction"], pool_data)
+                    restored.add(node)
+                    continue
+            pending.append((node, val))
+        node_statuses = await self.extract_nodes(pending)
+
+        # The nodes are checked against the primary most of them report.
+        primaries = dict(pool_data["primaries"])
+        primaries.update((node, node_status.primary) for node, node_status in node_statuses.items() if node_status.primary)
+        primary = vote(primaries.values())[0] or ""
+        for node in response:
+            if node not in restored:
+                analyzed.append(await self.add_entry(node_statuses[node], verifiers, primary, pool_data, probes.get(node)))
+
+        # Cross node analysis, once all of the nodes have been extracted.
+        await self.cross_node_analysis(pool_data, network_name, list(response))
+        self.snapshots[network_name or ""] = self.new_snapshot(network_name, response, pool_data)
+
+        if not self.delta:
+            result.extend(analyzed)
+            return result
+
+        state = {}
+        for node in response:
+            node_state = previous_state.get(node)
+            if node in pool_data["entries"]:
+                fingerprint = self.get_fingerprint(pool_data["entries"][node])
+                if (not node_state) or (node_state["fingerprint"] != fingerprint):
+                    result.append(pool_data["entries"][node])
+            else:
+                fingerprint = node_state["fingerprint"]
+            state[node] = {"reply_hash": reply_hashes[node], "fingerprint": fingerprint, "extraction": self.get_extraction(node, pool_data)}
+        self.state_store.save(network_name, state)
 
         return result
 
-    async def get_node_addresses(self, entry: any, verifiers: any) -> any:
+    def new_pool_data(self) -> dict:
+        """The per node data collected by analyze_node that is needed for the cross node analysis."""
+        return {"entries": {}, "statuses": {}, "primaries": {}, "packages": {}, "unreachable": {}, "transaction_counts": {}, "views": {}}
+
+    def new_snapshot(self, network_name: str, response: dict, pool_data: dict) -> PoolSnapshot:
+        # Nodes skipped in delta mode replied exactly as they did last time.
+        previous = self.snapshots.get(network_name or "")
+        statuses = {}
+        for node in response:
+            if node in pool_data["statuses"]:
+                statuses[node] = pool_data["statuses"][node]
+            elif previous and (node in previous.nodes):
+                statuses[node] = previous.nodes[node]
+        return PoolSnapshot(network_name, statuses)
+
+    def get_snapshot(self, network_name: str) -> PoolSnapshot:
+        """The parsed status of the nodes of the network, as of the last analysis."""
+        return self.snapshots.get(network_name or "")
+
+    def get_node_status(self, network_name: str, node: str, val: any) -> NodeStatus:
+        """The parsed status of a node's reply val, for the sinks; the one from
+        the last analysis when it was of the same reply, otherwise val is
+        parsed (i.e. in the supervisor, which runs the sinks on the results of
+        its workers, or for a node skipped by --delta)."""
+        snapshot = self.get_snapshot(network_name)
+        node_status = snapshot.nodes.get(node) if snapshot else None
+        if node_status and (node_status.reply is not None) and (node_status.reply == val):
+            return node_status
+        if not isinstance(val, (str, bytes)):
+            return NodeStatus(node, val)
+        return NodeStatus.from_reply(node, val)
+
+    def get_extraction(self, node: str, pool_data: dict) -> dict:
+        """The part of pool_data belonging to a node, as kept in the state store."""
+        return {
+            "primary": pool_data["primaries"].get(node),
+            "packages": pool_data["packages"].get(node),
+            "unreachable": pool_data["unreachable"].get(node),
+            "transaction_counts": pool_data["transaction_counts"].get(node),
+            "view": pool_data["views"].get(node),
+        }
+
+    def restore_extraction(self, node: str, extraction: dict, pool_data: dict):
+        if extraction.get("primary"):
+            pool_data["primaries"][node] = extraction["primary"]
+        if extraction.get("packages") is not None:
+            pool_data["packages"][node] = extraction["packages"]
+        if extraction.get("unreachable") is not None:
+            pool_data["unreachable"][node] = extraction["unreachable"]
+        if extraction.get("transaction_counts") is not None:
+            pool_data["transaction_counts"][node] = extraction["transaction_counts"]
+        if extraction.get("view") is not None:
+            pool_data["views"][node] = extraction["view"]
+
+    def get_reply_hash(self, val: str, probe: dict = None) -> str:
+        """The hash of a node's raw reply, without the request id, timestamp
+        and uptime, which change on every poll; any other change makes the
+        node be parsed again."""
+        if isinstance(val, bytes):
+            val = val.decode("utf-8")
+        reply_hash = hashlib.sha1(VOLATILE_FIELDS.sub(r"\1", val).encode("utf-8"))
+        if probe:
+            # A node whose reply is the same, but whose endpoints went up or down, is analyzed again.
+            reply_hash.update(json.dumps({endpoint: result.get("error") for endpoint, result in probe.items()}, sort_keys=True).encode("utf-8"))
+        return reply_hash.hexdigest()
+
+    def get_fingerprint(self, entry: any) -> str:
+        """Hash of the parts of an entry that are reported on in delta mode.  The
+        uptime and timestamp change on every run so they are left out.
+        """
+        ledger_statuses = None
+        jsval = entry.get("response")
+        if jsval and ("REPLY" in jsval["op"]) and ("Node_info" in jsval["result"]["data"]):
+            ledger_statuses = jsval["result"]["data"]["Node_info"]["Catchup_status"]["Ledger_statuses"]
+        state = {
+            "status": {key: value for key, value in entry["status"].items() if key not in ("uptime", "timestamp")},
+            "errors": entry.get("errors"),
+            "warnings": entry.get("warnings"),
+            "info": entry.get("info"),
+            "ledger_statuses": ledger_statuses,
+        }
+        return hashlib.sha1(json.dumps(state, sort_keys=True).encode("utf-8")).hexdigest()
+
+    async def analyze_node(self, node: str, val: str, verifiers: any, primary: str, pool_data: dict, probe: dict = None) -> any:
+        """Analyze a single node's reply.  The node's own primary is used when
+        primary is empty, and the primary check is skipped when it is None.
+        probe is the node's result of probe_endpoints, if any.
+        """
+        node_statuses = await self.extract_nodes([(node, val)])
+        return await self.add_entry(node_statuses[node], verifiers, primary, pool_data, probe)
+
+    async def probe_endpoints(self, network_name: str, verifiers: any, nodes: list) -> dict:
+        """Probe the client and node addresses of the nodes when --probe is
+        on, keyed by node name."""
+        if not self.prober or not verifiers:
+            return {}
+        with timings.phase(f"{network_name or 'pool'}/probe"):
+            return await self.prober.probe_nodes(network_name, verifiers, nodes)
+
+    async def extract_nodes(self, replies: list) -> dict:
+        """Parse and check a list of (node, reply) pairs, in the worker
+        processes when --workers is set, keyed by node name.
+        """
+        if not self.executor or not replies:
+            return extract_nodes(replies, self.include_response)
+        # A few chunks per worker; the replies are small enough that sending them one at a time costs more than decoding them.
+        chunk_count = min(len(replies), self.workers * 4)
+        chunks = [replies[i::chunk_count] for i in range(chunk_count)]
+        loop = asyncio.get_event_loop()
+        with timings.phase("analysis/workers"):
+            results = await asyncio.gather(*[loop.run_in_executor(self.executor, extract_nodes, chunk, self.include_response, False) for chunk in chunks])
+        node_statuses = {}
+        for chunk_result in results:
+            node_statuses.update(chunk_result)
+        # The workers don't send the raw replies back, we have them already.
+        for node, val in replies:
+            node_statuses[node].reply = val
+        return node_statuses
+
+    async def add_entry(self, node_status: NodeStatus, verifiers: any, primary: str, pool_data: dict, probe: dict = None) -> any:
+        """Build a node's entry from its parsed status, and add both to pool_data."""
+        node = node_status.name
+        await self.get_node_addresses(node_status, verifiers)
+        if probe:
+            await self.merge_probe_info(node_status, probe)
+        if node_status.decoded:
+            node_primary = node_status.primary
+            if node_primary:
+                pool_data["primaries"][node] = node_primary
+            if primary == "":
+                primary = node_primary
+            # Primary Node Mismatch; checked here as the expected primary is only known once the other nodes are extracted.
+            if (primary is not None) and (node_status.primary_check_at is not None) and (node_primary != primary):
+                node_status.warnings.insert(node_status.primary_check_at, "Primary Mismatch! This Nodes Primary: {0} (Expected: {1})".format(node_primary, primary))
+            pool_data["packages"][node] = node_status.packages
+            if node_status.has_pool_info:
+                pool_data["unreachable"][node] = node_status.unreachable_nodes
+            if isinstance(node_status.transaction_counts, dict):
+                pool_data["transaction_counts"][node] = node_status.transaction_counts
+            if node_status.has_node_info:
+                pool_data["views"][node] = [node_status.view_no, node_status.vc_in_progress, node_status.replica_primaries]
+
+        entry = node_status.to_dict(self.include_response)
+        # The entry holds the decoded reply now, if it is needed.
+        node_status.release()
+        pool_data["statuses"][node] = node_status
+        pool_data["entries"][node] = entry
+        return entry
+
+    async def cross_node_analysis(self, pool_data: dict, network_name: str = None, nodes: list = None):
+        """nodes are all of the nodes of the pool; those that didn't reply
+        count towards its quorum."""
+        nodes = list(pool_data["entries"]) if nodes is None else nodes
+        # Package Mismatches
+        if pool_data["packages"]:
+            await self.merge_package_mismatch_info(pool_data["entries"], pool_data["packages"])
+
+        # Ledger Lag
+        ledger_progress = await self.get_ledger_progress(pool_data["transaction_counts"], network_name)
+        await self.merge_ledger_lag_info(pool_data["entries"], ledger_progress)
+
+        # Connection Issues
+        await self.detect_connection_issues(pool_data["entries"], pool_data["unreachable"])
+
+        # Network Partitions
+        partitions = await self.get_partitions(pool_data["unreachable"], network_name, nodes)
+        await self.merge_partition_info(pool_data["entries"], partitions)
+
+        # View Changes
+        view_change = self.view_changes.record(network_name, pool_data["views"], len(nodes))
+        await self.merge_view_change_info(pool_data["entries"], view_change)
+
+    async def summarize(self, pool_data: dict, network_name: str = None, nodes: list = None) -> any:
+        """The results of the cross node checks as a single record, used when
+        the nodes are reported one at a time as their replies arrive.  The
+        findings are also merged into the entries in pool_data, as
+        cross_node_analysis does, for the sinks.  nodes are all of the nodes
+        of the pool, as in cross_node_analysis.
+        """
+        self.snapshots[network_name or ""] = PoolSnapshot(network_name, dict(pool_data["statuses"]))
+        entries = pool_data["entries"]
+        nodes = list(entries) if nodes is None else nodes
+        summary = {"nodes": len(entries)}
+
+        # Primary Node Mismatch; the nodes are checked against the primary most of them report.
+        primaries = pool_data["primaries"]
+        if primaries:
+            primary = vote(primaries.values())[0]
+            summary["primary"] = primary
+            primary_mismatches = {node: node_primary for node, node_primary in primaries.items() if node_primary != primary}
+            if primary_mismatches:
+                summary["primary_mismatch"] = primary_mismatches
+                await self.merge_primary_mismatch_info(entries, pool_data["statuses"], primary_mismatches, primary)
+
+        view_change = self.view_changes.record(network_name, pool_data["views"], len(nodes))
+        await self.merge_view_change_info(entries, view_change)
+        summary["view"] = {key: value for key, value in self.view_changes.get_stats(network_name).items() if key != "primary_mismatch"}
+
+        package_warnings = await self.check_package_versions(pool_data["packages"])
+        if package_warnings:
+            summary["package_mismatch"] = package_warnings
+            await self.merge_package_mismatch_info(entries, pool_data["packages"])
+
+        connection_errors = await self.get_connection_errors(pool_data["unreachable"])
+        if connection_errors:
+            summary["connection_issues"] = connection_errors
+            await self.detect_connection_issues(entries, pool_data["unreachable"])
+
+        partitions = await self.get_partitions(pool_data["unreachable"], network_name, nodes)
+        summary["connectivity"] = {key: value for key, value in partitions.items() if (key != "partitions") or partitions["partitioned"]}
+        await self.merge_partition_info(entries, partitions)
+
+        ledger_progress = await self.get_ledger_progress(pool_data["transaction_counts"], network_name)
+        if ledger_progress:
+            summary["ledgers"] = {ledger: {"max": progress["max"], "median": progress["median"]} for ledger, progress in ledger_progress.items()}
+            ledger_lag = await self.get_ledger_lag_warnings(ledger_progress)
+            if ledger_lag:
+                summary["ledger_lag"] = ledger_lag
+                await self.merge_ledger_lag_info(entries, ledger_progress)
+
+        return {"summary": summary}
+
+    async def get_node_addresses(self, node_status: NodeStatus, verifiers: any) -> any:
         if verifiers:
-            node_name = entry["name"]
+            node_name = node_status.name
             if "client_addr" in verifiers[node_name]:
-                entry["client-address"] = verifiers[node_name]["client_addr"]
+                node_status.client_address = verifiers[node_name]["client_addr"]
             if "node_addr" in verifiers[node_name]:
-                entry["node-address"] = verifiers[node_name]["node_addr"]
-
-    async def get_primary_name(self, jsval: any, node: str) -> str:
-        primary = ""
-        if "REPLY" in jsval["op"]:
-            if "Node_info" in jsval["result"]["data"]:
-                primary = jsval["result"]["data"]["Node_info"]["Replicas_status"][node+":0"]["Primary"]
-        return primary
-
-    async def get_status_summary(self, jsval: any, errors: list) -> any:
-        status = {}
-        status["ok"] = (len(errors) <= 0)
-        if jsval and ("REPLY" in jsval["op"]):
-            if "Node_info" in jsval["result"]["data"]:
-                status["uptime"] = str(datetime.timedelta(seconds = jsval["result"]["data"]["Node_info"]["Metrics"]["uptime"]))
-            if "timestamp" in jsval["result"]["data"]:
-                status["timestamp"] = jsval["result"]["data"]["timestamp"]
-            else:
-                status["timestamp"] = datetime.datetime.now().strftime('%s')
-            if "Software" in jsval["result"]["data"]:
-                status["software"] = {}
-                status["software"]["indy-node"] = jsval["result"]["data"]["Software"]["indy-node"]
-                status["software"]["sovrin"] = jsval["result"]["data"]["Software"]["sovrin"]
-
-        return status
-
-    async def get_package_info(self, jsval: any) -> any:
-        packages = {}
-        if jsval and ("REPLY" in jsval["op"]):
-            if "Software" in jsval["result"]["data"]:
-                for installed_package in jsval["result"]["data"]["Software"]["Installed_packages"]:
-                    package, version = installed_package.split()
-                    packages[package] = version
-
-        return packages
-
-    async def get_info(self, jsval: any) -> any:
-        info = []
-        if ("REPLY" in jsval["op"]) and ("Extractions" in jsval["result"]["data"]):
-            # Pending Upgrade
-            if jsval["result"]["data"]["Extractions"]["upgrade_log"]:
-                current_upgrade_status = jsval["result"]["data"]["Extractions"]["upgrade_log"][-1]
-                if "succeeded" not in current_upgrade_status:
-                    info.append("Pending Upgrade: {0}".format(current_upgrade_status.replace('\t', '  ').replace('\n', '')))
-
-        return info
-
-    async def merge_package_mismatch_info(self, result: any, packages: any):
+                node_status.node_address = verifiers[node_name]["node_addr"]
+
+    async def merge_probe_info(self, node_status: NodeStatus, probe: dict):
+        node_status.probe = probe
+        for endpoint, result in probe.items():
+            if not result["reachable"]:
+                # Tells a host or port that is down from a node that is up but not replying.
+                node_status.errors.append("{0} address unreachable: {1} ({2})".format(endpoint.capitalize(), result["address"], result["error"]))
+                node_status.status["ok"] = False
+
+    async def merge_primary_mismatch_info(self, entries: any, statuses: dict, primary_mismatches: dict, primary: str):
+        for node_name, node_primary in primary_mismatches.items():
+            if node_name not in entries:
+                continue
+            entry_to_update = entries[node_name]
+            primary_check_at = statuses[node_name].primary_check_at
+            warnings = entry_to_update.setdefault("warnings", [])
+            warnings.insert(len(warnings) if primary_check_at is None else primary_check_at, "Primary Mismatch! This Nodes Primary: {0} (Expected: {1})".format(node_primary, primary))
+            entry_to_update["status"]["warnings"] = len(warnings)
+
+    async def merge_package_mismatch_info(self, entries: any, packages: any):
         package_warnings = await self.check_package_versions(packages)
         if package_warnings:
             for node_name in package_warnings:
-                entry_to_update = [t for t in result if t["name"] == node_name][0]
+                if node_name not in entries:
+                    # Unchanged node that was not re-analyzed.
+                    continue
+                entry_to_update = entries[node_name]
                 if "warnings" in entry_to_update:
                     for item in package_warnings[node_name]:
                         entry_to_update["warnings"].append(item)
@@ -135,111 +390,266 @@ class main(plugin_collection.Plugin):
                     entry_to_update["warnings"] = package_warnings[node_name]
                 entry_to_update["status"]["warnings"] = len(entry_to_update["warnings"])
 
+    async def get_ledger_progress(self, transaction_counts: dict, network_name: str = None) -> dict:
+        """Compare the transaction counts of the nodes, ledger by ledger.  For
+        every ledger returns the highest and median count, and for every node
+        how far it is behind the highest count (lag).  When the previous poll
+        of the network is known, also how fast each lagging node is catching
+        up (transactions per second) and when it should be in sync.
+        """
+        now = time.time()
+        previous_time, previous_counts = self.ledger_history.get(network_name or "", (None, {}))
+        self.ledger_history[network_name or ""] = (now, transaction_counts)
+
+        # One column of counts per ledger, rather than walking every node for every ledger.
+        columns = {}
+        for node, counts in transaction_counts.items():
+            for ledger, count in counts.items():
+                if isinstance(count, int):
+                    columns.setdefault(ledger, ([], []))
+                    columns[ledger][0].append(node)
+                    columns[ledger][1].append(count)
+
+        progress = {}
+        for ledger, (nodes, counts) in columns.items():
+            ordered = sorted(counts)
+            middle = len(ordered) // 2
+            median = ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+            highest = ordered[-1]
+            ledger_progress = {"max": highest, "median": median, "lag": {}, "catch_up_rate": {}, "eta_seconds": {}}
+            previous_column = [previous.get(ledger) for previous in previous_counts.values() if isinstance(previous.get(ledger), int)]
+            previous_highest = max(previous_column) if previous_column else None
+            for node, count in zip(nodes, counts):
+                lag = highest - count
+                ledger_progress["lag"][node] = lag
+                previous_count = previous_counts.get(node, {}).get(ledger)
+                if lag and (previous_highest is not None) and isinstance(previous_count, int) and (now > previous_time):
+                    # How much of the gap the node closed since the previous poll.
+                    rate = ((previous_highest - previous_count) - lag) / (now - previous_time)
+                    ledger_progress["catch_up_rate"][node] = round(rate, 3)
+                    if rate > 0:
+                        ledger_progress["eta_seconds"][node] = round(lag / rate)
+            progress[ledger] = ledger_progress
+        return progress
+
+    async def get_ledger_lag_warnings(self, ledger_progress: dict) -> dict:
+        warnings = {}
+        if not self.lag_threshold:
+            return warnings
+        for ledger, progress in ledger_progress.items():
+            for node, lag in progress["lag"].items():
+                if lag > self.lag_threshold:
+                    ledger_lag = {"lag": lag, "max": progress["max"]}
+                    if node in progress["catch_up_rate"]:
+                        ledger_lag["catch_up_rate"] = progress["catch_up_rate"][node]
+                    if node in progress["eta_seconds"]:
+                        ledger_lag["eta_seconds"] = progress["eta_seconds"][node]
+                    warnings.setdefault(node, {})[ledger] = ledger_lag
+        return warnings
+
+    async def merge_ledger_lag_info(self, entries: any, ledger_progress: dict):
+        ledger_lag = await self.get_ledger_lag_warnings(ledger_progress)
+        for node_name, ledgers in ledger_lag.items():
+            if node_name not in entries:
+                # Unchanged node that was not re-analyzed.
+                continue
+            entry_to_update = entries[node_name]
+            entry_to_update.setdefault("warnings", []).append({"ledger_lag": ledgers})
+            entry_to_update["status"]["warnings"] = len(entry_to_update["warnings"])
+
     async def check_package_versions(self, packages: any) -> any:
+        # Build a version histogram for every package once, rather than comparing every node with every other node.
+        histogram = {}
+        for package_list in packages.values():
+            for package, version in package_list.items():
+                versions = histogram.setdefault(package, {})
+                versions[version] = versions.get(version, 0) + 1
+
+        totals = {}
+        common_versions = {}
+        for package, versions in histogram.items():
+            totals[package] = sum(versions.values())
+            common_versions[package] = max(versions, key=versions.get)
+
         warnings = {}
         for node, package_list in packages.items():
             mismatches = []
             for package, version in package_list.items():
-                total = 0
-                same = 0
-                other_version = ""
-                for comp_node, comp_package_list in packages.items():
-                    if package in comp_package_list:
-                        total +=1
-                        comp_version = comp_package_list[package]
-                        if comp_version == version:
-                            same +=1
-                        else:
-                            other_version = comp_version
-                if (same/total) < .5:
+                versions = histogram[package]
+                if (versions[version]/totals[package]) < .5:
+                    other_version = common_versions[package]
+                    if other_version == version:
+                        # No majority at all; report the most common of the other versions.
+                        other_version = max((v for v in versions if v != version), key=versions.get)
                     mismatches.append("Package mismatch: '{0}' has '{1}' {2}, while most other nodes have '{1}' {3}".format(node, package, version, other_version))
             if mismatches:
                 warnings[node] = mismatches
         return warnings
 
-    async def detect_issues(self, jsval: any, node: str, primary: str) -> Tuple[any, any]:
-        errors = []
-        warnings = []
-        ledger_sync_status={}
-        if "REPLY" in jsval["op"]:
-            if "Node_info" in jsval["result"]["data"]:
-                # Ledger Write Consensus Issues
-                if not jsval["result"]["data"]["Node_info"]["Freshness_status"]["0"]["Has_write_consensus"]:
-                    errors.append("Config Ledger Has_write_consensus: {0}".format(jsval["result"]["data"]["Node_info"]["Freshness_status"]["0"]["Has_write_consensus"]))
-                if not jsval["result"]["data"]["Node_info"]["Freshness_status"]["1"]["Has_write_consensus"]:
-                    errors.append("Main Ledger Has_write_consensus: {0}".format(jsval["result"]["data"]["Node_info"]["Freshness_status"]["1"]["Has_write_consensus"]))
-                if not jsval["result"]["data"]["Node_info"]["Freshness_status"]["2"]["Has_write_consensus"]:
-                    errors.append("Pool Ledger Has_write_consensus: {0}".format(jsval["result"]["data"]["Node_info"]["Freshness_status"]["2"]["Has_write_consensus"]))
-                if "1001" in  jsval["result"]["data"]["Node_info"]["Freshness_status"]:
-                    if not jsval["result"]["data"]["Node_info"]["Freshness_status"]["1001"]["Has_write_consensus"]:
-                        errors.append("Token Ledger Has_write_consensus: {0}".format(jsval["result"]["data"]["Node_info"]["Freshness_status"]["1001"]["Has_write_consensus"]))
-
-                # Ledger Status
-                for ledger, status in jsval["result"]["data"]["Node_info"]["Catchup_status"]["Ledger_statuses"].items():
-                    if status != "synced":
-                        ledger_sync_status[ledger] = status
-                if ledger_sync_status:
-                    ledger_status = {}
-                    ledger_status["ledger_status"] = ledger_sync_status
-                    ledger_status["ledger_status"]["transaction-count"] = jsval["result"]["data"]["Node_info"]["Metrics"]["transaction-count"]
-                    warnings.append(ledger_status)
-
-                # Mode
-                if jsval["result"]["data"]["Node_info"]["Mode"] != "participating":
-                    warnings.append("Mode: {0}".format(jsval["result"]["data"]["Node_info"]["Mode"]))
-
-                # Primary Node Mismatch
-                if jsval["result"]["data"]["Node_info"]["Replicas_status"][node+":0"]["Primary"] != primary:
-                    warnings.append("Primary Mismatch! This Nodes Primary: {0} (Expected: {1})".format(jsval["result"]["data"]["Node_info"]["Replicas_status"][node+":0"]["Primary"], primary))
-
-                # Unreachable Nodes
-                if jsval["result"]["data"]["Pool_info"]["Unreachable_nodes_count"] > 0:
-                    unreachable_node_list = []
-                    unreachable_nodes = {"unreachable_nodes":{}}
-                    unreachable_nodes["unreachable_nodes"]["count"] = jsval["result"]["data"]["Pool_info"]["Unreachable_nodes_count"]
-                    for unreachable_node in jsval["result"]["data"]["Pool_info"]["Unreachable_nodes"]:
-                        unreachable_node_list.append(unreachable_node[0])
-                    unreachable_nodes["unreachable_nodes"]["nodes"] = ', '.join(unreachable_node_list)
-                    warnings.append(unreachable_nodes)
-
-                # Denylisted Nodes
-                if len(jsval["result"]["data"]["Pool_info"]["Blacklisted_nodes"]) > 0:
-                    warnings.append("Denylisted Nodes: {0}".format(jsval["result"]["data"]["Pool_info"]["Blacklisted_nodes"]))
-        else:
-            if "reason" in jsval:
-                errors.append(jsval["reason"])
-            else:
-                errors.append("unknown error")
-
-        return errors, warnings
-
-    async def detect_connection_issues(self, result: any) -> any:
-        for node in result:
-            connection_errors = []
-            node_name = node["name"]
-            if "warnings" in node:
-                for warning in node["warnings"]:
-                    if "unreachable_nodes" in warning :
-                        for item in warning["unreachable_nodes"]["nodes"].split(', '):
-                            # This is the name of the unreachable node.  Now we need to determine whether that node can't see the current one.
-                            # If the nodes can't see each other, upgrade to an error condition.
-                            unreachable_node_name = item
-                            unreachable_node_query_result = [t for t in result if t["name"] == unreachable_node_name]
-                            if unreachable_node_query_result:
-                                unreachable_node = unreachable_node_query_result[0]
-                                if "warnings" in unreachable_node:
-                                    for unreachable_node_warning in unreachable_node["warnings"]:
-                                        if "unreachable_nodes" in unreachable_node_warning :
-                                            for unreachable_node_item in unreachable_node_warning["unreachable_nodes"]["nodes"].split(', '):
-                                                if unreachable_node_item == node_name:
-                                                    connection_errors.append(node_name + " and " + unreachable_node_name + " can't reach each other.")
+    async def get_connection_errors(self, unreachable: any) -> any:
+        connection_errors = {}
+        unreachable_sets = {node_name: set(unreachable_nodes) for node_name, unreachable_nodes in unreachable.items()}
+        for node_name, unreachable_nodes in unreachable.items():
+            # If the nodes can't see each other, upgrade to an error condition.
+            node_errors = []
+            for unreachable_node_name in unreachable_nodes:
+                if node_name in unreachable_sets.get(unreachable_node_name, ()):
+                    node_errors.append(node_name + " and " + unreachable_node_name + " can't reach each other.")
+            if node_errors:
+                connection_errors[node_name] = node_errors
+        return connection_errors
 
+    async def detect_connection_issues(self, entries: any, unreachable: any) -> any:
+        connection_errors = await self.get_connection_errors(unreachable)
+        for node_name, node_errors in connection_errors.items():
+            if node_name not in entries:
+                # Unchanged node that was not re-analyzed.
+                continue
             # Merge errors and update status
-            if connection_errors:
-                if "errors" in node:
-                    for item in connection_errors:
-                        node["errors"].append(item)
-                else:
-                    node["errors"] = connection_errors
+            node = entries[node_name]
+            if "errors" in node:
+                for item in node_errors:
+                    node["errors"].append(item)
+            else:
+                node["errors"] = node_errors
+            node["status"]["errors"] = len(node["errors"])
+            node["status"]["ok"] = (len(node["errors"]) <= 0)
+
+    async def get_partitions(self, unreachable: dict, network_name: str = None, nodes: list = None) -> dict:
+        """The partitions of the pool; nodes are all of its nodes, those not
+        in unreachable didn't report their connections."""
+        matrix = ConnectivityMatrix.from_unreachable(unreachable, sorted(unreachable if nodes is None else nodes))
+        with timings.phase("analysis/partitions"):
+            return matrix.partitions()
+
+    async def merge_partition_info(self, entries: any, partitions: dict):
+        if not partitions["partitioned"]:
+            return
+        for partition in partitions["partitions"]:
+            if partition["quorum"]:
+                continue
+            for node_name in partition["nodes"]:
+                # Nodes skipped in delta mode have no entry.
+                if node_name not in entries:
+                    continue
+                node = entries[node_name]
+                node.setdefault("errors", []).append("Network partition! This node is in a partition of {0} of {1} nodes, short of the {2} needed for consensus: {3}".format(partition["size"], partitions["nodes"], partitions["quorum"], ", ".join(partition["nodes"])))
                 node["status"]["errors"] = len(node["errors"])
-                node["status"]["ok"] = (len(node["errors"]) <= 0)
\ No newline at end of file
+                node["status"]["ok"] = False
+
+    async def merge_view_change_info(self, entries: any, view_change: dict):
+        """Let the new primary's entry tell of the view change that made it
+        the primary."""
+        if not view_change:
+            return
+        node_name = view_change["to_primary"].rsplit(":", 1)[0]
+        if node_name not in entries:
+            return
+        node = entries[node_name]
+        node.setdefault("info", []).append("View change: Became the primary of view {0} (from {1} in view {2}), in at most {3:.0f}s".format(view_change["to_view"], view_change["from_primary"], view_change["from_view"], view_change["duration"]))
+        node["status"]["info"] = len(node["info"])
+
+
+# The per node extraction is done by plain functions returning plain data, so
+# it can be run in worker processes.
+
+def extract_nodes(replies: list, keep_response: bool = True, keep_reply: bool = True) -> dict:
+    node_statuses = {}
+    for node, val in replies:
+        node_status = extract_node(node, val, keep_response)
+        if not keep_reply:
+            node_status.reply = None
+        node_statuses[node] = node_status
+    return node_statuses
+
+
+def extract_node(node: str, val: str, keep_response: bool = True) -> NodeStatus:
+    """Parse a node's reply and run the checks that only need that reply."""
+    node_status = NodeStatus.from_reply(node, val, keep_response)
+    if node_status.decoded:
+        node_status.errors, node_status.warnings, node_status.primary_check_at = detect_issues(node_status)
+        node_status.info = get_info(node_status)
+    else:
+        node_status.errors = [val]  # likely "timeout"
+    node_status.status = get_status_summary(node_status)
+    return node_status
+
+
+def get_status_summary(node_status: NodeStatus) -> any:
+    status = {}
+    status["ok"] = (len(node_status.errors) <= 0)
+    if node_status.decoded and node_status.is_reply:
+        if node_status.has_node_info:
+            status["uptime"] = str(datetime.timedelta(seconds = node_status.uptime))
+        if node_status.timestamp is not None:
+            status["timestamp"] = node_status.timestamp
+        else:
+            status["timestamp"] = datetime.datetime.now().strftime('%s')
+        if node_status.software:
+            status["software"] = dict(node_status.software)
+
+    return status
+
+
+def get_info(node_status: NodeStatus) -> any:
+    info = []
+    if node_status.is_reply and node_status.has_extractions:
+        # Pending Upgrade
+        if node_status.upgrade_status:
+            current_upgrade_status = node_status.upgrade_status
+            if "succeeded" not in current_upgrade_status:
+                info.append("Pending Upgrade: {0}".format(current_upgrade_status.replace('\t', '  ').replace('\n', '')))
+
+    return info
+
+
+def detect_issues(node_status: NodeStatus) -> Tuple[any, any, any]:
+    """The errors and warnings of a node's reply, and the position in the
+    warnings of the primary mismatch check (None when there is nothing to
+    check), which is made once the expected primary is known.
+    """
+    errors = []
+    warnings = []
+    primary_check_at = None
+    ledger_sync_status={}
+    if node_status.is_reply:
+        if node_status.has_node_info:
+            # Ledger Write Consensus Issues
+            for ledger, ledger_name in (("0", "Config"), ("1", "Main"), ("2", "Pool"), ("1001", "Token")):
+                if (ledger in node_status.write_consensus) and not node_status.write_consensus[ledger]:
+                    errors.append("{0} Ledger Has_write_consensus: {1}".format(ledger_name, node_status.write_consensus[ledger]))
+
+            # Ledger Status
+            for ledger, status in node_status.ledger_statuses.items():
+                if status != "synced":
+                    ledger_sync_status[ledger] = status
+            if ledger_sync_status:
+                ledger_status = {}
+                ledger_status["ledger_status"] = ledger_sync_status
+                ledger_status["ledger_status"]["transaction-count"] = node_status.transaction_counts
+                warnings.append(ledger_status)
+
+            # Mode
+            if node_status.mode != "participating":
+                warnings.append("Mode: {0}".format(node_status.mode))
+
+            # Primary Node Mismatch
+            primary_check_at = len(warnings)
+
+            # Unreachable Nodes
+            if node_status.unreachable_count > 0:
+                unreachable_nodes = {"unreachable_nodes":{}}
+                unreachable_nodes["unreachable_nodes"]["count"] = node_status.unreachable_count
+                unreachable_nodes["unreachable_nodes"]["nodes"] = ', '.join(node_status.unreachable_nodes)
+                warnings.append(unreachable_nodes)
+
+            # Denylisted Nodes
+            if len(node_status.blacklisted_nodes) > 0:
+                warnings.append("Denylisted Nodes: {0}".format(node_status.blacklisted_nodes))
+    else:
+        if node_status.reason is not None:
+            errors.append(node_status.reason)
+        else:
+            errors.append("unknown error")
+
+    return errors, warnings, primary_check_at
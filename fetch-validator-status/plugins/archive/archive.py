@@ -0,0 +1,50 @@
+import plugin_collection
+import asyncio
+import os
+import sys
+import time
+
+class main(plugin_collection.Plugin):
+
+    def __init__(self):
+        super().__init__()
+        self.index = 8
+        self.name = 'Archive'
+        self.description = ''
+        self.type = plugin_collection.SINK
+        self.archive = None
+
+    def parse_args(self, parser):
+        parser.add_argument("--archive", action="store_true", help="Archive Plug-in: Keep the raw reply of every node, compressed, in a local archive, so the replies of any poll can be read back.")
+        parser.add_argument("--archive-dir", default=os.environ.get('ARCHIVE_DIR') or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "archive"), help="Archive Plug-in: The folder of the archive.  Can be specified using the 'ARCHIVE_DIR' environment variable.")
+        parser.add_argument("--archive-codec", choices=["zlib", "zstd"], default=os.environ.get('ARCHIVE_CODEC') or "zlib", help="Archive Plug-in: The compression used for the replies; zstd needs the zstandard package.  Defaults to zlib.  Can be specified using the 'ARCHIVE_CODEC' environment variable.")
+        parser.add_argument("--archive-segment-size", type=int, default=int(os.environ.get('ARCHIVE_SEGMENT_SIZE') or 64), help="Archive Plug-in: The size, in MB, after which a new segment file is started.  Defaults to 64.  Can be specified using the 'ARCHIVE_SEGMENT_SIZE' environment variable.")
+        parser.add_argument("--archive-retention", type=int, default=int(os.environ.get('ARCHIVE_RETENTION') or 0), help="Archive Plug-in: The number of days to keep the segment files.  Defaults to 0, which keeps them forever.  Can be specified using the 'ARCHIVE_RETENTION' environment variable.")
+
+    def load_parse_args(self, args):
+        global verbose
+        verbose = args.verbose
+
+        self.enabled = args.archive
+        if self.enabled:
+            from .snapshots import SnapshotArchive, get_codec
+            try:
+                get_codec(args.archive_codec)
+            except ImportError as e:
+                print(f"Archive Plug-in: {e}  Install it or use '--archive-codec zlib'.", file=sys.stderr)
+                exit()
+            self.archive = SnapshotArchive(args.archive_dir, args.archive_codec, args.archive_segment_size * 1024 * 1024, args.archive_retention)
+
+    async def perform_operation(self, result, network_name, response, verifiers):
+        now = time.time()
+        replies = [(network_name, node, reply) for node, reply in response.items()]
+        # Compressing the replies of a large network takes a while; keep it off the event loop.
+        loop = asyncio.get_event_loop()
+        written = await loop.run_in_executor(None, self.archive.append, replies, now)
+        log(f"Archived {written['frames']} replies of {network_name or 'the pool'}; {written['bytes']} bytes compressed to {written['compressed_bytes']} bytes.")
+        return result
+
+
+def log(*args):
+    if verbose:
+        print(*args, "\n", file=sys.stderr)
@@ -0,0 +1,432 @@
+"""
+An archive of the raw validator info replies of the nodes.
+
+Every reply is compressed on its own, as a frame, and appended to a segment
+file.  A new segment is started once the current one grows past the segment
+size.  An archive opened for writing carries on with the last segment, with
+its dictionary and the keyframes found through its index, unless it is full
+or was written with another codec.
+
+The replies differ little from node to node, and a node's reply differs
+little from poll to poll, so each frame is compressed against a dictionary:
+
+  - The first reply of a node in a segment (its keyframe) is compressed
+    against the segment's shared dictionary; the largest reply of the first
+    poll written to the segment.
+  - The node's later replies are compressed against its keyframe.  A reply
+    that is more than twice the size of the keyframe (i.e. the keyframe was
+    "timeout") becomes the node's new keyframe.
+
+zlib is used, or zstd when the zstandard package is installed.  zlib only
+makes use of the last 32KB of a dictionary, so the large replies (with the
+Extractions logs) compress far better with zstd.
+
+Every segment has a side index with one fixed-width record per frame; the
+time of the poll, the (network, node) key, the offset and length of the
+frame, and the offset and length of its keyframe.  Keys are mapped to small
+integer ids in keys.json.  The frames are flushed to disk (fsync) before their
+index records are written, so the index never points past the end of a
+segment, even when the machine goes down, and a partially written trailing
+record is ignored.  Segments older than the retention are deleted when new replies are
+written.
+
+The reader keeps the index records of every segment by key, sorted by time,
+so a node's reply at a given time is found with a binary search.  It memory
+maps the segment and only decompresses the one frame, and its keyframe.
+
+Run this file directly to read from the archive, see --help.
+"""
+
+import argparse
+import bisect
+import datetime
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+CODECS = {"zlib": 0, "zstd": 1}
+
+# magic, version, codec
+HEADER = struct.Struct("<4sBB2x")
+MAGIC = b"IVIA"
+VERSION = 1
+
+# timestamp, key id, offset, length, length uncompressed, keyframe offset, keyframe length
+INDEX_RECORD = struct.Struct("<dIQIIQI")
+
+# zlib only looks back 32KB, so a longer dictionary is of no use to it.
+ZLIB_DICTIONARY_SIZE = 32 * 1024
+ZSTD_DICTIONARY_SIZE = 256 * 1024
+
+
+def get_codec(name: str):
+    if name == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("The 'zstandard' package is needed for zstd compression.")
+        return zstandard
+    return zlib
+
+
+class SnapshotArchive(object):
+
+    def __init__(self, path: str, codec: str = "zlib", segment_size: int = 64 * 1024 * 1024, retention: int = 0, level: int = None):
+        if codec not in CODECS:
+            raise ValueError("Unknown codec '{0}'. Known codecs: {1}".format(codec, ", ".join(CODECS)))
+        self.path = path
+        self.codec = codec
+        self.segment_size = segment_size
+        # Days; 0 keeps every segment.
+        self.retention = retention
+        self.level = level
+        os.makedirs(path, exist_ok=True)
+        self.keys = self.load_json("keys.json", {})
+        self.key_names = {key_id: key for key, key_id in self.keys.items()}
+        # The writer's current segment, the compressor using its dictionary, and the keyframe of each key.
+        self.segment = None
+        self.compress_keyframe = None
+        self.keyframes = {}
+        # The reader's index records of every segment, by key.
+        self.key_indexes = {}
+        # Appends are made from the event loop's executor, one poll at a time.
+        self.lock = threading.Lock()
+
+    # --- Writing ---
+
+    def append(self, replies: list, now: float = None) -> dict:
+        """Append replies, a list of (network, node, reply) tuples, all taken at
+        now.  Returns the number of frames and bytes written, before and after
+        compression."""
+        now = now or time.time()
+        replies = [(network, node, reply.encode("utf-8") if isinstance(reply, str) else reply) for network, node, reply in replies if reply is not None]
+        if not replies:
+            return {"frames": 0, "bytes": 0, "compressed_bytes": 0}
+        with self.lock:
+            segment = self.get_segment(max(replies, key=lambda item: len(item[2]))[2])
+            new_keys = False
+            frames = []
+            index_records = []
+            offset = os.path.getsize(self.segment_path(segment))
+            for network, node, reply in replies:
+                key = self.key(network, node)
+                if key not in self.keys:
+                    self.keys[key] = len(self.keys) + 1
+                    self.key_names[self.keys[key]] = key
+                    new_keys = True
+                keyframe = self.keyframes.get(self.keys[key])
+                if (keyframe is None) or (len(reply) > 2 * keyframe["size"]):
+                    frame = self.compress_keyframe(reply)
+                    keyframe = self.keyframes[self.keys[key]] = {"offset": offset, "length": len(frame), "size": len(reply), "compress": self.get_compressor(reply)}
+                else:
+                    frame = keyframe["compress"](reply)
+                frames.append(frame)
+                index_records.append(INDEX_RECORD.pack(now, self.keys[key], offset, len(frame), len(reply), keyframe["offset"], keyframe["length"]))
+                offset += len(frame)
+
+            if new_keys:
+                self.save_json("keys.json", self.keys)
+            with open(self.segment_path(segment), "ab") as segment_file:
+                segment_file.write(b"".join(frames))
+                self.sync(segment_file)
+            with open(self.index_path(segment), "ab") as index_file:
+                index_file.write(b"".join(index_records))
+                self.sync(index_file)
+            self.expire(now)
+
+        raw_bytes = sum(len(reply) for _, _, reply in replies)
+        return {"frames": len(frames), "bytes": raw_bytes, "compressed_bytes": sum(len(frame) for frame in frames)}
+
+    def get_segment(self, sample: bytes) -> int:
+        """The segment to write to, starting a new one, with the sample as
+        its dictionary, when there is none yet or the current one is full."""
+        if self.segment is None:
+            self.reopen_segment()
+        if (self.segment is None) or (os.path.getsize(self.segment_path(self.segment)) >= self.segment_size):
+            segments = self.segments()
+            self.segment = (segments[-1] + 1) if segments else 1
+            dictionary = self.trim_dictionary(sample)
+            self.compress_keyframe = self.get_compressor(dictionary)
+            self.keyframes = {}
+            self.write_file(self.dictionary_path(self.segment), dictionary)
+            self.write_file(self.segment_path(self.segment), HEADER.pack(MAGIC, VERSION, CODECS[self.codec]))
+        return self.segment
+
+    def reopen_segment(self):
+        """Carry on with the last segment, when it isn't full and uses the
+        same codec; its dictionary is read back, and the keyframe of every key
+        is decompressed to compress the key's next replies against."""
+        segments = self.segments()
+        if not segments:
+            return
+        segment = segments[-1]
+        try:
+            if (os.path.getsize(self.segment_path(segment)) >= self.segment_size) or (self.read_codec(segment) != self.codec):
+                return
+            dictionary = self.read_dictionary(segment)
+        except (OSError, ValueError, struct.error):
+            return
+        # Drop a partially written trailing record, so the records appended to it line up.
+        index_size = os.path.getsize(self.index_path(segment)) if os.path.exists(self.index_path(segment)) else 0
+        if index_size % INDEX_RECORD.size:
+            with open(self.index_path(segment), "r+b") as index_file:
+                index_file.truncate(index_size - (index_size % INDEX_RECORD.size))
+        latest = {}
+        for _, key_id, _, _, _, keyframe_offset, keyframe_length in self.read_index(segment):
+            latest[key_id] = (keyframe_offset, keyframe_length)
+        keyframes = {}
+        for key_id, (keyframe_offset, keyframe_length) in latest.items():
+            keyframe = self.read_frame(segment, keyframe_offset, keyframe_length, keyframe_offset, keyframe_length)
+            keyframes[key_id] = {"offset": keyframe_offset, "length": keyframe_length, "size": len(keyframe), "compress": self.get_compressor(keyframe)}
+        self.segment = segment
+        self.compress_keyframe = self.get_compressor(dictionary)
+        self.keyframes = keyframes
+
+    def trim_dictionary(self, dictionary: bytes) -> bytes:
+        return dictionary[-(ZLIB_DICTIONARY_SIZE if self.codec == "zlib" else ZSTD_DICTIONARY_SIZE):]
+
+    def get_compressor(self, dictionary: bytes):
+        """A function compressing data against the dictionary."""
+        dictionary = self.trim_dictionary(dictionary)
+        codec = get_codec(self.codec)
+        if self.codec == "zstd":
+            compressor = codec.ZstdCompressor(level=self.level or 3, dict_data=codec.ZstdCompressionDict(dictionary, dict_type=codec.DICT_TYPE_RAWCONTENT))
+            return compressor.compress
+        level = self.level if self.level is not None else 6
+
+        def compress(data: bytes) -> bytes:
+            compressor = zlib.compressobj(level, zdict=dictionary)
+            return compressor.compress(data) + compressor.flush()
+        return compress
+
+    def expire(self, now: float):
+        if not self.retention:
+            return
+        cutoff = now - (self.retention * 86400)
+        for segment in self.segments():
+            if segment == self.segment:
+                continue
+            if os.path.getmtime(self.segment_path(segment)) <= cutoff:
+                for file_path in (self.segment_path(segment), self.index_path(segment), self.dictionary_path(segment)):
+                    os.remove(file_path)
+                self.key_indexes.pop(segment, None)
+
+    # --- Reading ---
+
+    def get(self, network: str, node: str, at: float = None) -> dict:
+        """The node's reply from the latest poll at or before at (the latest
+        one when at is None), as {"timestamp", "network", "node", "reply"};
+        None when there is none."""
+        found = self.find(network, node, at)
+        if found is None:
+            return None
+        segment, (timestamp, _, offset, length, _, keyframe_offset, keyframe_length) = found
+        return {"timestamp": timestamp, "network": network, "node": node, "reply": self.read_frame(segment, offset, length, keyframe_offset, keyframe_length).decode("utf-8")}
+
+    def find(self, network: str, node: str, at: float = None):
+        """The segment and index record of the node's frame from the latest
+        poll at or before at."""
+        key_id = self.keys.get(self.key(network, node))
+        if key_id is None:
+            return None
+        for segment in reversed(self.segments()):
+            timestamps, records = self.key_index(segment).get(key_id, ([], []))
+            position = len(timestamps) if at is None else bisect.bisect_right(timestamps, at)
+            if position:
+                return segment, records[position - 1]
+        return None
+
+    def key_index(self, segment: int) -> dict:
+        """The index records of a segment by key id, as (timestamps, records)
+        sorted by time.  The index is read once; later calls only read the
+        records appended to it since."""
+        cached = self.key_indexes.setdefault(segment, {"length": 0, "keys": {}})
+        try:
+            with open(self.index_path(segment), "rb") as index_file:
+                index_file.seek(cached["length"])
+                data = index_file.read()
+        except OSError:
+            return cached["keys"]
+        # Ignore a partially written trailing record; it's read again once complete.
+        data = data[:len(data) - (len(data) % INDEX_RECORD.size)]
+        cached["length"] += len(data)
+        for record in INDEX_RECORD.iter_unpack(data):
+            timestamps, records = cached["keys"].setdefault(record[1], ([], []))
+            position = bisect.bisect_right(timestamps, record[0])
+            timestamps.insert(position, record[0])
+            records.insert(position, record)
+        return cached["keys"]
+
+    def history(self, network: str = None, node: str = None, start: float = 0, end: float = None) -> list:
+        """The frames between start and end, of the given network and node (or
+        all of them), without their replies."""
+        frames = []
+        for segment in self.segments():
+            for timestamp, key_id, offset, length, raw_length, _, _ in self.read_index(segment):
+                if (timestamp < start) or ((end is not None) and (timestamp >= end)):
+                    continue
+                frame_network, frame_node = self.key_names[key_id].split("|", 1)
+                if ((network is not None) and (frame_network != network)) or ((node is not None) and (frame_node != node)):
+                    continue
+                frames.append({"timestamp": timestamp, "network": frame_network, "node": frame_node, "segment": segment, "offset": offset, "bytes": raw_length, "compressed_bytes": length})
+        return frames
+
+    def read_frame(self, segment: int, offset: int, length: int, keyframe_offset: int, keyframe_length: int) -> bytes:
+        codec = self.read_codec(segment)
+        dictionary = self.read_dictionary(segment)
+        with open(self.segment_path(segment), "rb") as segment_file:
+            with mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ) as segment_map:
+                keyframe = self.decompress(codec, segment_map[keyframe_offset:keyframe_offset + keyframe_length], dictionary)
+                if offset == keyframe_offset:
+                    return keyframe
+                return self.decompress(codec, segment_map[offset:offset + length], keyframe)
+
+    @staticmethod
+    def decompress(codec: str, frame: bytes, dictionary: bytes) -> bytes:
+        if codec == "zstd":
+            zstandard = get_codec("zstd")
+            dictionary = dictionary[-ZSTD_DICTIONARY_SIZE:]
+            return zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT)).decompress(frame)
+        return zlib.decompressobj(zdict=dictionary[-ZLIB_DICTIONARY_SIZE:]).decompress(frame)
+
+    def read_index(self, segment: int):
+        """Yield the index records of a segment, oldest first."""
+        try:
+            with open(self.index_path(segment), "rb") as index_file:
+                data = index_file.read()
+        except OSError:
+            return
+        # Ignore a partially written trailing record.
+        data = data[:len(data) - (len(data) % INDEX_RECORD.size)]
+        yield from INDEX_RECORD.iter_unpack(data)
+
+    def read_codec(self, segment: int) -> str:
+        with open(self.segment_path(segment), "rb") as segment_file:
+            magic, version, codec = HEADER.unpack(segment_file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("'{0}' is not an archive segment.".format(self.segment_path(segment)))
+        codecs = {value: name for name, value in CODECS.items()}
+        return codecs[codec]
+
+    def read_dictionary(self, segment: int) -> bytes:
+        with open(self.dictionary_path(segment), "rb") as dictionary_file:
+            return dictionary_file.read()
+
+    def segments(self) -> list:
+        """The numbers of the segments, oldest first."""
+        return sorted(int(file_name[:-len(".seg")]) for file_name in os.listdir(self.path) if file_name.endswith(".seg") and file_name[:-len(".seg")].isdigit())
+
+    def list_keys(self) -> list:
+        return [dict(zip(("network", "node"), key.split("|", 1))) for key in self.keys]
+
+    # --- Helpers ---
+
+    @staticmethod
+    def key(network: str, node: str) -> str:
+        return "|".join([network or "", node])
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.path, "{0:08d}.seg".format(segment))
+
+    def index_path(self, segment: int) -> str:
+        return os.path.join(self.path, "{0:08d}.idx".format(segment))
+
+    def dictionary_path(self, segment: int) -> str:
+        return os.path.join(self.path, "{0:08d}.dict".format(segment))
+
+    def write_file(self, file_path: str, data: bytes):
+        fd, temp_path = tempfile.mkstemp(dir=self.path, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(data)
+            self.sync(temp_file)
+        os.replace(temp_path, file_path)
+        self.sync_directory()
+
+    def load_json(self, file_name: str, default: any) -> any:
+        try:
+            with open(os.path.join(self.path, file_name)) as json_file:
+                return json.load(json_file)
+        except (OSError, ValueError):
+            return default
+
+    def save_json(self, file_name: str, value: any):
+        fd, temp_path = tempfile.mkstemp(dir=self.path, prefix=".tmp-")
+        with os.fdopen(fd, "w") as temp_file:
+            json.dump(value, temp_file)
+            self.sync(temp_file)
+        os.replace(temp_path, os.path.join(self.path, file_name))
+        self.sync_directory()
+
+    @staticmethod
+    def sync(open_file):
+        open_file.flush()
+        os.fsync(open_file.fileno())
+
+    def sync_directory(self):
+        """Makes the files renamed into the archive's folder durable."""
+        if not hasattr(os, "O_DIRECTORY"):
+            # Windows can't open a folder.
+            return
+        fd = os.open(self.path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for time_format in ("%Y-%m-%d", "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.datetime.strptime(value, time_format).replace(tzinfo=datetime.timezone.utc).timestamp()
+        except ValueError:
+            pass
+    raise ValueError("Unable to parse the time '{0}'".format(value))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read the raw node replies kept in the archive.")
+    parser.add_argument("--dir", default=os.environ.get('ARCHIVE_DIR') or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "archive"), help="The archive folder.  Can be specified using the 'ARCHIVE_DIR' environment variable.")
+    parser.add_argument("--list", action="store_true", help="List the networks and nodes in the archive.")
+    parser.add_argument("--history", action="store_true", help="List the archived replies of the network and node (or all of them) between '--from' and '--to', without the replies themselves.")
+    parser.add_argument("--network", help="The network name.")
+    parser.add_argument("--node", help="The node name.")
+    parser.add_argument("--at", default=None, help="Get the node's reply from the latest poll at or before this time, as a unix timestamp or an ISO date (UTC).  Defaults to the latest poll.")
+    parser.add_argument("--from", dest="start", default="0", help="Start of the '--history' range, as a unix timestamp or an ISO date (UTC).")
+    parser.add_argument("--to", dest="end", default=None, help="End of the '--history' range, as a unix timestamp or an ISO date (UTC).  Defaults to now.")
+    args = parser.parse_args()
+
+    archive = SnapshotArchive(args.dir)
+    if args.list:
+        print(json.dumps(archive.list_keys(), indent=2))
+        exit()
+    if args.history:
+        end = parse_time(args.end) if args.end else None
+        print(json.dumps(archive.history(args.network, args.node, parse_time(args.start), end), indent=2))
+        exit()
+    if not args.node:
+        print("--node is required to get a reply.", file=sys.stderr)
+        exit(1)
+    try:
+        frame = archive.get(args.network, args.node, parse_time(args.at) if args.at else None)
+    except ImportError as e:
+        print(e, file=sys.stderr)
+        exit(1)
+    if frame is None:
+        print("There is no reply from '{0}' in the archive.".format(args.node), file=sys.stderr)
+        exit(1)
+    try:
+        frame["reply"] = json.loads(frame["reply"])
+    except ValueError:
+        # i.e. "timeout"
+        pass
+    print(json.dumps(frame, indent=2))
@@ -1,5 +1,9 @@
+import asyncio
 import os
+import sys
 import fnmatch 
+import json
+import tempfile
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 
@@ -15,20 +19,104 @@ def gspread_authZ(gauth_json):
     scope = ["https://spreadsheets.google.com/feeds",'https://www.googleapis.com/auth/spreadsheets',"https://www.googleapis.com/auth/drive.file","https://www.googleapis.com/auth/drive"]
     auth_file = find_file(gauth_json)
     if not auth_file:
-        print("\033[1;31;40mUnable to find the Google API Credentials json file! Make sure the file is in the './conf' folder and name you specified is correct.")
-        print("Json name entered: " + gauth_json + ".\033[m")
-        exit()
+        print("\033[1;31;40mUnable to find the Google API Credentials json file! Make sure the file is in the './conf' folder and name you specified is correct.", file=sys.stderr)
+        print("Json name entered: " + gauth_json + ".\033[m", file=sys.stderr)
+        raise FileNotFoundError(gauth_json)
 
     creds = ServiceAccountCredentials.from_json_keyfile_name(auth_file, scope) # Set credentials using json file
     authD_client = gspread.authorize(creds) # Authorize json file
     return(authD_client)
 
 # Insert data in sheet
-def gspread_append_sheet(authD_client, file_name, worksheet_name, row):
-    try:
-        sheet = authD_client.open(file_name).worksheet(worksheet_name) # Open sheet
-        sheet.append_row(row, value_input_option='USER_ENTERED') # Append sheet
-    except:
-        print("\033[1;31;40mUnable to upload data to sheet! Please check file and worksheet name and try again.")
-        print("File name entered: " + file_name + ". Worksheet name entered: " + worksheet_name + ".\033[m")
-        exit()
\ No newline at end of file
+class SheetSink(object):
+    """Buffers rows in a local spool file and appends them to a worksheet in
+    batches.  The authorized client and worksheet handle are kept between
+    flushes, the upload runs off the event loop, and failed uploads are retried
+    with backoff.  Rows that still can't be uploaded stay in the spool for the
+    next flush, so a Google Sheets outage never stops the monitor.
+    """
+
+    def __init__(self, gauth_json, file_name, worksheet_name, spool_path, batch_size = 100, attempts = 3, backoff = 2):
+        self.gauth_json = gauth_json
+        self.file_name = file_name
+        self.worksheet_name = worksheet_name
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.attempts = attempts
+        self.backoff = backoff
+        self.client = None
+        self.worksheet = None
+        self.lock = asyncio.Lock()
+        spool_dir = os.path.dirname(os.path.abspath(spool_path))
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def enqueue(self, row):
+        with open(self.spool_path, "a") as spool:
+            spool.write(json.dumps(row) + "\n")
+            spool.flush()
+            os.fsync(spool.fileno())
+
+    def read_spool(self):
+        if not os.path.exists(self.spool_path):
+            return []
+        rows = []
+        with open(self.spool_path) as spool:
+            for line in spool:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    # Partially written line.
+                    pass
+        return rows
+
+    def drop_spooled(self, count):
+        # Rows may have been added to the spool while uploading, so only drop the ones that were sent.
+        self.write_spool(self.read_spool()[count:])
+
+    def write_spool(self, rows):
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.spool_path)), prefix=".tmp-")
+        with os.fdopen(fd, "w") as spool:
+            for row in rows:
+                spool.write(json.dumps(row) + "\n")
+        os.replace(temp_path, self.spool_path)
+
+    def get_worksheet(self):
+        if not self.worksheet:
+            if not self.client:
+                self.client = gspread_authZ(self.gauth_json)
+            self.worksheet = self.client.open(self.file_name).worksheet(self.worksheet_name)
+        return self.worksheet
+
+    def append_rows(self, rows):
+        try:
+            self.get_worksheet().append_rows(rows, value_input_option='USER_ENTERED')
+        except:
+            # Re-open the worksheet (and re-authorize) on the next attempt.
+            self.client = None
+            self.worksheet = None
+            raise
+
+    async def flush(self):
+        """Upload the spooled rows.  Returns the number of rows uploaded."""
+        async with self.lock:
+            rows = self.read_spool()
+            uploaded = 0
+            loop = asyncio.get_event_loop()
+            while uploaded < len(rows):
+                batch = rows[uploaded:uploaded + self.batch_size]
+                attempt = 0
+                while True:
+                    try:
+                        await loop.run_in_executor(None, self.append_rows, batch)
+                        break
+                    except Exception as e:
+                        attempt += 1
+                        if attempt >= self.attempts:
+                            print("\033[1;31;40mUnable to upload data to sheet! {0} row(s) are kept in {1} for the next run.".format(len(rows) - uploaded, self.spool_path), file=sys.stderr)
+                            print("File name entered: " + self.file_name + ". Worksheet name entered: " + self.worksheet_name + ". Error: " + str(e) + "\033[m", file=sys.stderr)
+                            self.drop_spooled(uploaded)
+                            return uploaded
+                        await asyncio.sleep(self.backoff ** attempt)
+                uploaded += len(batch)
+            self.drop_spooled(uploaded)
+            return uploaded
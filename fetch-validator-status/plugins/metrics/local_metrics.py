@@ -0,0 +1,72 @@
+import plugin_collection
+from .timeseries import TimeSeriesStore
+from node_status import NodeStatus
+import asyncio
+import os
+import time
+
+class main(plugin_collection.Plugin):
+
+    def __init__(self):
+        super().__init__()
+        self.index = 5
+        self.name = 'Local Metrics'
+        self.description = ''
+        self.type = plugin_collection.SINK
+        self.depends_on = ['Analysis']
+        self.store = None
+
+    def parse_args(self, parser):
+        parser.add_argument("--tslog", action="store_true", help="Local Metrics Plug-in: Record the per node metrics (status, uptime, transaction counts, catchup status, unreachable nodes) in a local time series store.")
+        parser.add_argument("--ts-dir", default=os.environ.get('TS_DIR') or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "timeseries"), help="Local Metrics Plug-in: The folder of the time series store.  Can be specified using the 'TS_DIR' environment variable.")
+        parser.add_argument("--ts-retention", default=os.environ.get('TS_RETENTION'), help="Local Metrics Plug-in: The number of days to keep each resolution, i.e. '1m=7,1h=90,1d=1825' (the default).  Use 0 to keep a resolution forever.  Can be specified using the 'TS_RETENTION' environment variable.")
+
+    def load_parse_args(self, args):
+        global verbose
+        verbose = args.verbose
+
+        self.enabled = args.tslog
+        if self.enabled:
+            retention = {}
+            if args.ts_retention:
+                for item in args.ts_retention.split(","):
+                    resolution, days = item.split("=")
+                    retention[resolution.strip()] = int(days)
+            self.store = TimeSeriesStore(args.ts_dir, retention)
+
+    async def perform_operation(self, result, network_name, response, verifiers):
+        now = time.time()
+        entries = {entry["name"]: entry for entry in result if "name" in entry}
+        analysis = self.dependencies["Analysis"]
+        samples = []
+        for node, val in response.items():
+            for metric, value in self.get_node_metrics(entries.get(node), analysis.get_node_status(network_name, node, val)).items():
+                samples.append((now, network_name, node, metric, value))
+        # Rolling up and expiring the segments reads them back; keep it off the event loop.
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.store.append, samples, now)
+        return result
+
+    def get_node_metrics(self, entry: any, node_status: NodeStatus) -> dict:
+        metrics = {}
+        if entry:
+            metrics["ok"] = 1 if entry["status"]["ok"] else 0
+            metrics["errors"] = entry["status"].get("errors", 0)
+            metrics["warnings"] = entry["status"].get("warnings", 0)
+
+        # The other plug-ins may have removed the response from the entries, so use the parsed reply.
+        if not node_status.decoded:
+            metrics["responding"] = 0
+            return metrics
+        metrics["responding"] = 1
+
+        if node_status.is_reply and node_status.has_node_info:
+            metrics["uptime"] = node_status.uptime
+            if isinstance(node_status.transaction_counts, dict):
+                for ledger, count in node_status.transaction_counts.items():
+                    metrics["transaction-count." + ledger] = count
+            for ledger, status in node_status.ledger_statuses.items():
+                metrics["synced." + ledger] = 1 if status == "synced" else 0
+            if node_status.has_pool_info:
+                metrics["unreachable"] = node_status.unreachable_count
+        return metrics
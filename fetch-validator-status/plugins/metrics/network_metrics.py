@@ -1,8 +1,8 @@
 import plugin_collection
-from .google_sheets import gspread_authZ, gspread_append_sheet
 import datetime
 import argparse
 import os
+import sys
 
 class main(plugin_collection.Plugin):
     
@@ -11,10 +11,12 @@ class main(plugin_collection.Plugin):
         self.index = 4
         self.name = 'Network Metrics'
         self.description = ''
-        self.type = ''
+        self.type = plugin_collection.SINK
+        self.depends_on = ['Analysis']
         self.gauth_json = None
         self.file_name = None
         self.worksheet_name = None
+        self.sink = None
 
 
     def parse_args(self, parser):
@@ -22,6 +24,7 @@ class main(plugin_collection.Plugin):
         parser.add_argument("--json", default=os.environ.get('JSON') , help="Google API Credentials json file name (file must be in root folder). Can be specified using the 'JSON' environment variable.", nargs='*')
         parser.add_argument("--file", default=os.environ.get('FILE') , help="Specify which google sheets file you want to log too. Can be specified using the 'FILE' environment variable.", nargs='*')
         parser.add_argument("--worksheet", default=os.environ.get('WORKSHEET') , help="Specify which worksheet you want to log too. Can be specified using the 'WORKSHEET' environment variable.", nargs='*')
+        parser.add_argument("--sheet-spool", default=os.environ.get('SHEET_SPOOL') or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "spool", "sheets.jsonl"), help="The local file in which rows are kept until they have been uploaded to google sheets. Can be specified using the 'SHEET_SPOOL' environment variable.")
 
     def load_parse_args(self, args):
         global verbose
@@ -41,14 +44,15 @@ class main(plugin_collection.Plugin):
                 self.gauth_json = args.json
                 self.file_name = args.file
                 self.worksheet_name = args.worksheet
+                # gspread and oauth2client are only loaded when the plug-in is enabled.
+                from .google_sheets import SheetSink
+                self.sink = SheetSink(self.gauth_json, self.file_name, self.worksheet_name, args.sheet_spool)
             else:
-                print('Metrics log argument uses google sheets api and requires, Google API Credentials json file name (file must be in root folder), google sheet file name and worksheet name.')
-                print('ex: --mlog --json [Json File Name] --file [Google Sheet File Name] --worksheet [Worksheet name]')
+                print('Metrics log argument uses google sheets api and requires, Google API Credentials json file name (file must be in root folder), google sheet file name and worksheet name.', file=sys.stderr)
+                print('ex: --mlog --json [Json File Name] --file [Google Sheet File Name] --worksheet [Worksheet name]', file=sys.stderr)
                 exit()
 
     async def perform_operation(self, result, network_name, response, verifiers):
-
-        authD_client = gspread_authZ(self.gauth_json)
         message = ""
         num_of_nodes = 0
         nodes_offline = 0
@@ -68,7 +72,15 @@ class main(plugin_collection.Plugin):
         active_nodes = num_of_nodes - nodes_offline
 
         row = [time, network_name, num_of_nodes, nodes_offline, networkResilience, active_nodes, message]
-        print(row)
-        gspread_append_sheet(authD_client, self.file_name, self.worksheet_name, row)
-        print(f"\033[92mPosted to {self.file_name} in sheet {self.worksheet_name}.\033[m")
-        return result
\ No newline at end of file
+        # stdout is kept for the result.
+        log(row)
+        self.sink.enqueue(row)
+        uploaded = await self.sink.flush()
+        if uploaded:
+            print(f"\033[92mPosted {uploaded} row(s) to {self.file_name} in sheet {self.worksheet_name}.\033[m", file=sys.stderr)
+        return result
+
+
+def log(*args):
+    if verbose:
+        print(*args, "\n", file=sys.stderr)
@@ -0,0 +1,288 @@
+"""
+A small embedded time series store for the node metrics.
+
+Samples are appended to fixed-width binary segment files, one set of segments
+per resolution:
+
+  1m - raw samples, bucketed to the minute, one segment per day.
+  1h - hourly rollups of the 1m samples, one segment per month.
+  1d - daily rollups of the 1h rollups, one segment per year.
+
+Every rollup record holds the count, min, max and sum of the samples it
+covers.  Series are identified by a (network, node, metric) key which is
+mapped to a small integer id in series.json.  Segments that are older than the
+retention of their resolution are deleted when new samples are written.
+
+Writes hold a lock on the store, a lock file for the other processes writing
+to the same folder, so series ids are never handed out twice.
+
+Run this file directly to query the store, see --help.
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows; only the writers of this process are kept apart.
+    fcntl = None
+
+RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+DEFAULT_RETENTION = {"1m": 7, "1h": 90, "1d": 1825}  # days
+
+# timestamp, series id, count, min, max, sum
+RECORD = struct.Struct("<IIIddd")
+
+
+class TimeSeriesStore(object):
+
+    def __init__(self, path: str, retention: dict = None):
+        self.path = path
+        self.retention = dict(DEFAULT_RETENTION)
+        if retention:
+            self.retention.update(retention)
+        os.makedirs(path, exist_ok=True)
+        self.series = self.load_json("series.json", {})
+        # Appends are made from the event loop's executor.
+        self.lock = threading.Lock()
+
+    # --- Writing ---
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Hold the store's lock, against the other threads of this process
+        and the other processes writing to the same folder."""
+        with self.lock:
+            with open(os.path.join(self.path, ".lock"), "a") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                yield
+
+    def append(self, samples: list, now: float = None):
+        """Append samples, a list of (timestamp, network, node, metric, value)
+        tuples, then roll up and expire the segments as needed.
+        """
+        now = now or time.time()
+        with self.locked():
+            self.append_locked(samples, now)
+
+    def append_locked(self, samples: list, now: float):
+        if any(self.series_key(network, node, metric) not in self.series for _, network, node, metric, value in samples if value is not None):
+            # Another process may have added series since they were loaded.
+            self.series.update(self.load_json("series.json", {}))
+        segments = {}
+        new_series = False
+        for timestamp, network, node, metric, value in samples:
+            if value is None:
+                continue
+            key = self.series_key(network, node, metric)
+            if key not in self.series:
+                self.series[key] = len(self.series) + 1
+                new_series = True
+            bucket = int(timestamp) // 60 * 60
+            value = float(value)
+            record = RECORD.pack(bucket, self.series[key], 1, value, value, value)
+            segments.setdefault(self.segment_path("1m", bucket), []).append(record)
+
+        if new_series:
+            self.save_json("series.json", self.series)
+        for segment_path, records in segments.items():
+            os.makedirs(os.path.dirname(segment_path), exist_ok=True)
+            with open(segment_path, "ab") as segment:
+                segment.write(b"".join(records))
+
+        self.rollup(now)
+        self.expire(now)
+
+    def rollup(self, now: float):
+        """Roll the complete hours of 1m samples up into 1h records, and the
+        complete days of 1h records up into 1d records.
+        """
+        state = self.load_json("rollup.json", {})
+        for source, target in (("1m", "1h"), ("1h", "1d")):
+            period = RESOLUTIONS[target]
+            last_complete = int(now) // period * period
+            start = state.get(target)
+            if start is None:
+                # Nothing has been rolled up yet, start from the oldest source record.
+                oldest = self.oldest_timestamp(source)
+                if oldest is None:
+                    continue
+                start = oldest // period * period
+            if start >= last_complete:
+                continue
+
+            buckets = {}
+            for timestamp, series_id, count, minimum, maximum, total in self.read(source, start, last_complete):
+                bucket_key = (timestamp // period * period, series_id)
+                bucket = buckets.get(bucket_key)
+                if bucket is None:
+                    buckets[bucket_key] = [count, minimum, maximum, total]
+                else:
+                    bucket[0] += count
+                    bucket[1] = min(bucket[1], minimum)
+                    bucket[2] = max(bucket[2], maximum)
+                    bucket[3] += total
+
+            segments = {}
+            for (timestamp, series_id), (count, minimum, maximum, total) in sorted(buckets.items()):
+                record = RECORD.pack(timestamp, series_id, count, minimum, maximum, total)
+                segments.setdefault(self.segment_path(target, timestamp), []).append(record)
+            for segment_path, records in segments.items():
+                os.makedirs(os.path.dirname(segment_path), exist_ok=True)
+                with open(segment_path, "ab") as segment:
+                    segment.write(b"".join(records))
+
+            state[target] = last_complete
+            self.save_json("rollup.json", state)
+
+    def expire(self, now: float):
+        for resolution, days in self.retention.items():
+            if not days:
+                continue
+            cutoff = now - (days * 86400)
+            for segment_path, segment_start, segment_end in self.segments(resolution):
+                if segment_end <= cutoff:
+                    os.remove(segment_path)
+
+    # --- Reading ---
+
+    def query(self, network: str, node: str, metric: str, start: float, end: float, resolution: str = "1m") -> list:
+        """Return the records of one series between start and end as dicts."""
+        series_id = self.series.get(self.series_key(network, node, metric))
+        if series_id is None:
+            return []
+        records = []
+        for timestamp, record_series_id, count, minimum, maximum, total in self.read(resolution, start, end):
+            if record_series_id == series_id:
+                if resolution == "1m":
+                    records.append({"timestamp": timestamp, "value": total})
+                else:
+                    records.append({"timestamp": timestamp, "count": count, "min": minimum, "max": maximum, "avg": total / count})
+        return records
+
+    def read(self, resolution: str, start: float, end: float):
+        """Yield the raw records with start <= timestamp < end."""
+        for segment_path, segment_start, segment_end in self.segments(resolution):
+            if (segment_end <= start) or (segment_start >= end):
+                continue
+            with open(segment_path, "rb") as segment:
+                data = segment.read()
+            # Ignore a partially written trailing record.
+            data = data[:len(data) - (len(data) % RECORD.size)]
+            for record in RECORD.iter_unpack(data):
+                if start <= record[0] < end:
+                    yield record
+
+    def oldest_timestamp(self, resolution: str):
+        oldest = None
+        for segment_path, segment_start, segment_end in self.segments(resolution):
+            with open(segment_path, "rb") as segment:
+                data = segment.read()
+            data = data[:len(data) - (len(data) % RECORD.size)]
+            for record in RECORD.iter_unpack(data):
+                if (oldest is None) or (record[0] < oldest):
+                    oldest = record[0]
+            if oldest is not None:
+                break
+        return oldest
+
+    def segments(self, resolution: str):
+        """Yield (path, start, end) for every segment of the resolution, oldest first."""
+        segment_dir = os.path.join(self.path, resolution)
+        if not os.path.isdir(segment_dir):
+            return
+        for file_name in sorted(os.listdir(segment_dir)):
+            if not file_name.endswith(".seg"):
+                continue
+            segment_start, segment_end = self.segment_range(resolution, file_name[:-len(".seg")])
+            yield os.path.join(segment_dir, file_name), segment_start, segment_end
+
+    def list_series(self) -> list:
+        return [dict(zip(("network", "node", "metric"), key.split("|", 2))) for key in self.series]
+
+    # --- Helpers ---
+
+    @staticmethod
+    def series_key(network: str, node: str, metric: str) -> str:
+        return "|".join([network or "", node, metric])
+
+    def segment_path(self, resolution: str, timestamp: int) -> str:
+        moment = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+        if resolution == "1m":
+            name = moment.strftime("%Y-%m-%d")
+        elif resolution == "1h":
+            name = moment.strftime("%Y-%m")
+        else:
+            name = moment.strftime("%Y")
+        return os.path.join(self.path, resolution, name + ".seg")
+
+    @staticmethod
+    def segment_range(resolution: str, name: str):
+        utc = datetime.timezone.utc
+        if resolution == "1m":
+            start = datetime.datetime.strptime(name, "%Y-%m-%d").replace(tzinfo=utc)
+            end = start + datetime.timedelta(days=1)
+        elif resolution == "1h":
+            start = datetime.datetime.strptime(name, "%Y-%m").replace(tzinfo=utc)
+            end = (start + datetime.timedelta(days=32)).replace(day=1)
+        else:
+            start = datetime.datetime.strptime(name, "%Y").replace(tzinfo=utc)
+            end = start.replace(year=start.year + 1)
+        return start.timestamp(), end.timestamp()
+
+    def load_json(self, file_name: str, default: any) -> any:
+        try:
+            with open(os.path.join(self.path, file_name)) as json_file:
+                return json.load(json_file)
+        except (OSError, ValueError):
+            return default
+
+    def save_json(self, file_name: str, value: any):
+        fd, temp_path = tempfile.mkstemp(dir=self.path, prefix=".tmp-")
+        with os.fdopen(fd, "w") as temp_file:
+            json.dump(value, temp_file)
+        os.replace(temp_path, os.path.join(self.path, file_name))
+
+
+def parse_time(value: str) -> float:
+    if value.isdigit():
+        return float(value)
+    for time_format in ("%Y-%m-%d", "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.datetime.strptime(value, time_format).replace(tzinfo=datetime.timezone.utc).timestamp()
+        except ValueError:
+            pass
+    raise ValueError("Unable to parse the time '{0}'".format(value))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the node metrics time series store.")
+    parser.add_argument("--dir", default=os.environ.get('TS_DIR') or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "timeseries"), help="The time series store folder.  Can be specified using the 'TS_DIR' environment variable.")
+    parser.add_argument("--list", action="store_true", help="List the series in the store.")
+    parser.add_argument("--network", help="The network name.")
+    parser.add_argument("--node", help="The node name.")
+    parser.add_argument("--metric", help="The metric name, i.e. uptime or transaction-count.ledger.")
+    parser.add_argument("--from", dest="start", default="0", help="Start of the range, as a unix timestamp or an ISO date (UTC).")
+    parser.add_argument("--to", dest="end", default=None, help="End of the range, as a unix timestamp or an ISO date (UTC).  Defaults to now.")
+    parser.add_argument("--resolution", choices=RESOLUTIONS.keys(), default="1m", help="The resolution to read.  Defaults to 1m.")
+    args = parser.parse_args()
+
+    store = TimeSeriesStore(args.dir)
+    if args.list:
+        print(json.dumps(store.list_series(), indent=2))
+        exit()
+    if not (args.node and args.metric):
+        print("--node and --metric are required to query a series.", file=sys.stderr)
+        exit(1)
+    end = parse_time(args.end) if args.end else time.time()
+    print(json.dumps(store.query(args.network, args.node, args.metric, parse_time(args.start), end, args.resolution), indent=2))
@@ -0,0 +1,204 @@
+import plugin_collection
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from state_store import AlertStore
+
+CATEGORIES = ["errors", "warnings", "info"]
+
+class main(plugin_collection.Plugin):
+
+    def __init__(self):
+        super().__init__()
+        self.index = 7
+        self.name = 'Webhook Notifications'
+        self.description = ''
+        self.type = plugin_collection.SINK
+        self.depends_on = ['Analysis']
+        self.urls = []
+        self.categories = []
+        self.window = 0
+        self.batch_size = 0
+        # Each post is tried 3 times, 1s and 2s (less a little jitter) apart.
+        self.attempts = 3
+        self.backoff = 1
+        self.request_timeout = 10
+        self.delta = False
+        self.store = None
+        self.executor = None
+
+    def parse_args(self, parser):
+        parser.add_argument("--webhook", action="append", help="Webhook Notifications Plug-in: Post the new and resolved alerts to the given URL; may be given more than once.  Can be specified, comma delimited, using the 'WEBHOOK_URLS' environment variable.")
+        parser.add_argument("--notify-categories", default=os.environ.get('NOTIFY_CATEGORIES') or "errors,warnings", help="Webhook Notifications Plug-in: The comma delimited categories of alerts to notify about; errors, warnings and/or info.  Defaults to 'errors,warnings'.  Can be specified using the 'NOTIFY_CATEGORIES' environment variable.")
+        parser.add_argument("--notify-window", type=int, default=int(os.environ.get('NOTIFY_WINDOW') or 3600), help="Webhook Notifications Plug-in: The number of seconds during which an alert that was announced is not announced again, when it resolves and comes back (flaps).  Defaults to 3600.  Can be specified using the 'NOTIFY_WINDOW' environment variable.")
+        parser.add_argument("--notify-batch-size", type=int, default=int(os.environ.get('NOTIFY_BATCH_SIZE') or 100), help="Webhook Notifications Plug-in: The largest number of alerts posted in a single request.  Defaults to 100.  Can be specified using the 'NOTIFY_BATCH_SIZE' environment variable.")
+
+    def load_parse_args(self, args):
+        global verbose
+        verbose = args.verbose
+
+        self.urls = list(args.webhook or [])
+        if not self.urls and os.environ.get('WEBHOOK_URLS'):
+            self.urls = [url.strip() for url in os.environ['WEBHOOK_URLS'].split(",") if url.strip()]
+        self.enabled = bool(self.urls)
+        self.categories = [category.strip() for category in args.notify_categories.split(",") if category.strip() in CATEGORIES]
+        self.window = args.notify_window
+        self.batch_size = max(1, args.notify_batch_size)
+        # In delta mode the nodes that haven't changed are left out of the result, their alerts still stand.
+        self.delta = getattr(args, "delta", False)
+        if self.enabled:
+            # The Analysis plug-in's state file.
+            self.store = AlertStore(args.state_file)
+            # Shared by every post, so a slow webhook can't tie up the event loop's default executor.
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+
+    async def perform_operation(self, result, network_name, response, verifiers):
+        now = time.time()
+        alerts = self.store.load(network_name)
+        current = self.get_alerts(result)
+        # The nodes whose alerts are known; the other nodes' alerts are left as they are.
+        nodes = set(entry["name"] for entry in result if "name" in entry)
+        if not self.delta:
+            nodes.update(response.keys())
+
+        new_alerts = []
+        for fingerprint, alert in current.items():
+            stored = alerts.get(fingerprint)
+            if (stored is None) or (stored["resolved_at"] is not None):
+                stored = alerts[fingerprint] = dict(alert, first_seen=now, announced=stored["announced"] if stored else False, notified_at=stored["notified_at"] if stored else None, resolved_at=None)
+            stored["last_seen"] = now
+            stored["message"] = alert["message"]
+            # An alert that flaps is only announced again once the window has passed.
+            if not stored["announced"] and ((stored["notified_at"] is None) or (now - stored["notified_at"] >= self.window)):
+                new_alerts.append(fingerprint)
+
+        resolved_alerts = []
+        for fingerprint, stored in alerts.items():
+            if (fingerprint in current) or (stored["resolved_at"] is not None) or (stored["node"] not in nodes):
+                continue
+            if stored["announced"]:
+                resolved_alerts.append(fingerprint)
+            else:
+                stored["resolved_at"] = now
+
+        events = [self.get_event(network_name, fingerprint, alerts[fingerprint], "new") for fingerprint in new_alerts]
+        events.extend(self.get_event(network_name, fingerprint, alerts[fingerprint], "resolved", now) for fingerprint in resolved_alerts)
+        for fingerprint in new_alerts:
+            alerts[fingerprint]["announced"] = True
+            alerts[fingerprint]["notified_at"] = now
+        for fingerprint in resolved_alerts:
+            alerts[fingerprint]["announced"] = False
+            alerts[fingerprint]["resolved_at"] = now
+
+        # Every webhook has an outbox of its own, so one that is down neither holds back nor repeats the alerts of the others.
+        outbox = self.store.load_outbox(network_name)
+        if events or any(outbox.get(url) for url in self.urls):
+            outbox = await self.notify(network_name, events, outbox)
+            self.store.save_outbox(network_name, outbox)
+        self.store.save(network_name, alerts, purge_before=now - self.window)
+        return result
+
+    def get_alerts(self, result: list) -> dict:
+        alerts = {}
+        for entry in result:
+            if "name" not in entry:
+                continue
+            for category in self.categories:
+                for message in entry.get(category, []):
+                    fingerprint = self.get_fingerprint(entry["name"], category, message)
+                    alerts[fingerprint] = {"node": entry["name"], "category": category, "message": message}
+        return alerts
+
+    @staticmethod
+    def get_fingerprint(node: str, category: str, message: any) -> str:
+        """Identifies an alert across polls.  Structured messages (i.e.
+        {"ledger_lag": {...}}) are identified by their keys, as their details
+        change from poll to poll."""
+        if isinstance(message, dict):
+            message = sorted(message.keys())
+        return hashlib.sha1(json.dumps([node, category, message]).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def get_event(network_name: str, fingerprint: str, alert: dict, state: str, resolved_at: float = None) -> dict:
+        event = {
+            "state": state,
+            "fingerprint": fingerprint,
+            "network": network_name,
+            "node": alert["node"],
+            "category": alert["category"],
+            "message": alert["message"],
+            "first_seen": alert["first_seen"],
+        }
+        if resolved_at is not None:
+            event["resolved_at"] = resolved_at
+        return event
+
+    async def notify(self, network_name: str, events: list, outbox: dict) -> dict:
+        """Post the events, after those left in its outbox, to every webhook
+        in batches.  Returns the outbox of every webhook; the events that
+        couldn't be delivered and are to be sent again on the next poll."""
+        posts = []
+        for url in self.urls:
+            pending = []
+            sent = set()
+            for event in outbox.get(url, []) + events:
+                # An alert that is still waiting to be announced (or resolved) is only sent once.
+                if (event["fingerprint"], event["state"]) not in sent:
+                    sent.add((event["fingerprint"], event["state"]))
+                    pending.append(event)
+            for i in range(0, len(pending), self.batch_size):
+                batch = pending[i:i + self.batch_size]
+                new_count = sum(1 for event in batch if event["state"] == "new")
+                body = json.dumps({
+                    "text": f"{network_name or 'pool'}: {new_count} new and {len(batch) - new_count} resolved alert(s)",
+                    "network": network_name,
+                    "alerts": batch,
+                }).encode("utf-8")
+                posts.append((url, batch, self.post(url, body)))
+        done = await asyncio.gather(*[post for _, _, post in posts])
+        outbox = {}
+        for (url, batch, _), posted in zip(posts, done):
+            if not posted:
+                outbox.setdefault(url, []).extend(batch)
+        return outbox
+
+    async def post(self, url: str, body: bytes) -> bool:
+        """Post the body to the webhook; False when it couldn't be reached and
+        should be sent again.  A post the webhook rejects (4xx) is dropped, as
+        sending it again won't help."""
+        loop = asyncio.get_event_loop()
+        for attempt in range(1, self.attempts + 1):
+            try:
+                await loop.run_in_executor(self.executor, self.send, url, body)
+                return True
+            except urllib.error.HTTPError as e:
+                # The request itself was rejected; sending it again won't help.
+                if (e.code < 500) and (e.code != 429):
+                    print(f"Webhook Notifications: '{url}' rejected the alerts, they won't be sent again: {e}", file=sys.stderr)
+                    return True
+                error = e
+            except (urllib.error.URLError, OSError) as e:
+                error = e
+            if attempt < self.attempts:
+                delay = self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1)
+                log(f"Unable to post the alerts to '{url}' ({error}), trying again in {delay:.1f}s ...")
+                await asyncio.sleep(delay)
+        print(f"Webhook Notifications: Unable to post the alerts to '{url}', they will be sent again on the next poll: {error}", file=sys.stderr)
+        return False
+
+    def send(self, url: str, body: bytes):
+        request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(request, timeout=self.request_timeout) as response:
+            response.read()
+
+
+def log(*args):
+    if verbose:
+        print(*args, "\n", file=sys.stderr)
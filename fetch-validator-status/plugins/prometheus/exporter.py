@@ -0,0 +1,164 @@
+import plugin_collection
+import asyncio
+from node_status import NodeStatus
+import os
+import sys
+import time
+
+METRICS = {
+    "indy_node_ok": "Whether the node is ok; it replied without any errors.",
+    "indy_node_responding": "Whether the node replied to the validator info request.",
+    "indy_node_uptime_seconds": "The uptime of the node.",
+    "indy_node_transaction_count": "The number of transactions on each ledger, as seen by the node.",
+    "indy_node_ledger_synced": "Whether the node reports each ledger as synced.",
+    "indy_node_write_consensus": "Whether the node has write consensus on each ledger.",
+    "indy_node_unreachable_nodes": "The number of nodes the node can't reach.",
+    "indy_node_errors": "The number of errors detected for the node.",
+    "indy_node_warnings": "The number of warnings detected for the node.",
+    "indy_node_mode": "The mode of the node; the sample with the node's current mode is 1.",
+    "indy_node_software_info": "The software versions installed on the node.",
+    "indy_monitor_last_poll_timestamp_seconds": "When the network was last polled.",
+}
+
+class main(plugin_collection.Plugin):
+
+    def __init__(self):
+        super().__init__()
+        self.index = 6
+        self.name = 'Prometheus Exporter'
+        self.description = ''
+        self.type = plugin_collection.SINK
+        self.depends_on = ['Analysis']
+        self.host = None
+        self.port = None
+        self.server = None
+        # The sinks of several networks run at once (--nets); only one of them starts the server.
+        self.server_lock = asyncio.Lock()
+        # The samples of the latest poll of each network, and the page rendered from them.
+        self.samples = {}
+        self.page = b""
+        self.alerts = False
+        self.delta = False
+        # The status of every node of each network, as of its last entry in a result.
+        self.statuses = {}
+
+    def parse_args(self, parser):
+        parser.add_argument("--prometheus", action="store_true", help="Prometheus Exporter Plug-in: Serve the per node metrics of the latest poll on '/metrics' for Prometheus to scrape.  Intended to be used with '--daemon'.")
+        parser.add_argument("--prometheus-host", default=os.environ.get('PROMETHEUS_HOST') or "0.0.0.0", help="Prometheus Exporter Plug-in: The address to listen on.  Defaults to 0.0.0.0.  Can be specified using the 'PROMETHEUS_HOST' environment variable.")
+        parser.add_argument("--prometheus-port", type=int, default=int(os.environ.get('PROMETHEUS_PORT') or 9105), help="Prometheus Exporter Plug-in: The port to listen on.  Defaults to 9105.  Can be specified using the 'PROMETHEUS_PORT' environment variable.")
+
+    def load_parse_args(self, args):
+        global verbose
+        verbose = args.verbose
+
+        self.enabled = args.prometheus
+        self.host = args.prometheus_host
+        self.port = args.prometheus_port
+        # The nodes the Alerts and Analysis plug-ins leave out of the result still have their metrics published.
+        self.alerts = getattr(args, "alerts", False)
+        self.delta = getattr(args, "delta", False)
+        if self.enabled and not getattr(args, "daemon", False):
+            print("The Prometheus Exporter only keeps serving metrics while the monitor is running; use it with '--daemon'.", file=sys.stderr)
+
+    async def perform_operation(self, result, network_name, response, verifiers):
+        await self.start_server()
+
+        samples = []
+        network = network_name or ""
+        entries = {entry["name"]: entry for entry in result if "name" in entry}
+        analysis = self.dependencies["Analysis"]
+        last_statuses = self.statuses.get(network, {})
+        statuses = {}
+        for node, val in response.items():
+            entry = entries.get(node)
+            if entry:
+                statuses[node] = entry["status"]
+            elif self.delta and (node in last_statuses):
+                # Left out by --delta, the node's status hasn't changed.
+                statuses[node] = last_statuses[node]
+            elif self.alerts:
+                # Left out by --alerts, the node has no info, warnings or errors.
+                statuses[node] = {"ok": True}
+            samples.extend(self.get_node_samples(network, node, statuses.get(node), analysis.get_node_status(network_name, node, val)))
+        self.statuses[network] = statuses
+        samples.append(("indy_monitor_last_poll_timestamp_seconds", {"network": network}, time.time()))
+
+        # Scrapes are served from the pre-rendered page, they never wait on a poll.
+        self.samples[network] = samples
+        self.page = self.render().encode("utf-8")
+        return result
+
+    async def start_server(self):
+        async with self.server_lock:
+            if self.server:
+                return
+            self.server = await asyncio.start_server(self.handle_request, self.host, self.port)
+            if verbose:
+                print(f"Serving metrics on http://{self.host}:{self.port}/metrics", file=sys.stderr)
+
+    def get_node_samples(self, network: str, node: str, status: dict, node_status: NodeStatus) -> list:
+        """The samples of a node; status is its entry's status, if known, and
+        node_status its parsed reply."""
+        labels = {"network": network, "node": node}
+        samples = []
+        if status:
+            samples.append(("indy_node_ok", labels, 1 if status["ok"] else 0))
+            samples.append(("indy_node_errors", labels, status.get("errors", 0)))
+            samples.append(("indy_node_warnings", labels, status.get("warnings", 0)))
+
+        samples.append(("indy_node_responding", labels, 1 if node_status.decoded else 0))
+        if not node_status.is_reply:
+            return samples
+
+        if node_status.has_node_info:
+            samples.append(("indy_node_uptime_seconds", labels, node_status.uptime))
+            if isinstance(node_status.transaction_counts, dict):
+                for ledger, count in node_status.transaction_counts.items():
+                    samples.append(("indy_node_transaction_count", dict(labels, ledger=ledger), count))
+            for ledger, status in node_status.ledger_statuses.items():
+                samples.append(("indy_node_ledger_synced", dict(labels, ledger=ledger), 1 if status == "synced" else 0))
+            for ledger, write_consensus in node_status.write_consensus.items():
+                samples.append(("indy_node_write_consensus", dict(labels, ledger=ledger), 1 if write_consensus else 0))
+            samples.append(("indy_node_mode", dict(labels, mode=node_status.mode), 1))
+        if node_status.has_pool_info:
+            samples.append(("indy_node_unreachable_nodes", labels, node_status.unreachable_count))
+        if node_status.software:
+            samples.append(("indy_node_software_info", dict(labels, indy_node=str(node_status.software["indy-node"]), sovrin=str(node_status.software["sovrin"])), 1))
+        return samples
+
+    def render(self) -> str:
+        families = {}
+        for samples in self.samples.values():
+            for name, labels, value in samples:
+                families.setdefault(name, []).append(self.format_sample(name, labels, value))
+        lines = []
+        for name, family in families.items():
+            lines.append(f"# HELP {name} {METRICS[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(family)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def format_sample(name: str, labels: dict, value: any) -> str:
+        label_text = ",".join('{0}="{1}"'.format(key, str(label).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for key, label in labels.items())
+        return f"{name}{{{label_text}}} {float(value)}"
+
+    async def handle_request(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 10)
+            # Skip the headers.
+            while True:
+                line = await asyncio.wait_for(reader.readline(), 10)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+            parts = request_line.decode("latin-1").split()
+            if (len(parts) >= 2) and (parts[0] == "GET") and (parts[1].split("?")[0] == "/metrics"):
+                status, body = "200 OK", self.page
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
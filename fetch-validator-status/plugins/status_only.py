@@ -9,6 +9,7 @@ class main(plugin_collection.Plugin):
         self.name = 'Status Only'
         self.description = ''
         self.type = ''
+        self.depends_on = ['Analysis']
 
     def parse_args(self, parser):
         parser.add_argument("--status", action="store_true", help="Status Only Plug-in: Get status only.  Suppresses detailed results.")
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import random
+import sys
+
+from indy_vdr.pool import open_pool
+
+
+class PoolCollection(object):
+    """Keeps the open indy_vdr pools alive between polls so a long running
+    monitor only pays for opening a pool once per network.  A pool is
+    re-opened when its genesis file changes on disk or after it has been
+    reset because of an error.
+    """
+
+    def __init__(self, attempts: int = 3, backoff: float = 1, max_backoff: float = 30, verbose: bool = False):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.verbose = verbose
+        self.pools = {}
+
+    async def get_pool(self, key: str, genesis_path: str):
+        """Return the cached pool for the given key, opening it if it does not
+        exist yet or if its genesis file has changed since it was opened.
+        """
+        signature = self.genesis_signature(genesis_path)
+        if key in self.pools:
+            pool, pool_signature = self.pools[key]
+            if pool_signature == signature:
+                return pool
+            self.log(f"Genesis file for '{key}' has changed, refreshing pool ...")
+            self.reset(key)
+
+        pool = await self.open_pool(genesis_path)
+        self.pools[key] = (pool, signature)
+        return pool
+
+    async def open_pool(self, genesis_path: str):
+        """Open the pool, retrying with exponential backoff (and a little
+        jitter, so networks that failed together don't retry together).
+        """
+        attempt = 0
+        while True:
+            try:
+                return await open_pool(transactions_path=genesis_path)
+            except:
+                attempt += 1
+                if attempt >= self.attempts:
+                    raise
+                delay = min(self.max_backoff, self.backoff * (2 ** (attempt - 1)))
+                delay = delay * random.uniform(0.5, 1)
+                self.log(f"Pool Timed Out! Trying again in {delay:.1f}s ...")
+                await asyncio.sleep(delay)
+
+    def reset(self, key: str):
+        """Drop the cached pool so it is re-opened on the next poll."""
+        if key in self.pools:
+            pool, _ = self.pools.pop(key)
+            try:
+                pool.close()
+            except:
+                pass
+
+    def close(self):
+        for key in list(self.pools):
+            self.reset(key)
+
+    def log(self, *args):
+        if self.verbose:
+            print(*args, "\n", file=sys.stderr)
+
+    @staticmethod
+    def genesis_signature(genesis_path: str):
+        stat = os.stat(genesis_path)
+        return (stat.st_mtime_ns, stat.st_size)
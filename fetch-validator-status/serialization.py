@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import time
+
+# The JSON backends in order of preference; the first one that is installed is used.
+# The backend can be forced with the 'JSON_BACKEND' environment variable or use_backend().
+BACKENDS = ["orjson", "ujson", "json"]
+
+
+class Backend(object):
+
+    def __init__(self, name: str):
+        self.name = name
+        if name == "orjson":
+            import orjson
+            self.module = orjson
+            self.decode_error = orjson.JSONDecodeError
+        elif name == "ujson":
+            import ujson
+            self.module = ujson
+            self.decode_error = getattr(ujson, "JSONDecodeError", ValueError)
+        else:
+            self.module = json
+            self.decode_error = json.JSONDecodeError
+
+    def loads(self, value):
+        return self.module.loads(value)
+
+    def dumps(self, value, compact: bool = False) -> str:
+        if self.name == "orjson":
+            option = 0 if compact else self.module.OPT_INDENT_2
+            try:
+                return self.module.dumps(value, option=option).decode("utf-8")
+            except TypeError:
+                # orjson is stricter about the types it accepts (i.e. integers beyond 64 bits).
+                return json.dumps(value, indent=None if compact else 2)
+        if self.name == "ujson":
+            return self.module.dumps(value, indent=0 if compact else 2, ensure_ascii=False, escape_forward_slashes=False)
+        if compact:
+            return json.dumps(value, separators=(",", ":"))
+        return json.dumps(value, indent=2)
+
+
+def available_backends() -> list:
+    backends = []
+    for name in BACKENDS:
+        try:
+            backends.append(Backend(name))
+        except ImportError:
+            pass
+    return backends
+
+
+def use_backend(name: str = None) -> Backend:
+    """Select the backend by name, or the preferred installed backend when no name is given."""
+    global backend, JSONDecodeError
+    if name:
+        backend = Backend(name)
+    else:
+        backend = available_backends()[0]
+    JSONDecodeError = backend.decode_error
+    return backend
+
+
+backend = None
+JSONDecodeError = json.JSONDecodeError
+use_backend(os.environ.get("JSON_BACKEND"))
+
+
+def loads(value):
+    return backend.loads(value)
+
+
+def dumps(value, compact: bool = False) -> str:
+    return backend.dumps(value, compact)
+
+
+def parse_fields(fields: str) -> list:
+    """Parse a comma delimited list of dotted field paths, i.e. 'name,status.ok'."""
+    if not fields:
+        return []
+    return [field.strip().split(".") for field in fields.split(",") if field.strip()]
+
+
+def project(value, fields: list):
+    """Keep only the given field paths of a result.  Results keyed by network
+    (--nets) and lists of node entries are projected entry by entry; network
+    errors are passed through as they are.
+    """
+    if not fields:
+        return value
+    if isinstance(value, dict) and ("error" in value):
+        return value
+    if isinstance(value, list):
+        return [project(item, fields) for item in value]
+    if isinstance(value, dict) and not any(path[0] in value for path in fields):
+        if all(isinstance(item, (list, dict)) for item in value.values()):
+            return {key: project(item, fields) for key, item in value.items()}
+    projected = {}
+    for path in fields:
+        source = value
+        found = True
+        for key in path:
+            if isinstance(source, dict) and (key in source):
+                source = source[key]
+            else:
+                found = False
+                break
+        if not found:
+            continue
+        target = projected
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = source
+    return projected
+
+
+def benchmark(path: str, rounds: int = 10):
+    """Compare the installed backends on a recorded response; a response
+    captured with fetch_status.py --capture, or a JSON object of node name to
+    raw reply.
+    """
+    with open(path) as recorded_file:
+        recorded = json.load(recorded_file)
+    response = recorded.get("response", recorded)
+    # Leave out the nodes that didn't reply ("timeout").
+    replies = [reply for reply in response.values() if isinstance(reply, str) and reply.startswith("{")]
+    size = sum(len(reply) for reply in replies)
+    results = {}
+    for candidate in available_backends():
+        started = time.perf_counter()
+        for _ in range(rounds):
+            decoded = [candidate.loads(reply) for reply in replies]
+        decode_time = (time.perf_counter() - started) / rounds
+        started = time.perf_counter()
+        for _ in range(rounds):
+            candidate.dumps(decoded)
+        encode_time = (time.perf_counter() - started) / rounds
+        started = time.perf_counter()
+        for _ in range(rounds):
+            candidate.dumps(decoded, compact=True)
+        compact_time = (time.perf_counter() - started) / rounds
+        results[candidate.name] = {
+            "decode_seconds": round(decode_time, 6),
+            "decode_mb_per_second": round(size / decode_time / 1e6, 2) if decode_time else None,
+            "encode_indented_seconds": round(encode_time, 6),
+            "encode_compact_seconds": round(compact_time, 6),
+        }
+    return {"replies": len(replies), "bytes": size, "rounds": rounds, "backends": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the available JSON backends on a recorded validator info response.")
+    parser.add_argument("recorded", help="A recorded response file, as written by 'fetch_status.py --capture'.")
+    parser.add_argument("--rounds", type=int, default=10, help="The number of times to decode and encode the replies.  Defaults to 10.")
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.recorded, args.rounds), indent=2))
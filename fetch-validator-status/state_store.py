@@ -0,0 +1,150 @@
+import json
+import os
+import sqlite3
+import time
+
+
+class StateStore(object):
+    """A small SQLite store holding the last known state of every node, keyed
+    by network and node name, so a run can be compared with the previous one.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        target_dir = os.path.dirname(os.path.abspath(path))
+        os.makedirs(target_dir, exist_ok=True)
+        with self.connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS node_state (
+                    network TEXT NOT NULL,
+                    node TEXT NOT NULL,
+                    reply_hash TEXT,
+                    fingerprint TEXT,
+                    extraction TEXT,
+                    updated REAL,
+                    PRIMARY KEY (network, node)
+                )""")
+
+    def connect(self):
+        return ClosingConnection(sqlite3.connect(self.path, timeout=30))
+
+    def load(self, network: str) -> dict:
+        """Return the stored state of every node of the network, keyed by node name."""
+        with self.connect() as conn:
+            rows = conn.execute("SELECT node, reply_hash, fingerprint, extraction FROM node_state WHERE network = ?", (network or "",)).fetchall()
+        state = {}
+        for node, reply_hash, fingerprint, extraction in rows:
+            state[node] = {
+                "reply_hash": reply_hash,
+                "fingerprint": fingerprint,
+                "extraction": json.loads(extraction) if extraction else {},
+            }
+        return state
+
+    def save(self, network: str, state: dict):
+        """Replace the stored state of the given nodes in a single transaction."""
+        now = time.time()
+        rows = [(network or "", node, node_state["reply_hash"], node_state["fingerprint"], json.dumps(node_state["extraction"]), now) for node, node_state in state.items()]
+        with self.connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO node_state (network, node, reply_hash, fingerprint, extraction, updated) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+
+class AlertStore(object):
+    """The alerts of every network, keyed by fingerprint, with when they were
+    first and last seen, whether they have been announced and when, and when
+    they were resolved.  Kept in the same SQLite file as the node state.
+
+    Along with them is the outbox of every webhook; the events that have yet
+    to be delivered to it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        target_dir = os.path.dirname(os.path.abspath(path))
+        os.makedirs(target_dir, exist_ok=True)
+        with self.connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS alert_state (
+                    network TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    node TEXT,
+                    category TEXT,
+                    message TEXT,
+                    first_seen REAL,
+                    last_seen REAL,
+                    announced INTEGER,
+                    notified_at REAL,
+                    resolved_at REAL,
+                    PRIMARY KEY (network, fingerprint)
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS alert_outbox (
+                    network TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    event TEXT
+                )""")
+
+    def connect(self):
+        return ClosingConnection(sqlite3.connect(self.path, timeout=30))
+
+    def load(self, network: str) -> dict:
+        """Return the stored alerts of the network, keyed by fingerprint."""
+        with self.connect() as conn:
+            rows = conn.execute("SELECT fingerprint, node, category, message, first_seen, last_seen, announced, notified_at, resolved_at FROM alert_state WHERE network = ?", (network or "",)).fetchall()
+        alerts = {}
+        for fingerprint, node, category, message, first_seen, last_seen, announced, notified_at, resolved_at in rows:
+            alerts[fingerprint] = {
+                "node": node,
+                "category": category,
+                "message": json.loads(message) if message else None,
+                "first_seen": first_seen,
+                "last_seen": last_seen,
+                "announced": bool(announced),
+                "notified_at": notified_at,
+                "resolved_at": resolved_at,
+            }
+        return alerts
+
+    def save(self, network: str, alerts: dict, purge_before: float = None):
+        """Replace the stored alerts in a single transaction, dropping the
+        alerts that were resolved before purge_before."""
+        rows = [(network or "", fingerprint, alert["node"], alert["category"], json.dumps(alert["message"]), alert["first_seen"], alert["last_seen"], int(alert["announced"]), alert["notified_at"], alert["resolved_at"]) for fingerprint, alert in alerts.items()]
+        with self.connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO alert_state (network, fingerprint, node, category, message, first_seen, last_seen, announced, notified_at, resolved_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            if purge_before is not None:
+                conn.execute("DELETE FROM alert_state WHERE network = ? AND resolved_at IS NOT NULL AND resolved_at < ?", (network or "", purge_before))
+
+    def load_outbox(self, network: str) -> dict:
+        """Return the undelivered events of the network, as lists keyed by URL, oldest first."""
+        with self.connect() as conn:
+            rows = conn.execute("SELECT url, event FROM alert_outbox WHERE network = ? ORDER BY rowid", (network or "",)).fetchall()
+        outbox = {}
+        for url, event in rows:
+            outbox.setdefault(url, []).append(json.loads(event))
+        return outbox
+
+    def save_outbox(self, network: str, outbox: dict):
+        """Replace the undelivered events of the network in a single transaction."""
+        rows = [(network or "", url, json.dumps(event)) for url, events in outbox.items() for event in events]
+        with self.connect() as conn:
+            conn.execute("DELETE FROM alert_outbox WHERE network = ?", (network or "",))
+            conn.executemany("INSERT INTO alert_outbox (network, url, event) VALUES (?, ?, ?)", rows)
+
+
+class ClosingConnection(object):
+    """Commits (or rolls back) and closes the connection when the block exits."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type:
+                self.conn.rollback()
+            else:
+                self.conn.commit()
+        finally:
+            self.conn.close()
@@ -0,0 +1,309 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import time
+
+import fetch_status
+import plugin_collection
+import serialization
+from plugin_collection import PluginCollection
+from pool_collection import PoolCollection
+from timings import timings
+from DidKey import DidKey
+
+verbose = False
+
+
+def log(*args):
+    if verbose:
+        print(*args, "\n", file=sys.stderr)
+
+
+class Forwarder(plugin_collection.Plugin):
+    """Runs last in a worker process and keeps the response and verifiers of
+    each network's poll, so they can be sent to the supervisor along with the
+    result for the sinks to use.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.index = sys.maxsize
+        self.name = 'Supervisor Forwarder'
+        self.enabled = True
+        self.responses = {}
+
+    async def perform_operation(self, result, network_name, response, verifiers):
+        self.responses[network_name] = (response, verifiers)
+        return result
+
+    def pop(self, network_name: str):
+        return self.responses.pop(network_name, ({}, {}))
+
+
+class Supervisor(object):
+    """Shards the networks across a number of worker processes, each polling
+    its networks on its own event loop, and gathers their results over a
+    multiprocessing queue into a single output stream and the sink plug-ins.
+
+    A worker that exits is restarted after a delay that doubles (with a
+    little jitter) every time it fails before completing a poll.  A worker
+    that has not completed a poll for stall_timeout seconds is assumed to be
+    stuck and is terminated, and restarted in the same way.
+    """
+
+    def __init__(self, monitor_plugins: PluginCollection, targets: list, shards: int, argv: list, interval: int, stats_interval: int = 60, backoff: float = 1, max_backoff: float = 30, stall_timeout: float = None):
+        self.monitor_plugins = monitor_plugins
+        self.interval = interval
+        self.stats_interval = stats_interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stall_timeout = stall_timeout or (3 * interval + 120)
+        self.argv = argv
+        self.context = multiprocessing.get_context("spawn")
+        self.queue = self.context.Queue()
+        shards = max(1, min(shards, len(targets)))
+        self.shards = [targets[shard::shards] for shard in range(shards)]
+        self.workers = {}
+        self.restart_at = {}
+        self.started = time.time()
+        self.stats = {shard: {
+            "networks": [target["id"] for target in self.shards[shard]],
+            "pid": None,
+            "restarts": 0,
+            "crashes_in_a_row": 0,
+            "polls": 0,
+            "results": 0,
+            "errors": 0,
+            "poll_seconds": 0.0,
+            "cpu_seconds": 0.0,
+            "last_poll_seconds": None,
+            "last_seen": None,
+        } for shard in range(len(self.shards))}
+
+    def start_worker(self, shard: int):
+        worker = self.context.Process(target=run_worker, args=(shard, self.shards[shard], self.argv, self.queue), name=f"monitor-shard-{shard}", daemon=True)
+        worker.start()
+        self.workers[shard] = worker
+        self.stats[shard]["pid"] = worker.pid
+        self.stats[shard]["last_seen"] = time.time()
+        log(f"Started shard {shard} (pid {worker.pid}) for {', '.join(self.stats[shard]['networks'])} ...")
+
+    def check_workers(self):
+        now = time.time()
+        for shard, worker in list(self.workers.items()):
+            stats = self.stats[shard]
+            if worker.is_alive() and (now - stats["last_seen"] > self.stall_timeout):
+                print(f"Shard {shard} (pid {worker.pid}) has not completed a poll in {self.stall_timeout:.0f}s, terminating it ...", file=sys.stderr)
+                worker.terminate()
+                worker.join(5)
+            if worker.is_alive():
+                continue
+            worker.join()
+            del self.workers[shard]
+            delay = min(self.max_backoff, self.backoff * (2 ** stats["crashes_in_a_row"])) * random.uniform(0.5, 1)
+            stats["crashes_in_a_row"] += 1
+            self.restart_at[shard] = now + delay
+            print(f"Shard {shard} (pid {worker.pid}) exited with code {worker.exitcode}, restarting it in {delay:.1f}s ...", file=sys.stderr)
+        for shard, restart_at in list(self.restart_at.items()):
+            if now >= restart_at:
+                del self.restart_at[shard]
+                self.stats[shard]["restarts"] += 1
+                self.start_worker(shard)
+
+    def get_message(self, timeout: float = 1):
+        try:
+            return self.queue.get(True, timeout)
+        except queue.Empty:
+            return None
+
+    async def handle_message(self, message: tuple):
+        kind, shard = message[0], message[1]
+        stats = self.stats[shard]
+        stats["last_seen"] = time.time()
+        if kind == "result":
+            _, _, net_id, network_name, result, response, verifiers = message
+            stats["results"] += 1
+            error = isinstance(result, dict) and ("error" in result)
+            if error:
+                stats["errors"] += 1
+            print(serialization.dumps({"network": net_id, "shard": shard, "result": serialization.project(result, fetch_status.fields)}, compact = True), flush=True)
+            if not error:
+                await self.monitor_plugins.apply_all_sinks_on_value(result, network_name, response, verifiers)
+        elif kind == "poll":
+            _, _, seconds, cpu_seconds = message
+            stats["polls"] += 1
+            stats["crashes_in_a_row"] = 0
+            stats["poll_seconds"] += seconds
+            stats["cpu_seconds"] += cpu_seconds
+            stats["last_poll_seconds"] = round(seconds, 3)
+
+    def get_stats(self) -> dict:
+        uptime = time.time() - self.started
+        shards = {}
+        for shard, stats in self.stats.items():
+            shards[shard] = {
+                "pid": stats["pid"],
+                "alive": (shard in self.workers) and self.workers[shard].is_alive(),
+                "networks": len(stats["networks"]),
+                "restarts": stats["restarts"],
+                "polls": stats["polls"],
+                "results": stats["results"],
+                "errors": stats["errors"],
+                "results_per_minute": round(stats["results"] * 60 / uptime, 2) if uptime else None,
+                "mean_poll_seconds": round(stats["poll_seconds"] / stats["polls"], 3) if stats["polls"] else None,
+                "mean_cpu_seconds": round(stats["cpu_seconds"] / stats["polls"], 3) if stats["polls"] else None,
+                "last_poll_seconds": stats["last_poll_seconds"],
+            }
+        return {"supervisor": {"uptime": round(uptime, 1), "shards": shards}}
+
+    def print_stats(self):
+        print(json.dumps(self.get_stats()), file=sys.stderr, flush=True)
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        for shard in range(len(self.shards)):
+            self.start_worker(shard)
+        next_stats = time.time() + self.stats_interval
+        while True:
+            # The queue is read on a thread, so the sinks (i.e. the Prometheus Exporter) keep being served.
+            message = await loop.run_in_executor(None, self.get_message)
+            if message:
+                await self.handle_message(message)
+            self.check_workers()
+            if self.stats_interval and (time.time() >= next_stats):
+                self.print_stats()
+                next_stats = time.time() + self.stats_interval
+
+    def stop(self):
+        for worker in self.workers.values():
+            worker.terminate()
+        for worker in self.workers.values():
+            worker.join(5)
+        self.print_stats()
+
+
+def run_worker(shard: int, targets: list, argv: list, messages):
+    """The entry point of a worker process; polls its share of the networks
+    every interval and sends the results to the supervisor."""
+    monitor_plugins = PluginCollection('plugins')
+    args, _ = get_parser(monitor_plugins).parse_known_args(argv)
+    args.daemon = True
+    fetch_status.configure(args)
+    if args.timings or args.trace_memory:
+        timings.enable(trace_memory = bool(args.trace_memory))
+    monitor_plugins.load_all_parse_args(args)
+    # The sinks are run once, by the supervisor, on the results of all of the workers.
+    sinks = [plugin for plugin in monitor_plugins.plugins if (plugin.type == plugin_collection.SINK) and plugin.enabled]
+    for plugin in sinks:
+        plugin.enabled = False
+    # The response and verifiers are only sent along when there are sinks to use them.
+    forwarder = None
+    if sinks:
+        forwarder = Forwarder()
+        monitor_plugins.plugins.append(forwarder)
+
+    ident = DidKey(args.seed) if args.seed else None
+    pools = PoolCollection(verbose=args.verbose)
+    try:
+        asyncio.get_event_loop().run_until_complete(run_shard(shard, targets, monitor_plugins, pools, forwarder, messages, args.interval, ident))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pools.close()
+
+
+async def run_shard(shard: int, targets: list, monitor_plugins: PluginCollection, pools: PoolCollection, forwarder: Forwarder, messages, interval: int, ident: DidKey = None):
+    """Polls the targets every interval.  forwarder is None when the
+    supervisor has no sinks, and only the results are sent."""
+    async def poll(target: dict):
+        result = await fetch_status.fetch_network_status(monitor_plugins, pools, target, ident=ident)
+        response, verifiers = forwarder.pop(target["name"]) if forwarder else ({}, {})
+        messages.put(("result", shard, target["id"], target["name"], result, response, verifiers))
+
+    loop = asyncio.get_event_loop()
+    while True:
+        started = loop.time()
+        started_cpu = time.process_time()
+        await asyncio.gather(*[poll(target) for target in targets])
+        elapsed = loop.time() - started
+        messages.put(("poll", shard, elapsed, time.process_time() - started_cpu))
+        timings.dump()
+        timings.reset()
+        await asyncio.sleep(max(0, interval - elapsed))
+
+
+def load_targets(networks_file: str, nets: str = None) -> list:
+    """The targets for the given network ids (or all of them) of a networks
+    file in the format of networks.json.  A network may give a local
+    'genesisPath' in place of, or along with, its 'genesisUrl'.
+    """
+    with open(networks_file) as json_file:
+        networks = json.load(json_file)
+    if not nets or nets == "all":
+        net_ids = list(networks.keys())
+    else:
+        net_ids = [net_id.strip() for net_id in nets.split(",") if net_id.strip()]
+        unknown_networks = [net_id for net_id in net_ids if net_id not in networks]
+        if unknown_networks:
+            raise ValueError("Unknown network id(s): {0}. Known networks: {1}".format(", ".join(unknown_networks), ", ".join(networks.keys())))
+    targets = []
+    for net_id in net_ids:
+        network = networks[net_id]
+        targets.append({
+            "id": net_id,
+            "name": network["name"],
+            "genesis_url": network.get("genesisUrl"),
+            "genesis_path": network.get("genesisPath") or fetch_status.get_network_genesis_path(net_id),
+        })
+    return targets
+
+
+def get_parser(monitor_plugins: PluginCollection) -> argparse.ArgumentParser:
+    parser = fetch_status.get_parser(monitor_plugins)
+    parser.description = "Poll a fleet of indy networks, sharded across a number of worker processes."
+    parser.add_argument("--shards", type=int, default=int(os.environ.get('SHARDS') or os.cpu_count() or 1), help="The number of worker processes to shard the networks across.  Defaults to the number of CPUs.  Can be specified using the 'SHARDS' environment variable.")
+    parser.add_argument("--networks-file", default=os.environ.get('NETWORKS_FILE') or f"{fetch_status.get_script_dir()}/networks.json", help="The file listing the networks to poll, in the format of networks.json.  Defaults to networks.json.  Can be specified using the 'NETWORKS_FILE' environment variable.")
+    parser.add_argument("--stats-interval", type=int, default=int(os.environ.get('STATS_INTERVAL') or 60), help="The number of seconds between the per worker throughput statistics printed on stderr.  Defaults to 60.  Use 0 to only print them on exit.  Can be specified using the 'STATS_INTERVAL' environment variable.")
+    return parser
+
+
+if __name__ == "__main__":
+    monitor_plugins = PluginCollection('plugins')
+    parser = get_parser(monitor_plugins)
+    args, unknown = parser.parse_known_args()
+
+    verbose = args.verbose
+    try:
+        fetch_status.configure(args)
+    except ImportError:
+        print(f"The '{args.json_backend}' JSON library is not installed.", file=sys.stderr)
+        exit()
+    if args.stream:
+        print("'--stream' is not supported by the supervisor; each network's result is printed as a single record.", file=sys.stderr)
+        exit()
+    # The supervisor keeps polling until it is stopped.
+    args.daemon = True
+    monitor_plugins.load_all_parse_args(args)
+
+    try:
+        targets = load_targets(args.networks_file, args.nets)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        exit()
+    if not targets:
+        print(f"There are no networks in '{args.networks_file}'.", file=sys.stderr)
+        exit()
+
+    supervisor = Supervisor(monitor_plugins, targets, args.shards, sys.argv[1:], args.interval, args.stats_interval)
+    log("Sharding {0} network(s) across {1} worker(s) ...".format(len(targets), len(supervisor.shards)))
+    try:
+        asyncio.get_event_loop().run_until_complete(supervisor.run())
+    except KeyboardInterrupt:
+        log("Stopping supervisor ...")
+    finally:
+        supervisor.stop()
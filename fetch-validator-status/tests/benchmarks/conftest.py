@@ -0,0 +1,27 @@
+import pytest
+
+import serialization
+from synthetic import make_response, make_verifiers
+
+
+@pytest.fixture(scope="session")
+def captures(tmp_path_factory):
+    """Returns capture(node_count); the path of the synthetic response of a
+    pool of that size, written as 'fetch_status.py --capture' does, for
+    '--replay'."""
+    folder = tmp_path_factory.mktemp("captures")
+    paths = {}
+
+    def capture(node_count: int) -> str:
+        if node_count not in paths:
+            path = folder / "synthetic-{0}.json".format(node_count)
+            path.write_text(serialization.dumps({
+                "network": "synthetic-{0}".format(node_count),
+                "captured_at": 0,
+                "response": make_response(node_count),
+                "verifiers": make_verifiers(node_count),
+            }))
+            paths[node_count] = str(path)
+        return paths[node_count]
+
+    return capture
@@ -0,0 +1,49 @@
+"""The time 'fetch_status.py --replay' takes from start to finish on a small
+pool, in a fresh process; dominated by loading the plug-ins.  Timed with and
+without the plug-in manifest, which is rebuilt by parsing every module of the
+plug-ins folder when it's missing, and with a manifest listing every module
+as a plug-in, so every module is imported, as it was before the manifest."""
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import plugin_collection
+
+ROUNDS = 5
+
+
+@pytest.fixture(scope="module")
+def tree(tmp_path_factory):
+    """A copy of the monitor, so its plug-in manifest can be removed without touching the working tree's."""
+    source = os.path.dirname(os.path.realpath(plugin_collection.__file__))
+    path = tmp_path_factory.mktemp("cold-start") / "fetch-validator-status"
+    shutil.copytree(source, str(path), ignore=shutil.ignore_patterns("tests", "__pycache__", ".benchmarks"))
+    return path
+
+
+@pytest.mark.parametrize("manifest", ["cached", "missing", "import-all"])
+def test_cold_start(benchmark, captures, tree, manifest):
+    manifest_path = tree / "plugins" / "__pycache__" / "plugin_manifest.json"
+    argv = [sys.executable, str(tree / "fetch_status.py"), "--status", "--replay", captures(4)]
+
+    def start():
+        if manifest == "missing" and manifest_path.exists():
+            manifest_path.unlink()
+        elif manifest == "import-all":
+            modules = json.loads(manifest_path.read_text())
+            manifest_path.write_text(json.dumps({name: dict(module, plugin=True) for name, module in modules.items()}))
+        return (argv,), {"check": True, "stdout": subprocess.DEVNULL}
+
+    # Compile the modules and write the manifest before timing.
+    if manifest_path.exists():
+        manifest_path.unlink()
+    subprocess.run(argv, check=True, stdout=subprocess.DEVNULL)
+    benchmark.extra_info["manifest"] = manifest
+    benchmark.pedantic(subprocess.run, setup=start, rounds=ROUNDS)
+    assert manifest_path.exists()
@@ -0,0 +1,43 @@
+"""The cross node pass of the Analysis plug-in (package mismatches, ledger
+lag, connection issues, partitions and view changes) on synthetic 100 and
+500 node pools, on its own and as part of the whole analysis.  It used to
+run once per node, which made it cubic in the size of the pool."""
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from plugins.analysis import extract_nodes
+from synthetic import make_response, make_verifiers
+
+ROUNDS = {100: 5, 500: 2}
+
+
+@pytest.mark.parametrize("node_count", ROUNDS)
+def test_cross_node_analysis(benchmark, run, monitor, node_count):
+    response = make_response(node_count)
+    verifiers = make_verifiers(node_count)
+    analysis = monitor().get_plugin("Analysis")
+
+    def extract():
+        # The per node pass, not timed.
+        pool_data = analysis.new_pool_data()
+        for node, node_status in extract_nodes(list(response.items()), False).items():
+            run(analysis.add_entry(node_status, verifiers, "Node1:0", pool_data))
+        return (pool_data,), {}
+
+    benchmark.group = "analysis-{0}".format(node_count)
+    benchmark.extra_info["nodes"] = node_count
+    benchmark.pedantic(lambda pool_data: run(analysis.cross_node_analysis(pool_data, "synthetic", list(response))), setup=extract, rounds=ROUNDS[node_count])
+
+
+@pytest.mark.parametrize("node_count", ROUNDS)
+def test_whole_analysis(benchmark, run, monitor, node_count):
+    response = make_response(node_count)
+    verifiers = make_verifiers(node_count)
+    analysis = monitor().get_plugin("Analysis")
+    benchmark.group = "analysis-{0}".format(node_count)
+    benchmark.extra_info["nodes"] = node_count
+    result = benchmark.pedantic(lambda: run(analysis.perform_operation([], "synthetic", response, verifiers)), rounds=ROUNDS[node_count])
+    assert len(result) == node_count
+    # Every node that reports the ones that timed out as unreachable gets a single warning about them, not one per node.
+    assert all(sum(1 for warning in entry.get("warnings", []) if "unreachable_nodes" in warning) <= 1 for entry in result)
@@ -0,0 +1,46 @@
+"""Parse, analysis and plug-in throughput on synthetic pools, replayed as
+'fetch_status.py --replay' does, so a performance regression in analysis.py
+or the plug-ins shows up without a live pool.  Compare runs with
+pytest-benchmark's --benchmark-autosave and --benchmark-compare."""
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import fetch_status
+from plugins.analysis import extract_nodes
+
+# The synthetic pool sizes, and the number of rounds each is timed over.
+ROUNDS = {4: 50, 25: 20, 100: 5, 1000: 2}
+
+PLUGINS = {
+    "transforms": ["--status", "--alerts"],
+    "sinks": ["--tslog", "--archive"],
+}
+
+
+@pytest.mark.parametrize("node_count", ROUNDS)
+def test_parse(benchmark, captures, node_count):
+    replies = list(fetch_status.load_capture(captures(node_count))["response"].items())
+    benchmark.extra_info["nodes"] = node_count
+    node_statuses = benchmark.pedantic(extract_nodes, args=(replies, False), rounds=ROUNDS[node_count])
+    assert len(node_statuses) == node_count
+
+
+@pytest.mark.parametrize("node_count", ROUNDS)
+def test_analysis(benchmark, run, monitor, captures, node_count):
+    capture = fetch_status.load_capture(captures(node_count))
+    analysis = monitor().get_plugin("Analysis")
+    benchmark.extra_info["nodes"] = node_count
+    result = benchmark.pedantic(lambda: run(analysis.perform_operation([], capture["network"], capture["response"], capture["verifiers"])), rounds=ROUNDS[node_count])
+    assert len(result) == node_count
+
+
+@pytest.mark.parametrize("plugins", PLUGINS)
+@pytest.mark.parametrize("node_count", ROUNDS)
+def test_pipeline(benchmark, run, monitor, captures, tmp_path, node_count, plugins):
+    argv = PLUGINS[plugins] + ["--ts-dir", str(tmp_path / "timeseries"), "--archive-dir", str(tmp_path / "archive")]
+    monitor_plugins = monitor(*argv)
+    path = captures(node_count)
+    benchmark.extra_info["nodes"] = node_count
+    results = benchmark.pedantic(lambda: run(fetch_status.replay_captures(monitor_plugins, [path])), rounds=ROUNDS[node_count])
+    assert path in results
@@ -0,0 +1,30 @@
+"""The analysis of a 1000 node pool with the replies decoded in the event
+loop (--workers 0) and in 1, 2 and 4 worker processes, to see how it scales
+with the cores of the machine; the extra_info records how many there are."""
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from synthetic import make_response, make_verifiers
+
+NODE_COUNT = 1000
+ROUNDS = 2
+
+
+@pytest.mark.parametrize("workers", [0, 1, 2, 4])
+def test_workers(benchmark, run, monitor, workers):
+    response = make_response(NODE_COUNT)
+    verifiers = make_verifiers(NODE_COUNT)
+    analysis = monitor("--workers", str(workers)).get_plugin("Analysis")
+    try:
+        # Start the worker processes before timing.
+        run(analysis.perform_operation([], "synthetic", make_response(4), make_verifiers(4)))
+        benchmark.group = "workers"
+        benchmark.extra_info.update({"nodes": NODE_COUNT, "workers": workers, "cpus": os.cpu_count()})
+        result = benchmark.pedantic(lambda: run(analysis.perform_operation([], "synthetic", response, verifiers)), rounds=ROUNDS)
+        assert len(result) == NODE_COUNT
+    finally:
+        if analysis.executor:
+            analysis.executor.shutdown()
@@ -0,0 +1,35 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# The monitor's modules are imported from the folder of fetch_status.py, as they are when it runs.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+
+@pytest.fixture
+def run():
+    """Runs a coroutine to completion on a loop of its own."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop.run_until_complete
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+@pytest.fixture
+def monitor():
+    """Returns load(*argv), which sets up the plug-ins with the given command
+    line, as fetch_status.py does, and returns the PluginCollection."""
+    import fetch_status
+    from plugin_collection import PluginCollection
+
+    def load(*argv):
+        monitor_plugins = PluginCollection("plugins")
+        args, _ = fetch_status.get_parser(monitor_plugins).parse_known_args(list(argv))
+        fetch_status.configure(args)
+        monitor_plugins.load_all_parse_args(args)
+        return monitor_plugins
+
+    return load
@@ -0,0 +1,93 @@
+"""Synthetic pools for the tests and benchmarks; GET_VALIDATOR_INFO replies
+and get_verifiers output shaped like those of a real pool, for any number of
+nodes.
+"""
+import json
+import random
+
+STARTED = 1700000000
+
+
+def node_names(node_count: int) -> list:
+    return ["Node{0}".format(i) for i in range(1, node_count + 1)]
+
+
+def make_verifiers(node_count: int) -> dict:
+    """The verifiers of a pool, as returned by get_verifiers."""
+    verifiers = {}
+    for i, node in enumerate(node_names(node_count)):
+        host = "10.{0}.{1}.{2}".format(i // 65536, (i // 256) % 256, i % 256)
+        verifiers[node] = {
+            "alias": node,
+            "client_addr": "tcp://{0}:9702".format(host),
+            "node_addr": "tcp://{0}:9701".format(host),
+            "enabled": True,
+            "services": ["VALIDATOR"],
+        }
+    return verifiers
+
+
+def make_reply(node: str, nodes: list, primary: str = "Node1", unreachable: list = (), version: str = "1.12.4", timestamp: int = STARTED + 3600, req_id: int = 1, view_no: int = 0, transactions: int = 1000) -> str:
+    """A node's reply to GET_VALIDATOR_INFO.  reqId, the timestamp and the
+    uptime change on every poll, as they do on a real pool."""
+    unreachable = [name for name in unreachable if name != node]
+    data = {
+        "response-version": "0.0.1",
+        "timestamp": timestamp,
+        "Hardware": {"HDD_used_by_node": "2 MBs"},
+        "Pool_info": {
+            "Read_only": False,
+            "Total_nodes_count": len(nodes),
+            "f_value": (len(nodes) - 1) // 3,
+            "Reachable_nodes": [[name, None] for name in nodes if name not in unreachable],
+            "Reachable_nodes_count": len(nodes) - len(unreachable),
+            "Unreachable_nodes": [[name, None] for name in unreachable],
+            "Unreachable_nodes_count": len(unreachable),
+            "Blacklisted_nodes": [],
+            "Suspicious_nodes": "",
+        },
+        "Node_info": {
+            "Name": node,
+            "Mode": "participating",
+            "Metrics": {
+                "uptime": timestamp - STARTED,
+                "transaction-count": {"ledger": transactions, "pool": len(nodes), "config": 10, "audit": 2 * transactions},
+                "average-per-second": {"read-transactions": 0.0338, "write-transactions": 0.0002},
+            },
+            "Catchup_status": {"Ledger_statuses": {"0": "synced", "1": "synced", "2": "synced", "3": "synced"}, "Waiting_consistency_proof_msgs": {}},
+            "Freshness_status": {ledger: {"Has_write_consensus": True, "Last_updated_time": "2023-11-14 22:13:20+00:00"} for ledger in ("0", "1", "2")},
+            "View_change_status": {"View_No": view_no, "VC_in_progress": False, "Last_complete_view_no": view_no},
+            "Replicas_status": {
+                node + ":0": {"Primary": primary + ":0", "Watermarks": "0:300"},
+                node + ":1": {"Primary": nodes[(nodes.index(primary) + 1) % len(nodes)] + ":1", "Watermarks": "0:300"},
+            },
+        },
+        "Software": {
+            "indy-node": version,
+            "sovrin": "1.1.89",
+            "Installed_packages": ["indy-node {0}".format(version), "indy-plenum 1.12.4", "sovrin 1.1.89"] + ["package{0} 1.{1}".format(i, i % 7) for i in range(40)],
+            "OS_version": "Linux-4.15.0-x86_64-with-Ubuntu-16.04-xenial",
+        },
+        "Extractions": {"upgrade_log": ["2023-11-14 22:13:20\tsucceeded\t{0}".format(version)], "journalctl_exceptions": [], "indy-node_status": ["Active: active (running)"]},
+    }
+    return json.dumps({"op": "REPLY", "result": {"reqId": req_id, "identifier": "V4SGRU86Z58d6TV7PBUe6f", "type": "119", "data": data}})
+
+
+def make_response(node_count: int, silent: int = None, unreachable: int = 2, outdated: float = 0.2, poll: int = 0, seed: int = 1) -> dict:
+    """The response of a pool to GET_VALIDATOR_INFO.  silent nodes (by
+    default one in twenty) time out, the others each list the silent nodes
+    and unreachable other nodes as unreachable, and a share (outdated) of
+    them run an older version.  Polls differ only in reqId, the timestamp
+    and the uptime."""
+    rng = random.Random(seed)
+    nodes = node_names(node_count)
+    silent = set(rng.sample(nodes, node_count // 20 if silent is None else silent))
+    response = {}
+    for node in nodes:
+        if node in silent:
+            response[node] = "timeout"
+            continue
+        unreachable_nodes = sorted(silent | set(rng.sample(nodes, min(unreachable, node_count))))
+        version = "1.12.3" if rng.random() < outdated else "1.12.4"
+        response[node] = make_reply(node, nodes, unreachable=unreachable_nodes, version=version, timestamp=STARTED + 3600 + 60 * poll, req_id=1 + poll)
+    return response
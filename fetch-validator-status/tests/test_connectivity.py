@@ -0,0 +1,105 @@
+import json
+import time
+
+from connectivity import ConnectivityMatrix, bft_quorum
+from synthetic import make_response, make_verifiers, node_names
+
+NODES = node_names(7)
+
+
+def test_bft_quorum():
+    assert [bft_quorum(n) for n in (1, 4, 7, 10, 25, 100)] == [1, 3, 5, 7, 17, 67]
+
+
+def test_connected_pool():
+    partitions = ConnectivityMatrix.from_unreachable({node: [] for node in NODES}, NODES).partitions()
+    assert partitions == {"nodes": 7, "quorum": 5, "silent": [], "partitioned": False, "has_quorum": True, "partitions": [{"nodes": NODES, "size": 7, "quorum": True}]}
+
+
+def test_silent_nodes_count_towards_the_quorum():
+    # Two of seven nodes timed out; the five that replied still hold the quorum of five.
+    unreachable = {node: ["Node6", "Node7"] for node in NODES[:5]}
+    partitions = ConnectivityMatrix.from_unreachable(unreachable, NODES).partitions()
+    assert partitions["nodes"] == 7
+    assert partitions["quorum"] == 5
+    assert partitions["silent"] == ["Node6", "Node7"]
+    assert partitions["has_quorum"]
+    assert partitions["partitions"] == [{"nodes": NODES[:5], "size": 5, "quorum": True}]
+
+
+def test_silent_nodes_are_not_assumed_connected():
+    # The four nodes that replied say they can reach the three that didn't; that's only one side of the link.
+    unreachable = {node: [] for node in NODES[:4]}
+    partitions = ConnectivityMatrix.from_unreachable(unreachable, NODES).partitions()
+    assert partitions["silent"] == ["Node5", "Node6", "Node7"]
+    assert not partitions["partitioned"]
+    assert partitions["has_quorum"] is False
+    assert partitions["partitions"] == [{"nodes": NODES[:4], "size": 4, "quorum": False}]
+
+
+def test_nodes_only_listed_by_others_are_silent():
+    unreachable = {node: ["Node7"] for node in NODES[:6]}
+    partitions = ConnectivityMatrix.from_unreachable(unreachable, NODES[:6]).partitions()
+    assert partitions["nodes"] == 7
+    assert partitions["silent"] == ["Node7"]
+    assert partitions["has_quorum"]
+
+
+def test_nothing_reported():
+    partitions = ConnectivityMatrix.from_unreachable({}, NODES).partitions()
+    assert partitions["has_quorum"] is None
+    assert partitions["partitions"] == []
+    assert partitions["silent"] == NODES
+
+
+def test_partitions():
+    # Node1-4 and Node5-7 can't reach each other; one listing the other is enough to cut the link.
+    unreachable = {node: NODES[4:] for node in NODES[:4]}
+    unreachable.update({node: [] for node in NODES[4:]})
+    partitions = ConnectivityMatrix.from_unreachable(unreachable, NODES).partitions()
+    assert partitions["partitioned"]
+    assert not partitions["has_quorum"]
+    assert partitions["partitions"] == [{"nodes": NODES[:4], "size": 4, "quorum": False}, {"nodes": NODES[4:], "size": 3, "quorum": False}]
+
+
+def test_a_report_can_be_replaced():
+    matrix = ConnectivityMatrix.from_unreachable({node: NODES[4:] for node in NODES[:4]}, NODES)
+    assert not matrix.partitions()["has_quorum"]
+    for node in NODES:
+        matrix.set_unreachable(node, [])
+    assert matrix.components() == [NODES]
+
+
+def test_thousand_node_pool():
+    response = make_response(1000)
+    unreachable = {node: [name for name, _ in json.loads(reply)["result"]["data"]["Pool_info"]["Unreachable_nodes"]] for node, reply in response.items() if reply != "timeout"}
+    started = time.perf_counter()
+    partitions = ConnectivityMatrix.from_unreachable(unreachable, list(response)).partitions()
+    assert time.perf_counter() - started < 1
+    assert len(partitions["silent"]) == 50
+    assert partitions["quorum"] == 667
+    assert partitions["has_quorum"]
+
+
+def test_analysis_counts_the_nodes_that_timed_out(run, monitor, monkeypatch):
+    analysis = monitor().get_plugin("Analysis")
+    found = []
+    get_partitions = analysis.get_partitions
+
+    async def record_partitions(*args, **kwargs):
+        found.append(await get_partitions(*args, **kwargs))
+        return found[-1]
+
+    monkeypatch.setattr(analysis, "get_partitions", record_partitions)
+    response = make_response(7, silent=2, unreachable=0)
+    run(analysis.perform_operation([], "local", response, make_verifiers(7)))
+    partitions = found[-1]
+    assert partitions["nodes"] == 7
+    assert partitions["quorum"] == 5
+    assert len(partitions["silent"]) == 2
+    assert partitions["has_quorum"]
+
+    response = make_response(7, silent=3, unreachable=0)
+    result = run(analysis.perform_operation([], "local", response, make_verifiers(7)))
+    assert found[-1]["has_quorum"] is False
+    assert len(result) == 7
@@ -0,0 +1,60 @@
+import pytest
+
+from synthetic import make_response, make_verifiers
+
+
+@pytest.fixture
+def analysis(monitor, tmp_path):
+    monitor_plugins = monitor("--delta", "--state-file", str(tmp_path / "monitor.db"))
+    return monitor_plugins.get_plugin("Analysis")
+
+
+def poll(run, analysis, response):
+    parsed = []
+    extract_nodes = analysis.extract_nodes
+
+    async def counting_extract_nodes(replies):
+        parsed.extend(node for node, _ in replies)
+        return await extract_nodes(replies)
+
+    analysis.extract_nodes = counting_extract_nodes
+    try:
+        result = run(analysis.perform_operation([], "local", response, make_verifiers(len(response))))
+    finally:
+        analysis.extract_nodes = extract_nodes
+    return [entry["name"] for entry in result], parsed
+
+
+def test_replies_that_only_differ_in_the_fields_that_change_every_poll_are_skipped(run, analysis):
+    first = make_response(7, silent=1, poll=0)
+    second = make_response(7, silent=1, poll=1)
+    assert all(first[node] != second[node] for node in first if first[node] != "timeout")
+
+    returned, parsed = poll(run, analysis, first)
+    assert sorted(returned) == sorted(first)
+    assert sorted(parsed) == sorted(first)
+
+    returned, parsed = poll(run, analysis, second)
+    assert returned == []
+    assert parsed == []
+
+
+def test_a_change_is_parsed_and_returned(run, analysis):
+    response = make_response(7, silent=0, unreachable=0, outdated=0, poll=0)
+    poll(run, analysis, response)
+
+    response = make_response(7, silent=0, unreachable=0, outdated=0, poll=1)
+    response["Node3"] = "timeout"
+    returned, parsed = poll(run, analysis, response)
+    assert returned == ["Node3"]
+    assert parsed == ["Node3"]
+
+
+def test_other_changes_are_parsed_but_not_returned(run, analysis):
+    response = make_response(7, silent=0, unreachable=0, outdated=0)
+    poll(run, analysis, response)
+
+    response["Node4"] = response["Node4"].replace('"read-transactions": 0.0338', '"read-transactions": 0.0412')
+    returned, parsed = poll(run, analysis, response)
+    assert returned == []
+    assert parsed == ["Node4"]
@@ -0,0 +1,117 @@
+import asyncio
+import socket
+
+import pytest
+
+from endpoint_probe import EndpointProber, split_address
+
+
+@pytest.fixture
+def listening(run):
+    """The tcp:// address of a local socket that accepts connections."""
+    async def accept(reader, writer):
+        writer.close()
+
+    server = run(asyncio.start_server(accept, "127.0.0.1", 0))
+    host, port = server.sockets[0].getsockname()[:2]
+    yield f"tcp://{host}:{port}"
+    server.close()
+    run(server.wait_closed())
+
+
+@pytest.fixture
+def closed():
+    """The tcp:// address of a local port that nothing listens on."""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    host, port = sock.getsockname()
+    sock.close()
+    return f"tcp://{host}:{port}"
+
+
+@pytest.mark.parametrize("address, expected", [
+    ("tcp://10.0.0.1:9702", ("10.0.0.1", 9702)),
+    ("tcp://[2001:db8::1]:9701", ("2001:db8::1", 9701)),
+    ("tcp://node1.example.com:9702", ("node1.example.com", 9702)),
+    ("10.0.0.1:9702", ("10.0.0.1", 9702)),
+])
+def test_split_address(address, expected):
+    assert split_address(address) == expected
+
+
+@pytest.mark.parametrize("address", ["", "tcp://10.0.0.1", "tcp://:9702", "tcp://10.0.0.1:port"])
+def test_split_invalid_address(address):
+    with pytest.raises(ValueError):
+        split_address(address)
+
+
+def test_reachable_and_unreachable_endpoints(run, listening, closed):
+    prober = EndpointProber(timeout=2)
+    verifiers = {
+        "Node1": {"client_addr": listening, "node_addr": listening},
+        "Node2": {"client_addr": listening, "node_addr": closed},
+    }
+    probes = run(prober.probe_nodes("local", verifiers))
+
+    for node, endpoint in (("Node1", "client"), ("Node1", "node"), ("Node2", "client")):
+        probe = probes[node][endpoint]
+        assert probe["reachable"], probe
+        assert probe["latency"] >= 0
+        assert probe["availability"] == 1
+        assert "error" not in probe
+    probe = probes["Node2"]["node"]
+    assert probe["address"] == closed
+    assert not probe["reachable"]
+    assert probe["error"] == "Connection refused"
+    assert probe["availability"] == 0
+    assert "p50" not in probe
+
+
+def test_only_the_given_nodes_are_probed(run, listening):
+    verifiers = {"Node1": {"client_addr": listening}, "Node2": {"client_addr": listening}}
+    probes = run(EndpointProber().probe_nodes("local", verifiers, ["Node2", "Node3"]))
+    assert list(probes) == ["Node2"]
+
+
+def test_unresolvable_host(run):
+    probe = run(EndpointProber(timeout=5).probe("local", "Node1", "client", "tcp://node1.invalid:9702"))
+    assert not probe["reachable"]
+    assert probe["error"]
+    assert "Unknown error" not in probe["error"]
+
+
+def test_invalid_address(run):
+    probe = run(EndpointProber().probe("local", "Node1", "client", "tcp://node1"))
+    assert probe == {"address": "tcp://node1", "reachable": False, "error": "Invalid address"}
+
+
+def test_availability_and_percentiles_across_polls(run, listening, closed):
+    prober = EndpointProber(window=4)
+    for _ in range(3):
+        run(prober.probe("local", "Node1", "client", listening))
+    probe = run(prober.probe("local", "Node1", "client", closed))
+    assert probe["availability"] == 0.75
+    assert 0 <= probe["p50"] <= probe["p95"] <= probe["p99"]
+
+    # Only the last window of probes is kept.
+    for _ in range(4):
+        probe = run(prober.probe("local", "Node1", "client", listening))
+    assert probe["availability"] == 1
+
+
+def test_concurrency_cap(run, monkeypatch):
+    active = []
+    most = []
+
+    async def open_connection(host, port):
+        active.append(port)
+        most.append(len(active))
+        await asyncio.sleep(0.01)
+        active.remove(port)
+        raise ConnectionRefusedError(111, "Connection refused")
+
+    monkeypatch.setattr(asyncio, "open_connection", open_connection)
+    verifiers = {f"Node{i}": {"client_addr": f"tcp://127.0.0.1:{9700 + i}"} for i in range(20)}
+    probes = run(EndpointProber(concurrency=3).probe_nodes("local", verifiers))
+    assert len(probes) == 20
+    assert max(most) == 3
@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+from plugins.metrics import google_sheets
+
+
+class FakeWorksheet(object):
+    """Stands in for a gspread worksheet; append_rows fails the first
+    failures times it's called."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+
+    def append_rows(self, rows, value_input_option=None):
+        if self.failures:
+            self.failures -= 1
+            raise Exception("Quota exceeded")
+        self.batches.append(rows)
+
+
+class FakeClient(object):
+    """Stands in for an authorized gspread client."""
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.opened = []
+
+    def open(self, file_name):
+        self.opened.append(file_name)
+        return self
+
+    def worksheet(self, worksheet_name):
+        return self.sheet
+
+
+@pytest.fixture
+def authorize(monkeypatch):
+    """Replaces gspread_authZ; returns the list of clients it handed out."""
+    class Clients(list):
+        worksheet = FakeWorksheet()
+
+    clients = Clients()
+
+    def gspread_authZ(gauth_json):
+        clients.append(FakeClient(clients.worksheet))
+        return clients[-1]
+
+    monkeypatch.setattr(google_sheets, "gspread_authZ", gspread_authZ)
+    return clients
+
+
+def make_sink(tmp_path, **kwargs):
+    return google_sheets.SheetSink("creds.json", "Metrics", "Pool", str(tmp_path / "spool" / "sheets.jsonl"), backoff=0, **kwargs)
+
+
+def test_rows_are_uploaded_in_batches(tmp_path, run, authorize):
+    sink = make_sink(tmp_path, batch_size=100)
+    for i in range(250):
+        sink.enqueue([i, "ok"])
+
+    assert run(sink.flush()) == 250
+    assert [len(batch) for batch in authorize.worksheet.batches] == [100, 100, 50]
+    assert [row[0] for batch in authorize.worksheet.batches for row in batch] == list(range(250))
+    assert sink.read_spool() == []
+
+
+def test_client_and_worksheet_are_kept_between_flushes(tmp_path, run, authorize):
+    sink = make_sink(tmp_path)
+    for i in range(3):
+        sink.enqueue([i])
+        run(sink.flush())
+
+    assert len(authorize) == 1
+    assert authorize[0].opened == ["Metrics"]
+    assert len(authorize.worksheet.batches) == 3
+
+
+def test_failed_upload_is_retried_with_a_new_client(tmp_path, run, authorize):
+    authorize.worksheet.failures = 2
+    sink = make_sink(tmp_path, attempts=3)
+    sink.enqueue(["row"])
+
+    assert run(sink.flush()) == 1
+    assert authorize.worksheet.batches == [[["row"]]]
+    assert len(authorize) == 3
+
+
+def test_rows_stay_in_the_spool_during_an_outage(tmp_path, run, authorize, capsys):
+    authorize.worksheet.failures = 100
+    sink = make_sink(tmp_path, attempts=3)
+    sink.enqueue(["first"])
+    sink.enqueue(["second"])
+
+    assert run(sink.flush()) == 0
+    assert sink.read_spool() == [["first"], ["second"]]
+    captured = capsys.readouterr()
+    assert "2 row(s) are kept" in captured.err
+    assert captured.out == ""
+
+    # The next run uploads them once the sheet is back.
+    authorize.worksheet.failures = 0
+    sink.enqueue(["third"])
+    assert run(sink.flush()) == 3
+    assert [row for batch in authorize.worksheet.batches for row in batch] == [["first"], ["second"], ["third"]]
+    assert sink.read_spool() == []
+
+
+def test_partial_lines_in_the_spool_are_skipped(tmp_path, authorize):
+    sink = make_sink(tmp_path)
+    sink.enqueue(["whole"])
+    with open(sink.spool_path, "a") as spool:
+        spool.write(json.dumps(["torn"])[:-3])
+
+    assert sink.read_spool() == [["whole"]]
+
+
+def test_network_metrics_keep_stdout_for_the_result(tmp_path, run, monitor, authorize, capsys):
+    monitor_plugins = monitor("--mlog", "--json", "creds.json", "--file", "Metrics", "--worksheet", "Pool", "--sheet-spool", str(tmp_path / "sheets.jsonl"))
+    network_metrics = monitor_plugins.get_plugin("Network Metrics")
+    result = [{"name": "Node1", "status": {"ok": True}}, {"name": "Node2", "status": {"ok": False}}]
+
+    assert run(network_metrics.perform_operation(result, "Sovrin", {}, {})) == result
+    assert [row[1:] for batch in authorize.worksheet.batches for row in batch] == [["Sovrin", 2, 1, 2, 1, ""]]
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "Posted 1 row(s) to Metrics in sheet Pool." in captured.err
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from ledger_crawler import CrawlError, LedgerCrawler
+
+
+class FakePool(object):
+    """Answers GET_TXN for a ledger of size transactions, after latency
+    seconds (give or take jitter).  Requests sent to a node in down time out,
+    a node in behind only has that many transactions, and fail_at makes every
+    request for that sequence number fail."""
+
+    def __init__(self, size, latency = 0, jitter = 0, down = (), behind = None, fail_at = None):
+        self.size = size
+        self.behind = behind or {}
+        self.verified = 0
+        self.asked = []
+        self.latency = latency
+        self.jitter = jitter
+        self.down = set(down)
+        self.fail_at = fail_at
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rng = random.Random(1)
+
+    async def submit_action(self, request, node_aliases = None, timeout = None):
+        seq_no = json.loads(request.body)["operation"]["data"]
+        node = node_aliases[0]
+        self.requests += 1
+        self.asked.append((node, seq_no))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency + self.rng.uniform(0, self.jitter))
+        finally:
+            self.in_flight -= 1
+        if node in self.down or seq_no == self.fail_at:
+            return {node: "timeout"}
+        return {node: json.dumps({"op": "REPLY", "result": self.result(seq_no, self.behind.get(node, self.size))})}
+
+    async def submit_request(self, request):
+        seq_no = json.loads(request.body)["operation"]["data"]
+        self.verified += 1
+        await asyncio.sleep(self.latency)
+        return self.result(seq_no, self.size)
+
+    @staticmethod
+    def result(seq_no, size):
+        data = {"txn": {"data": {"dest": "did{0}".format(seq_no)}, "type": "1"}, "txnMetadata": {"seqNo": seq_no}} if seq_no <= size else None
+        return {"seqNo": seq_no, "data": data}
+
+
+NODES = ["Node1", "Node2", "Node3", "Node4"]
+
+
+def read_output(path):
+    with open(path) as output:
+        return [json.loads(line)["seqNo"] for line in output]
+
+
+def test_crawl(run, tmp_path):
+    path = str(tmp_path / "domain.jsonl")
+    pool = FakePool(250, jitter = 0.002)
+    summary = run(LedgerCrawler(pool, NODES, "domain", path, checkpoint_every = 50).crawl())
+    # Replies arrive out of order but are written in order, each once.
+    assert read_output(path) == list(range(1, 251))
+    assert summary["end_of_ledger"] and summary["txns"] == 250 and summary["last_seq_no"] == 250
+    assert summary["txns_per_second"]
+    # Running it again only asks for what's past the end.
+    pool.size = 260
+    summary = run(LedgerCrawler(pool, NODES, "domain", path).crawl())
+    assert summary["resumed_from"] == 251 and summary["txns"] == 10
+    assert read_output(path) == list(range(1, 261))
+
+
+def test_throughput(run, tmp_path):
+    # 100 transactions at 20ms each take 2s one at a time; a window of 10 keeps 10 in flight.
+    pool = FakePool(100, latency = 0.02)
+    summary = run(LedgerCrawler(pool, NODES, "domain", str(tmp_path / "domain.jsonl"), to_seq_no = 100, window = 10).crawl())
+    assert summary["txns"] == 100
+    assert pool.max_in_flight == 10
+    assert summary["seconds"] < 1
+
+
+def test_node_behind(run, tmp_path):
+    # Node2 only has the first 100 transactions; that's not the end of the ledger.
+    path = str(tmp_path / "domain.jsonl")
+    summary = run(LedgerCrawler(FakePool(250, behind = {"Node2": 100}), NODES, "domain", path).crawl())
+    assert read_output(path) == list(range(1, 251))
+    assert summary["end_of_ledger"] and summary["last_seq_no"] == 250
+
+
+def test_end_confirmed(run, tmp_path):
+    # The end of the ledger is confirmed by f + 1 nodes; two of 4, and three of 7.
+    for nodes, confirmations in ((NODES, 2), (NODES + ["Node5", "Node6", "Node7"], 3)):
+        pool = FakePool(50)
+        summary = run(LedgerCrawler(pool, nodes, "domain", str(tmp_path / "{0}.jsonl".format(len(nodes))), window = 1).crawl())
+        assert summary["end_of_ledger"] and summary["last_seq_no"] == 50
+        assert len(set(node for node, seq_no in pool.asked if seq_no == 51)) == confirmations
+
+
+def test_verified(run, tmp_path):
+    path = str(tmp_path / "domain.jsonl")
+    pool = FakePool(30, behind = {"Node2": 0}, down = ["Node3"])
+    summary = run(LedgerCrawler(pool, NODES, "domain", path, verify = True).crawl())
+    assert summary["verified"] and summary["end_of_ledger"]
+    assert read_output(path) == list(range(1, 31))
+    assert pool.requests == 0 and pool.verified >= 31
+
+
+def test_failing_node(run, tmp_path):
+    path = str(tmp_path / "domain.jsonl")
+    summary = run(LedgerCrawler(FakePool(40, down = ["Node2"]), NODES, "domain", path).crawl())
+    assert read_output(path) == list(range(1, 41))
+    assert summary["retries"] > 0
+
+
+def test_resume_after_failure(run, tmp_path):
+    path = str(tmp_path / "domain.jsonl")
+    with pytest.raises(CrawlError):
+        run(LedgerCrawler(FakePool(200, fail_at = 120), NODES, "domain", path, attempts = 2).crawl())
+    # What was written before the failing transaction was kept.
+    written = read_output(path)
+    assert written == list(range(1, len(written) + 1)) and 100 <= len(written) < 120
+    summary = run(LedgerCrawler(FakePool(200), NODES, "domain", path).crawl())
+    assert summary["resumed_from"] == len(written) + 1
+    assert read_output(path) == list(range(1, 201))
+
+
+class Killed(BaseException):
+    pass
+
+
+def test_resume_after_kill(run, tmp_path, monkeypatch):
+    """The process dies after transactions were written but before they were checkpointed."""
+    path = str(tmp_path / "domain.jsonl")
+    save_checkpoint = LedgerCrawler.save_checkpoint
+    checkpoints = []
+
+    def kill_on_second_checkpoint(self, output_file):
+        if checkpoints:
+            raise Killed()
+        save_checkpoint(self, output_file)
+        checkpoints.append(self.last_seq_no)
+
+    monkeypatch.setattr(LedgerCrawler, "save_checkpoint", kill_on_second_checkpoint)
+    with pytest.raises(Killed):
+        run(LedgerCrawler(FakePool(300), NODES, "domain", path, checkpoint_every = 50).crawl())
+    written = read_output(path)
+    assert written[-1] > checkpoints[0]
+    # And a line that was only partly written.
+    with open(path, "a") as output:
+        output.write('{"seqNo": %d, "txn": {"da' % (written[-1] + 1))
+
+    monkeypatch.setattr(LedgerCrawler, "save_checkpoint", save_checkpoint)
+    summary = run(LedgerCrawler(FakePool(300), NODES, "domain", path).crawl())
+    assert summary["resumed_from"] == checkpoints[0] + 1
+    assert read_output(path) == list(range(1, 301))
+
+
+def test_no_checkpoint(run, tmp_path):
+    path = tmp_path / "domain.jsonl"
+    path.write_text('{"seqNo": 1}\n')
+    with pytest.raises(CrawlError):
+        run(LedgerCrawler(FakePool(10), NODES, "domain", str(path)).crawl())
+    # Someone else's file is left alone.
+    assert path.read_text() == '{"seqNo": 1}\n'
+
+
+def test_wrong_ledger(run, tmp_path):
+    path = str(tmp_path / "ledger.jsonl")
+    run(LedgerCrawler(FakePool(10), NODES, "domain", path).crawl())
+    with pytest.raises(CrawlError):
+        run(LedgerCrawler(FakePool(10), NODES, "pool", path).crawl())
+    assert read_output(path) == list(range(1, 11))
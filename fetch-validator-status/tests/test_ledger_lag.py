@@ -0,0 +1,58 @@
+import time
+
+from synthetic import STARTED, make_reply, make_verifiers, node_names
+
+NODES = node_names(7)
+
+
+def make_replies(poll: int, behind: int) -> dict:
+    """A poll a minute after the one before; the pool orders 60 transactions
+    a minute, and Node7 is the given number of transactions behind."""
+    transactions = 1000 + 60 * poll
+    replies = {node: make_reply(node, NODES, timestamp=STARTED + 3600 + 60 * poll, req_id=poll + 1, transactions=transactions) for node in NODES}
+    replies["Node7"] = make_reply("Node7", NODES, timestamp=STARTED + 3600 + 60 * poll, req_id=poll + 1, transactions=transactions - behind)
+    return replies
+
+
+def poll(run, monkeypatch, analysis, number: int, behind: int) -> dict:
+    """Each node's entry for the poll, polled at one minute intervals."""
+    monkeypatch.setattr(time, "time", lambda: 1700000000 + 60 * number)
+    result = run(analysis.perform_operation([], "synthetic", make_replies(number, behind), make_verifiers(len(NODES))))
+    return {entry["name"]: entry for entry in result}
+
+
+def ledger_lag(entry: dict) -> dict:
+    return next((warning["ledger_lag"] for warning in entry.get("warnings", []) if "ledger_lag" in warning), None)
+
+
+def test_catching_up(run, monkeypatch, monitor):
+    analysis = monitor("--status").get_plugin("Analysis")
+    first = poll(run, monkeypatch, analysis, 0, 500)
+    # The first poll only knows how far behind the node is.
+    assert ledger_lag(first["Node7"])["ledger"] == {"lag": 500, "max": 1000}
+    assert all(ledger_lag(first[node]) is None for node in NODES[:6])
+
+    # 300 of the 500 transactions caught up in a minute; the other 200 take another 40 seconds.
+    second = poll(run, monkeypatch, analysis, 1, 200)
+    assert ledger_lag(second["Node7"])["ledger"] == {"lag": 200, "max": 1060, "catch_up_rate": 5.0, "eta_seconds": 40}
+    # The audit ledger holds two transactions for each one on the domain ledger.
+    assert ledger_lag(second["Node7"])["audit"] == {"lag": 400, "max": 2120, "catch_up_rate": 10.0, "eta_seconds": 40}
+
+    monkeypatch.setattr(time, "time", lambda: 1700000000 + 120)
+    counts = {node: {"ledger": 1120} for node in NODES}
+    counts["Node7"] = {"ledger": 870}
+    progress = run(analysis.get_ledger_progress(counts, "synthetic"))
+    # Falling further behind; no ETA.
+    assert progress["ledger"]["catch_up_rate"] == {"Node7": -0.833}
+    assert progress["ledger"]["eta_seconds"] == {}
+
+
+def test_below_threshold(run, monkeypatch, monitor):
+    analysis = monitor("--status", "--lag-threshold", "600").get_plugin("Analysis")
+    assert ledger_lag(poll(run, monkeypatch, analysis, 0, 500)["Node7"]) == {"audit": {"lag": 1000, "max": 2000}}
+
+
+def test_warning_off(run, monkeypatch, monitor):
+    analysis = monitor("--status", "--lag-threshold", "0").get_plugin("Analysis")
+    for number, behind in ((0, 500), (1, 200)):
+        assert all(ledger_lag(entry) is None for entry in poll(run, monkeypatch, analysis, number, behind).values())
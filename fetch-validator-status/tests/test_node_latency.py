@@ -0,0 +1,68 @@
+import asyncio
+
+from node_latency import LatencyTracker
+
+
+def test_timeout_grows_with_each_failure_and_starts_over():
+    tracker = LatencyTracker(max_timeout=20, min_timeout=0.5)
+    for _ in range(10):
+        tracker.record("pool", "Node1", 0.1)
+    assert tracker.timeout("pool", "Node2") == 20
+
+    timeouts = []
+    for _ in range(8):
+        tracker.record_failure("pool", "Node2")
+        timeouts.append(tracker.timeout("pool", "Node2"))
+    assert timeouts == [0.5, 1, 2, 4, 8, 16, 20, 0.5]
+
+    tracker.record("pool", "Node2", 1.0)
+    assert 1.0 < tracker.timeout("pool", "Node2") <= 3
+
+
+def test_timeout_without_replies():
+    tracker = LatencyTracker(max_timeout=20)
+    tracker.record_failure("pool", "Node1")
+    assert tracker.timeout("pool", "Node1") == 20
+
+
+async def poll(tracker, delays):
+    async def reply(node, delay):
+        async def send():
+            await asyncio.sleep(delay)
+            return "reply"
+        return node, await tracker.submit("pool", node, send)
+
+    return dict(await asyncio.gather(*[reply(node, delay) for node, delay in delays.items()]))
+
+
+def test_a_slow_node_that_recovered_gets_to_reply_again(run):
+    # Six nodes reply in 10ms; Node7 was down and now takes 100ms, twice the time it is given after a failure.
+    tracker = LatencyTracker(max_timeout=2, min_timeout=0.01)
+    delays = {"Node{0}".format(i): 0.01 for i in range(1, 7)}
+    delays["Node7"] = 0.1
+    for _ in range(5):
+        run(poll(tracker, delays))
+    tracker.record_failure("pool", "Node7")
+
+    replies = [run(poll(tracker, delays))["Node7"] for _ in range(5)]
+    assert "reply" in replies
+    assert replies.index("reply") <= 2
+    assert replies[-1] == "reply"
+
+
+def test_a_dead_node_only_gets_the_full_timeout_now_and_then(run):
+    tracker = LatencyTracker(max_timeout=0.4, min_timeout=0.01)
+    for _ in range(10):
+        tracker.record("pool", "Node1", 0.01)
+
+    async def send():
+        await asyncio.sleep(10)
+
+    timeouts = []
+    for _ in range(12):
+        timeouts.append(tracker.timeout("pool", "Node2"))
+        assert run(tracker.submit("pool", "Node2", send)) == "timeout"
+    # The first poll gives a node that never replied the full timeout.
+    assert timeouts[:5] == [0.4, 0.05, 0.1, 0.2, 0.4]
+    assert timeouts[1:].count(0.4) == 2
+    assert sum(timeouts[1:]) < 0.4 * len(timeouts[1:]) / 2
@@ -0,0 +1,75 @@
+import textwrap
+
+import pytest
+
+from plugin_collection import PluginManifest
+
+
+@pytest.fixture
+def parse(tmp_path):
+    def parse(source: str) -> bool:
+        path = tmp_path / "module.py"
+        path.write_text(textwrap.dedent(source))
+        return PluginManifest.parse(str(path))
+    return parse
+
+
+def test_plugin(parse):
+    assert parse("""
+        import plugin_collection
+        class main(plugin_collection.Plugin):
+            pass
+    """)
+    assert parse("""
+        from plugin_collection import Plugin
+        class main(Plugin):
+            pass
+    """)
+
+
+def test_helper(parse):
+    assert not parse("""
+        import json
+        class Store(object):
+            pass
+        class StoreError(Exception):
+            pass
+        class ReadOnlyStore(Store):
+            pass
+        def load(path):
+            return json.load(open(path))
+    """)
+
+
+def test_indirect_plugin(parse):
+    # A plug-in deriving from a base class defined elsewhere; only an import tells.
+    assert parse("""
+        from .base import MetricsPlugin
+        class main(MetricsPlugin):
+            pass
+    """)
+    assert parse("""
+        from . import base
+        class main(base.MetricsPlugin):
+            pass
+    """)
+
+
+def test_syntax_error(parse):
+    # Left for the import to report.
+    assert parse("class main(:\n")
+
+
+def test_cached(tmp_path, monkeypatch):
+    path = tmp_path / "helper.py"
+    path.write_text("class Store(object):\n    pass\n")
+    manifest = PluginManifest("plugins")
+    manifest.modules = {}
+    parsed = []
+    monkeypatch.setattr(PluginManifest, "parse", staticmethod(lambda file_path: parsed.append(file_path) or False))
+    assert not manifest.defines_plugin("plugins.helper", str(tmp_path))
+    assert not manifest.defines_plugin("plugins.helper", str(tmp_path))
+    assert len(parsed) == 1
+    path.write_text("from .base import MetricsPlugin\nclass main(MetricsPlugin):\n    pass\n")
+    manifest.defines_plugin("plugins.helper", str(tmp_path))
+    assert len(parsed) == 2
@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+import serialization
+from node_status import NodeStatus
+from synthetic import make_response, make_verifiers
+
+
+@pytest.fixture
+def exporter(monitor, run, tmp_path):
+    """Returns load(*argv); the plug-ins set up with the Prometheus Exporter,
+    listening on a free local port, and the exporter."""
+    servers = []
+
+    def load(*argv):
+        monitor_plugins = monitor("--prometheus", "--prometheus-host", "127.0.0.1", "--prometheus-port", "0", "--state-file", str(tmp_path / "monitor.db"), *argv)
+        plugin = monitor_plugins.get_plugin("Prometheus Exporter")
+        servers.append(plugin)
+        return monitor_plugins, plugin
+
+    yield load
+    for plugin in servers:
+        if plugin.server:
+            plugin.server.close()
+            run(plugin.server.wait_closed())
+
+
+def sample_nodes(page: str, name: str) -> set:
+    return set(line.split('node="')[1].split('"')[0] for line in page.splitlines() if line.startswith(name + "{"))
+
+
+def poll(run, monitor_plugins, response):
+    return run(monitor_plugins.apply_all_plugins_on_value([], "local", response, make_verifiers(len(response))))
+
+
+def test_every_node_is_published(run, exporter):
+    monitor_plugins, plugin = exporter()
+    response = make_response(25)
+    poll(run, monitor_plugins, response)
+    page = plugin.page.decode("utf-8")
+    for name in ("indy_node_ok", "indy_node_responding", "indy_node_errors"):
+        assert sample_nodes(page, name) == set(response)
+    assert sample_nodes(page, "indy_node_uptime_seconds") == set(node for node, reply in response.items() if reply != "timeout")
+    assert 'indy_node_transaction_count{network="local",node="Node2",ledger="ledger"} 1000.0' in page
+
+
+def test_nodes_left_out_by_alerts_are_published(run, exporter):
+    monitor_plugins, plugin = exporter("--alerts")
+    response = make_response(25, silent=0, unreachable=0, outdated=0)
+    response["Node7"] = "timeout"
+    result = poll(run, monitor_plugins, response)
+    assert [entry["name"] for entry in result] == ["Node7"]
+    page = plugin.page.decode("utf-8")
+    assert sample_nodes(page, "indy_node_ok") == set(response)
+    assert sample_nodes(page, "indy_node_uptime_seconds") == set(response) - {"Node7"}
+    assert 'indy_node_ok{network="local",node="Node7"} 0.0' in page
+    assert 'indy_node_ok{network="local",node="Node8"} 1.0' in page
+
+
+def test_nodes_left_out_by_delta_keep_their_status(run, exporter):
+    monitor_plugins, plugin = exporter("--delta")
+    response = make_response(7, silent=1, unreachable=0)
+    poll(run, monitor_plugins, response)
+    first = plugin.page.decode("utf-8")
+    # The same replies again; every node is left out of the result.
+    assert poll(run, monitor_plugins, response) == []
+    second = plugin.page.decode("utf-8")
+    for name in ("indy_node_ok", "indy_node_errors", "indy_node_uptime_seconds", "indy_node_transaction_count"):
+        assert [line for line in first.splitlines() if line.startswith(name + "{")] == [line for line in second.splitlines() if line.startswith(name + "{")]
+
+
+def test_scrape(run, exporter):
+    monitor_plugins, plugin = exporter()
+    poll(run, monitor_plugins, make_response(4, silent=0))
+    port = plugin.server.sockets[0].getsockname()[1]
+
+    async def get(path):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write("GET {0} HTTP/1.1\r\nHost: localhost\r\n\r\n".format(path).encode("latin-1"))
+        reply = await reader.read()
+        writer.close()
+        return reply
+
+    reply = run(get("/metrics"))
+    assert reply.startswith(b"HTTP/1.1 200 OK")
+    assert reply.endswith(plugin.page)
+    assert b"# TYPE indy_node_ok gauge" in reply
+    assert run(get("/other")).startswith(b"HTTP/1.1 404")
+
+
+def test_sinks_use_the_parsed_replies(run, exporter, tmp_path, monkeypatch):
+    monitor_plugins, plugin = exporter("--tslog", "--ts-dir", str(tmp_path / "timeseries"))
+    response = make_response(7, silent=1)
+    verifiers = make_verifiers(7)
+    result = run(monitor_plugins.apply_all_plugins_on_value([], "local", response, verifiers, run_sinks = False))
+
+    def from_reply(*args, **kwargs):
+        raise AssertionError("A reply was parsed again.")
+
+    monkeypatch.setattr(NodeStatus, "from_reply", from_reply)
+    monkeypatch.setattr(serialization, "loads", from_reply)
+    run(monitor_plugins.apply_all_sinks_on_value(result, "local", response, verifiers))
+    page = plugin.page.decode("utf-8")
+    assert sample_nodes(page, "indy_node_uptime_seconds") == set(node for node, reply in response.items() if reply != "timeout")
+    local_metrics = monitor_plugins.get_plugin("Local Metrics")
+    assert len(local_metrics.store.query("local", "Node3", "uptime", 0, 2 ** 32)) == 1
+
+
+def test_sinks_without_analysis(run, exporter):
+    # The supervisor runs the sinks on the results of its workers; its own Analysis plug-in hasn't seen the replies.
+    monitor_plugins, plugin = exporter()
+    response = make_response(4, silent=0)
+    run(monitor_plugins.apply_all_sinks_on_value([], "local", response, make_verifiers(4)))
+    assert sample_nodes(plugin.page.decode("utf-8"), "indy_node_uptime_seconds") == set(response)
+
+
+def test_networks_polled_at_once(run, exporter, monkeypatch):
+    monitor_plugins, plugin = exporter()
+    start_server = asyncio.start_server
+    started = []
+
+    async def slow_start_server(*args, **kwargs):
+        # Let the other network's sink catch up while the server is being started.
+        await asyncio.sleep(0.01)
+        started.append(await start_server(*args, **kwargs))
+        return started[-1]
+
+    monkeypatch.setattr(asyncio, "start_server", slow_start_server)
+    responses = {"local": make_response(4, silent=0), "other": make_response(7, silent=0)}
+    run(asyncio.gather(*[monitor_plugins.apply_all_sinks_on_value([], network, response, make_verifiers(len(response))) for network, response in responses.items()]))
+    assert len(started) == 1
+    page = plugin.page.decode("utf-8")
+    assert 'network="other",node="Node7"' in page and 'network="local",node="Node4"' in page
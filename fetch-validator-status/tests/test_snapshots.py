@@ -0,0 +1,95 @@
+import os
+
+from plugins.archive.snapshots import INDEX_RECORD, SnapshotArchive
+from synthetic import STARTED, make_response
+
+NODE_COUNT = 7
+
+
+def poll(number: int, node_count: int = NODE_COUNT) -> dict:
+    return make_response(node_count, poll=number)
+
+
+def append(archive, number: int) -> dict:
+    return archive.append([("synthetic", node, reply) for node, reply in poll(number).items()], STARTED + 60 * number)
+
+
+def test_get(tmp_path):
+    archive = SnapshotArchive(str(tmp_path))
+    for number in range(5):
+        append(archive, number)
+    assert archive.get("synthetic", "Node3")["reply"] == poll(4)["Node3"]
+    assert archive.get("synthetic", "Node3", STARTED + 150)["reply"] == poll(2)["Node3"]
+    assert archive.get("synthetic", "Node3", STARTED + 120)["reply"] == poll(2)["Node3"]
+    assert archive.get("synthetic", "Node3", STARTED - 1) is None
+    assert archive.get("synthetic", "Node99") is None
+
+
+def test_reader_sees_new_polls(tmp_path):
+    writer = SnapshotArchive(str(tmp_path))
+    append(writer, 0)
+    reader = SnapshotArchive(str(tmp_path))
+    assert reader.get("synthetic", "Node2")["reply"] == poll(0)["Node2"]
+    append(writer, 1)
+    assert reader.get("synthetic", "Node2")["reply"] == poll(1)["Node2"]
+    assert reader.get("synthetic", "Node2", STARTED + 30)["reply"] == poll(0)["Node2"]
+
+
+def test_reopen(tmp_path):
+    first = append(SnapshotArchive(str(tmp_path)), 0)
+    archive = SnapshotArchive(str(tmp_path))
+    second = append(archive, 1)
+    # Carries on with the segment, compressing against the keyframes written before.
+    assert archive.segments() == [1]
+    assert second["compressed_bytes"] < first["compressed_bytes"]
+    for number in (0, 1):
+        for node, reply in poll(number).items():
+            assert archive.get("synthetic", node, STARTED + 60 * number)["reply"] == reply
+
+
+def test_reopen_full_segment(tmp_path):
+    append(SnapshotArchive(str(tmp_path), segment_size=256), 0)
+    archive = SnapshotArchive(str(tmp_path), segment_size=256)
+    append(archive, 1)
+    assert archive.segments() == [1, 2]
+    assert archive.get("synthetic", "Node1", STARTED)["reply"] == poll(0)["Node1"]
+    assert archive.get("synthetic", "Node1")["reply"] == poll(1)["Node1"]
+
+
+def test_reopen_torn_index(tmp_path):
+    append(SnapshotArchive(str(tmp_path)), 0)
+    # The writer died part way through an index record.
+    archive = SnapshotArchive(str(tmp_path))
+    with open(archive.index_path(1), "ab") as index_file:
+        index_file.write(b"\0" * (INDEX_RECORD.size // 2))
+    append(archive, 1)
+    assert os.path.getsize(archive.index_path(1)) == 2 * NODE_COUNT * INDEX_RECORD.size
+    for number in (0, 1):
+        for node, reply in poll(number).items():
+            assert archive.get("synthetic", node, STARTED + 60 * number)["reply"] == reply
+
+
+def test_frames_synced_before_the_index(tmp_path, monkeypatch):
+    archive = SnapshotArchive(str(tmp_path))
+    synced = []
+    sync = SnapshotArchive.sync
+
+    def recording_sync(open_file):
+        sync(open_file)
+        # The temporary files are opened from a file descriptor, and named by it.
+        if isinstance(open_file.name, str):
+            with open(open_file.name, "rb") as synced_file:
+                data = synced_file.read()
+            if open_file.name.endswith(".idx"):
+                # The end of the last frame the index points to.
+                end = max(offset + length for _, _, offset, length, _, _, _ in INDEX_RECORD.iter_unpack(data))
+            else:
+                end = len(data)
+            synced.append((os.path.basename(open_file.name), end))
+
+    monkeypatch.setattr(SnapshotArchive, "sync", staticmethod(recording_sync))
+    append(archive, 0)
+    append(archive, 1)
+    assert [name for name, _ in synced] == ["00000001.seg", "00000001.idx"] * 2
+    # The index never points past what was already synced of the segment.
+    assert [end for _, end in synced[::2]] == [end for _, end in synced[1::2]]
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import fetch_status
+from synthetic import make_reply, make_verifiers, node_names
+
+
+class FakePool(object):
+    """Answers every node's GET_VALIDATOR_INFO with its reply from replies."""
+
+    def __init__(self, replies):
+        self.replies = replies
+
+    async def get_verifiers(self):
+        return make_verifiers(len(self.replies))
+
+    async def submit_action(self, request, node_aliases = None, timeout = None):
+        return {node: self.replies[node] for node in node_aliases}
+
+
+def make_replies(node_count: int = 7) -> dict:
+    nodes = node_names(node_count)
+    replies = {node: make_reply(node, nodes) for node in nodes}
+    replies["Node3"] = make_reply("Node3", nodes, version="1.12.3")
+    replies["Node5"] = make_reply("Node5", nodes, primary="Node2")
+    # Node6 and Node7 can't reach each other.
+    replies["Node6"] = make_reply("Node6", nodes, unreachable=["Node7"])
+    replies["Node7"] = make_reply("Node7", nodes, unreachable=["Node6"])
+    return replies
+
+
+def stream(run, monitor, monkeypatch, *argv):
+    monitor_plugins = monitor(*argv)
+    sinks = []
+
+    async def capture_sinks(result, network_name, response, verifiers, exclude = ()):
+        sinks.append(result)
+
+    monkeypatch.setattr(monitor_plugins, "apply_all_sinks_on_value", capture_sinks)
+    run(fetch_status.fetch_status_stream(monitor_plugins, FakePool(make_replies()), network_name="synthetic"))
+    return sinks
+
+
+def test_sinks_get_cross_node_findings(run, monitor, monkeypatch, capsys):
+    sinks = stream(run, monitor, monkeypatch, "--status")
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    summary = records[-1]["summary"]
+    assert set(summary["package_mismatch"]) == {"Node3"}
+    assert set(summary["primary_mismatch"]) == {"Node5"}
+    assert set(summary["connection_issues"]) == {"Node6", "Node7"}
+
+    assert len(sinks) == 1
+    entries = {entry["name"]: entry for entry in sinks[0]}
+    assert list(entries) == node_names(7)
+    assert any("Package mismatch" in warning for warning in entries["Node3"]["warnings"])
+    assert any("Primary Mismatch" in warning for warning in entries["Node5"]["warnings"])
+    assert entries["Node5"]["status"]["warnings"] == len(entries["Node5"]["warnings"])
+    for node in ("Node6", "Node7"):
+        assert not entries[node]["status"]["ok"]
+        assert any("can't reach each other" in error for error in entries[node]["errors"])
+    assert "warnings" not in entries["Node1"]
+
+
+def test_sinks_get_filtered_result(run, monitor, monkeypatch, capsys):
+    # The sinks get the nodes that --alerts passed on as they replied, with the cross node findings merged in.
+    sinks = stream(run, monitor, monkeypatch, "--alerts")
+    printed = [json.loads(line) for line in capsys.readouterr().out.splitlines()][:-1]
+    assert sorted(entry["name"] for entry in sinks[0]) == sorted(entry["name"] for entry in printed) == ["Node6", "Node7"]
+    entries = {entry["name"]: entry for entry in sinks[0]}
+    assert any("can't reach each other" in error for error in entries["Node6"]["errors"])
+
+
+def test_transforms_run_once(run, monitor, monkeypatch, capsys):
+    monitor_plugins = monitor("--status")
+    status_only = monitor_plugins.get_plugin("Status Only")
+    perform_operation = status_only.perform_operation
+    seen = []
+
+    async def counting(result, network_name, response, verifiers):
+        seen.extend(entry["name"] for entry in result)
+        return await perform_operation(result, network_name, response, verifiers)
+
+    monkeypatch.setattr(status_only, "perform_operation", counting)
+    monkeypatch.setattr(monitor_plugins, "apply_all_sinks_on_value", lambda *args, **kwargs: asyncio.sleep(0))
+    run(fetch_status.fetch_status_stream(monitor_plugins, FakePool(make_replies()), network_name="synthetic"))
+    assert sorted(seen) == sorted(node_names(7))
+
+
+def test_delta_rejected():
+    process = subprocess.run([sys.executable, "fetch_status.py", "--stream", "--delta"], cwd=os.path.dirname(os.path.realpath(fetch_status.__file__)), capture_output=True, text=True, timeout=60)
+    assert "'--delta' can't be used with '--stream'" in process.stderr
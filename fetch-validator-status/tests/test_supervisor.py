@@ -0,0 +1,207 @@
+import json
+import random
+import time
+
+import pytest
+
+import fetch_status
+from supervisor import Forwarder, Supervisor, load_targets, run_shard
+
+TARGETS = [{"id": f"net{i}", "name": f"Network {i}", "genesis_url": None, "genesis_path": None} for i in range(4)]
+
+
+class FakeWorker(object):
+    """Stands in for a worker process."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.alive = True
+        self.exitcode = None
+        self.terminated = False
+
+    def is_alive(self):
+        return self.alive
+
+    def terminate(self):
+        self.terminated = True
+        self.alive = False
+        self.exitcode = -15
+
+    def join(self, timeout = None):
+        pass
+
+    def exit(self, exitcode: int = 1):
+        self.alive = False
+        self.exitcode = exitcode
+
+
+class Clock(object):
+    def __init__(self, now: float = 1700000000):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock)
+    # No jitter, so the delays can be checked.
+    monkeypatch.setattr(random, "uniform", lambda low, high: 1)
+    return clock
+
+
+@pytest.fixture
+def fleet(monitor, clock):
+    """A supervisor of two shards, with fake workers."""
+    fleet = Supervisor(monitor("--status"), TARGETS, 2, [], 60, backoff=1, max_backoff=5, stall_timeout=300)
+
+    def start_worker(shard: int):
+        worker = FakeWorker(1000 + len(fleet.started_workers))
+        fleet.started_workers.append(shard)
+        fleet.workers[shard] = worker
+        fleet.stats[shard]["pid"] = worker.pid
+        fleet.stats[shard]["last_seen"] = time.time()
+
+    fleet.started_workers = []
+    fleet.start_worker = start_worker
+    for shard in range(len(fleet.shards)):
+        fleet.start_worker(shard)
+    return fleet
+
+
+def crash(fleet: Supervisor, clock: Clock, shard: int = 0) -> float:
+    """Crashes the shard's worker; returns the delay before it is restarted."""
+    fleet.workers[shard].exit()
+    fleet.check_workers()
+    delay = fleet.restart_at[shard] - clock.now
+    clock.now += delay
+    fleet.check_workers()
+    return delay
+
+
+def test_shards(fleet):
+    assert fleet.shards == [[TARGETS[0], TARGETS[2]], [TARGETS[1], TARGETS[3]]]
+    assert Supervisor(None, TARGETS[:1], 4, [], 60).shards == [TARGETS[:1]]
+
+
+def test_restart_backoff(run, fleet, clock, capsys):
+    # The delay doubles on every crash in a row, up to max_backoff.
+    assert [crash(fleet, clock) for _ in range(5)] == [1, 2, 4, 5, 5]
+    assert fleet.stats[0]["restarts"] == 5
+    assert fleet.started_workers == [0, 1, 0, 0, 0, 0, 0]
+    assert "Shard 0 (pid 1005) exited with code 1, restarting it in 5.0s ..." in capsys.readouterr().err
+    # A completed poll starts it over.
+    run(fleet.handle_message(("poll", 0, 1.5, 0.5)))
+    assert crash(fleet, clock) == 1
+    # The other shard wasn't touched.
+    assert fleet.stats[1]["restarts"] == 0
+
+
+def test_restart_waits(fleet, clock):
+    fleet.workers[1].exit()
+    fleet.check_workers()
+    assert 1 not in fleet.workers
+    clock.now += 0.5
+    fleet.check_workers()
+    assert fleet.started_workers == [0, 1]
+    clock.now += 0.5
+    fleet.check_workers()
+    assert fleet.started_workers == [0, 1, 1]
+
+
+def test_stalled_worker_terminated(run, fleet, clock, capsys):
+    worker = fleet.workers[0]
+    clock.now += 200
+    run(fleet.handle_message(("poll", 1, 1.0, 0.5)))
+    clock.now += 101
+    fleet.check_workers()
+    # Shard 0 has not been heard from for 301 seconds; shard 1 for 101.
+    assert worker.terminated
+    assert not fleet.workers[1].terminated
+    assert "Shard 0 (pid 1000) has not completed a poll in 300s, terminating it ..." in capsys.readouterr().err
+    assert fleet.restart_at == {0: clock.now + 1}
+
+
+def test_stats(run, fleet, clock, capsys):
+    results = [{"name": "Node1"}], {"error": "Timeout"}, [{"name": "Node1"}]
+    for result in results:
+        run(fleet.handle_message(("result", 0, "net0", "Network 0", result, {}, {})))
+    run(fleet.handle_message(("poll", 0, 1.5, 0.25)))
+    run(fleet.handle_message(("poll", 0, 2.5, 0.75)))
+    fleet.workers[1].exit()
+    clock.now += 120
+
+    stats = fleet.get_stats()["supervisor"]
+    assert stats["uptime"] == 120
+    assert stats["shards"][0] == {"pid": 1000, "alive": True, "networks": 2, "restarts": 0, "polls": 2, "results": 3, "errors": 1, "results_per_minute": 1.5, "mean_poll_seconds": 2.0, "mean_cpu_seconds": 0.5, "last_poll_seconds": 2.5}
+    assert stats["shards"][1]["alive"] is False
+    assert stats["shards"][1]["mean_poll_seconds"] is None
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(line["network"], line["shard"]) for line in lines] == [("net0", 0)] * 3
+
+
+def test_sinks_skip_errors(run, fleet, clock, capsys, monkeypatch):
+    sinks = []
+
+    async def capture_sinks(result, network_name, response, verifiers, exclude = ()):
+        sinks.append((network_name, result))
+
+    monkeypatch.setattr(fleet.monitor_plugins, "apply_all_sinks_on_value", capture_sinks)
+    run(fleet.handle_message(("result", 1, "net1", "Network 1", {"error": "Timeout"}, {}, {})))
+    run(fleet.handle_message(("result", 1, "net1", "Network 1", [{"name": "Node1"}], {}, {})))
+    assert sinks == [("Network 1", [{"name": "Node1"}])]
+
+
+class Stop(Exception):
+    pass
+
+
+class Messages(list):
+    """Stands in for the queue; stops the shard after its first poll."""
+
+    def put(self, message):
+        self.append(message)
+        if message[0] == "poll":
+            raise Stop()
+
+
+@pytest.mark.parametrize("forward", [True, False])
+def test_shard_forwards_responses_for_sinks(run, monitor, monkeypatch, forward):
+    monitor_plugins = monitor("--status")
+    forwarder = Forwarder() if forward else None
+    if forwarder:
+        monitor_plugins.plugins.append(forwarder)
+
+    async def fetch_network_status(monitor_plugins, pools, target, ident = None):
+        return await monitor_plugins.apply_all_plugins_on_value([], target["name"], {"Node1": "reply"}, {"Node1": {}})
+
+    monkeypatch.setattr(fetch_status, "fetch_network_status", fetch_network_status)
+    messages = Messages()
+    with pytest.raises(Stop):
+        run(run_shard(0, TARGETS[:2], monitor_plugins, None, forwarder, messages, 60))
+    sent = {message[2]: message[5:] for message in messages if message[0] == "result"}
+    if forward:
+        assert sent == {"net0": ({"Node1": "reply"}, {"Node1": {}}), "net1": ({"Node1": "reply"}, {"Node1": {}})}
+        assert forwarder.responses == {}
+    else:
+        assert sent == {"net0": ({}, {}), "net1": ({}, {})}
+
+
+def test_load_targets(tmp_path, monkeypatch):
+    monkeypatch.setattr(fetch_status, "get_network_genesis_path", lambda net_id: f"/cache/{net_id}/pool_transactions_genesis")
+    networks_file = tmp_path / "fleet.json"
+    networks_file.write_text(json.dumps({
+        "alpha": {"name": "Alpha", "genesisUrl": "https://example.com/alpha"},
+        "beta": {"name": "Beta", "genesisPath": "/etc/beta/genesis"},
+    }))
+    assert load_targets(str(networks_file)) == [
+        {"id": "alpha", "name": "Alpha", "genesis_url": "https://example.com/alpha", "genesis_path": "/cache/alpha/pool_transactions_genesis"},
+        {"id": "beta", "name": "Beta", "genesis_url": None, "genesis_path": "/etc/beta/genesis"},
+    ]
+    assert load_targets(str(networks_file), "all") == load_targets(str(networks_file))
+    assert [target["id"] for target in load_targets(str(networks_file), " beta, alpha,")] == ["beta", "alpha"]
+    with pytest.raises(ValueError, match="Unknown network id\\(s\\): gamma. Known networks: alpha, beta"):
+        load_targets(str(networks_file), "alpha,gamma")
@@ -0,0 +1,49 @@
+import multiprocessing
+import threading
+
+from plugins.metrics.timeseries import TimeSeriesStore
+from synthetic import STARTED, make_response, make_verifiers
+
+
+def write_series(path: str, node: str):
+    store = TimeSeriesStore(path)
+    for minute in range(20):
+        store.append([(STARTED + 60 * minute, "synthetic", node, "metric{0}".format(metric), minute) for metric in range(5)], STARTED + 60 * minute)
+
+
+def test_series_ids(tmp_path):
+    # Stores opened before any of the others wrote, as separate monitors would.
+    nodes = ["Node{0}".format(i) for i in range(1, 5)]
+    processes = [multiprocessing.Process(target=write_series, args=(str(tmp_path), node)) for node in nodes]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    store = TimeSeriesStore(str(tmp_path))
+    assert sorted(store.series.values()) == list(range(1, 21))
+    for node in nodes:
+        values = [record["value"] for record in store.query("synthetic", node, "metric3", 0, STARTED + 3600)]
+        assert values == list(range(20))
+
+
+def test_stale_store(tmp_path):
+    first = TimeSeriesStore(str(tmp_path))
+    second = TimeSeriesStore(str(tmp_path))
+    first.append([(STARTED, "synthetic", "Node1", "uptime", 1)], STARTED)
+    # second loaded series.json before first added to it.
+    second.append([(STARTED, "synthetic", "Node2", "uptime", 2)], STARTED)
+    store = TimeSeriesStore(str(tmp_path))
+    assert store.series == {"synthetic|Node1|uptime": 1, "synthetic|Node2|uptime": 2}
+    assert [record["value"] for record in store.query("synthetic", "Node1", "uptime", 0, STARTED + 60)] == [1]
+    assert [record["value"] for record in store.query("synthetic", "Node2", "uptime", 0, STARTED + 60)] == [2]
+
+
+def test_plugin_off_event_loop(run, monitor, tmp_path, monkeypatch):
+    local_metrics = monitor("--tslog", "--ts-dir", str(tmp_path)).get_plugin("Local Metrics")
+    threads = []
+    append = local_metrics.store.append
+    monkeypatch.setattr(local_metrics.store, "append", lambda samples, now: threads.append(threading.current_thread()) or append(samples, now))
+    run(local_metrics.perform_operation([], "synthetic", make_response(4), make_verifiers(4)))
+    assert threads and threads[0] is not threading.main_thread()
+    assert local_metrics.store.list_series()
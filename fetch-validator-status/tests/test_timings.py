@@ -0,0 +1,57 @@
+import tracemalloc
+
+import pytest
+
+from timings import Timings
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def traced():
+    timings = Timings()
+    tracing = tracemalloc.is_tracing()
+    timings.enable(trace_memory=True)
+    yield timings
+    if not tracing:
+        tracemalloc.stop()
+
+
+def peaks(timings: Timings) -> dict:
+    return {name: phase["peak_memory"] // MB for name, phase in timings.phases.items()}
+
+
+def test_nested_phases_keep_the_outer_peak(traced):
+    with traced.phase("outer"):
+        data = bytearray(20 * MB)
+        del data
+        with traced.phase("inner"):
+            data = bytearray(2 * MB)
+            del data
+    result = peaks(traced)
+    assert result["outer"] >= 20
+    assert 2 <= result["inner"] < 20
+
+
+def test_inner_peak_carried_out(traced):
+    with traced.phase("outer"):
+        with traced.phase("middle"):
+            data = bytearray(4 * MB)
+            del data
+            with traced.phase("inner"):
+                data = bytearray(20 * MB)
+                del data
+        with traced.phase("after"):
+            data = bytearray(2 * MB)
+            del data
+    result = peaks(traced)
+    assert min(result["outer"], result["middle"], result["inner"]) >= 20
+    assert result["after"] < 4
+    assert traced.open_peaks == {}
+
+
+def test_disabled():
+    timings = Timings()
+    with timings.phase("outer"):
+        pass
+    assert timings.phases == {}
@@ -0,0 +1,139 @@
+from synthetic import make_reply, make_verifiers, node_names
+from view_changes import ViewChangeTracker, vote
+
+NODES = node_names(7)
+
+
+def views(view_no: int = 0, primary: str = "Node1", changing: list = (), others: dict = None) -> dict:
+    """Every node's [view_no, vc_in_progress, replica_primaries]; others
+    gives some of the nodes a view and primary of their own."""
+    others = others or {}
+    result = {}
+    for node in NODES:
+        node_view_no, node_primary = others.get(node, (view_no, primary))
+        backup = NODES[(NODES.index(node_primary) + 1) % len(NODES)]
+        result[node] = [node_view_no, node in changing, [node_primary + ":0", backup + ":1"]]
+    return result
+
+
+def poll(tracker: ViewChangeTracker, *polls) -> list:
+    """Records polls a minute apart; returns what each of them returned."""
+    return [tracker.record("synthetic", poll_views, timestamp=60 * i) for i, poll_views in enumerate(polls)]
+
+
+def test_vote():
+    assert vote(["Node2:0", None, "Node1:0", "Node2:0"]) == ("Node2:0", 2)
+    # A tie goes to the value seen first.
+    assert vote(["Node3:0", "Node1:0"]) == ("Node3:0", 1)
+    assert vote([None, None]) == (None, 0)
+
+
+def test_agreed_on_a_quorum():
+    tracker = ViewChangeTracker()
+    # Five of seven nodes name Node1, the quorum of seven.
+    poll(tracker, views(others={"Node6": (0, "Node2"), "Node7": (0, "Node2")}))
+    stats = tracker.get_stats("synthetic")
+    assert (stats["view"], stats["primary"], stats["agreed"]) == (0, "Node1:0", True)
+    assert stats["replicas"] == ["Node1:0", "Node2:1"]
+    assert stats["primary_mismatch"] == {"Node6": "Node2:0", "Node7": "Node2:0"}
+
+
+def test_not_agreed_short_of_a_quorum():
+    tracker = ViewChangeTracker()
+    # Four name Node1, but two are changing view and one is a view behind.
+    poll(tracker, views(changing=["Node5", "Node6"], others={"Node7": (1, "Node1")}))
+    assert tracker.get_stats("synthetic")["agreed"] is False
+    # Nodes that didn't reply count towards the quorum.
+    tracker = ViewChangeTracker()
+    five = {node: view for node, view in views().items() if node in NODES[:5]}
+    tracker.record("synthetic", five, node_count=8)
+    assert tracker.get_stats("synthetic")["agreed"] is False
+
+
+def test_view_change_detected():
+    tracker = ViewChangeTracker()
+    results = poll(tracker, views(), views(changing=NODES), views(changing=NODES), views(1, "Node2"))
+    assert results[:3] == [None, None, None]
+    assert results[3] == {"from_view": 0, "to_view": 1, "from_primary": "Node1:0", "to_primary": "Node2:0", "started": 0, "detected": 60, "ended": 180, "duration": 180}
+    stats = tracker.get_stats("synthetic")
+    assert "view_change_in_progress" not in stats
+    assert stats["view_changes"] == 1
+    assert stats["view_changes_per_hour"] == 20
+    assert stats["seconds_without_primary"] == 120
+    assert (stats["mean_duration"], stats["max_duration"]) == (180, 180)
+    assert stats["last_view_change"] == results[3]
+
+
+def test_view_change_in_progress():
+    tracker = ViewChangeTracker()
+    poll(tracker, views(), views(changing=NODES[:3]))
+    stats = tracker.get_stats("synthetic")
+    assert stats["agreed"] is False
+    assert stats["view_change_in_progress"] == {"from_view": 0, "from_primary": "Node1:0", "started": 0, "detected": 60}
+    assert stats["view_changes"] == 0
+
+
+def test_view_change_between_polls():
+    tracker = ViewChangeTracker()
+    results = poll(tracker, views(), views(1, "Node2"))
+    assert results[1]["detected"] is None
+    assert results[1]["duration"] == 60
+
+
+def test_split_recovers_without_view_change():
+    tracker = ViewChangeTracker()
+    split = views(others={node: (0, "Node3") for node in NODES[3:]})
+    results = poll(tracker, views(), split, split, views())
+    assert results == [None, None, None, None]
+    stats = tracker.get_stats("synthetic")
+    assert stats["agreed"] is True
+    assert stats["view_changes"] == 0
+    assert "view_change_in_progress" not in stats
+    assert stats["seconds_without_primary"] == 120
+
+
+def test_started_without_agreement():
+    tracker = ViewChangeTracker()
+    results = poll(tracker, views(changing=NODES), views(1, "Node2"))
+    assert results == [None, None]
+    assert tracker.get_stats("synthetic")["view_changes"] == 0
+
+
+def test_rolling_buffer():
+    tracker = ViewChangeTracker(history=3)
+    poll(tracker, views(), views(1, "Node2"), views(1, "Node2"), views(1, "Node2"), views(1, "Node2"))
+    assert len(tracker.views["synthetic"]) == 3
+    stats = tracker.get_stats("synthetic")
+    assert (stats["polls"], stats["since"]) == (3, 120)
+    # The view change started before the oldest poll in the buffer.
+    assert stats["view_changes"] == 0
+    assert "last_view_change" not in stats
+
+
+def test_interned():
+    tracker = ViewChangeTracker()
+    poll(tracker, views(), views())
+    first, second = tracker.views["synthetic"]
+    # Nodes naming the same primaries share them, and so do polls that are the same.
+    assert first.primaries[0] is first.primaries[6]
+    assert second.nodes is first.nodes
+    assert second.view_nos is first.view_nos
+    assert second.primaries is first.primaries
+
+
+def test_interned_let_go():
+    tracker = ViewChangeTracker()
+    poll(tracker, *[views(i, NODES[i % 7]) for i in range(40)])
+    assert len(tracker.interned["synthetic"]) <= 4 * len(NODES)
+    assert tracker.get_stats("synthetic")["view_changes"] == 39
+
+
+def test_stream_quorum_counts_all_nodes(run, monitor):
+    # In stream mode only the nodes that replied are in pool_data; four of the seven aren't a quorum.
+    analysis = monitor("--status").get_plugin("Analysis")
+    verifiers = make_verifiers(7)
+    pool_data = analysis.new_pool_data()
+    for node in NODES[:4]:
+        run(analysis.analyze_node(node, make_reply(node, NODES), verifiers, "", pool_data))
+    summary = run(analysis.summarize(pool_data, "synthetic", NODES))
+    assert summary["summary"]["view"]["agreed"] is False
@@ -0,0 +1,114 @@
+import http.server
+import json
+import threading
+
+import pytest
+
+
+class WebhookHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.posts.setdefault(self.path, []).append(body)
+        self.send_response(self.server.statuses.get(self.path, 200))
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def webhooks():
+    """A local stand-in for the webhooks; every path is a webhook, answering
+    with the status set for it in statuses (200 by default), and its posts
+    are kept in posts."""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), WebhookHandler)
+    server.posts = {}
+    server.statuses = {}
+    server.url = "http://127.0.0.1:{0}".format(server.server_address[1])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def notifier(monitor, webhooks, tmp_path):
+    def load(*paths):
+        argv = ["--state-file", str(tmp_path / "monitor.db")]
+        for path in paths:
+            argv.extend(["--webhook", webhooks.url + path])
+        plugin = monitor(*argv).get_plugin("Webhook Notifications")
+        # No need to wait between attempts here.
+        plugin.backoff = 0
+        return plugin
+    return load
+
+
+def poll(run, plugin, errors):
+    """Run the sink on a result in which the given nodes have the given errors."""
+    result = [{"name": node, "status": {"ok": not node_errors}, "errors": node_errors} for node, node_errors in errors.items()]
+    run(plugin.perform_operation(result, "local", {node: "{}" for node in errors}, {}))
+
+
+def alerts(posts):
+    return [(alert["state"], alert["node"], alert["message"]) for post in posts for alert in post["alerts"]]
+
+
+def test_new_and_resolved_alerts_are_sent_once(run, notifier, webhooks):
+    plugin = notifier("/hook")
+    poll(run, plugin, {"Node1": ["timeout"], "Node2": []})
+    poll(run, plugin, {"Node1": ["timeout"], "Node2": []})
+    poll(run, plugin, {"Node1": [], "Node2": []})
+    poll(run, plugin, {"Node1": [], "Node2": []})
+    assert alerts(webhooks.posts["/hook"]) == [("new", "Node1", "timeout"), ("resolved", "Node1", "timeout")]
+    assert webhooks.posts["/hook"][0]["text"] == "local: 1 new and 0 resolved alert(s)"
+
+
+def test_a_rejecting_webhook_doesnt_repeat_the_alerts_of_the_others(run, notifier, webhooks, capsys):
+    webhooks.statuses["/rejects"] = 400
+    plugin = notifier("/hook", "/rejects")
+    for _ in range(3):
+        poll(run, plugin, {"Node1": ["timeout"]})
+
+    assert alerts(webhooks.posts["/hook"]) == [("new", "Node1", "timeout")]
+    # The rejected post isn't tried again, on this poll or the next.
+    assert len(webhooks.posts["/rejects"]) == 1
+    assert "rejected the alerts" in capsys.readouterr().err
+
+
+def test_a_webhook_that_is_down_gets_its_alerts_when_it_is_back(run, notifier, webhooks):
+    webhooks.statuses["/down"] = 503
+    plugin = notifier("/hook", "/down")
+    poll(run, plugin, {"Node1": ["timeout"], "Node2": []})
+    poll(run, plugin, {"Node1": ["timeout"], "Node2": ["timeout"]})
+    assert len(webhooks.posts["/down"]) == 2 * plugin.attempts
+
+    del webhooks.statuses["/down"]
+    poll(run, plugin, {"Node1": ["timeout"], "Node2": ["timeout"]})
+    poll(run, plugin, {"Node1": ["timeout"], "Node2": ["timeout"]})
+
+    expected = [("new", "Node1", "timeout"), ("new", "Node2", "timeout")]
+    assert alerts(webhooks.posts["/hook"]) == expected
+    assert alerts(webhooks.posts["/down"][-1:]) == expected
+    assert len(webhooks.posts["/down"]) == 2 * plugin.attempts + 1
+
+
+def test_undelivered_alerts_are_kept_between_runs(run, notifier, webhooks):
+    webhooks.statuses["/down"] = 503
+    poll(run, notifier("/down"), {"Node1": ["timeout"]})
+
+    # The next run, i.e. from cron, with the webhook back up.
+    del webhooks.statuses["/down"]
+    poll(run, notifier("/down"), {"Node1": []})
+    assert alerts(webhooks.posts["/down"][-1:]) == [("new", "Node1", "timeout"), ("resolved", "Node1", "timeout")]
+
+
+def test_alerts_are_batched(run, notifier, webhooks):
+    plugin = notifier("/hook")
+    plugin.batch_size = 2
+    poll(run, plugin, {"Node{0}".format(i): ["timeout"] for i in range(5)})
+    # The batches are posted concurrently.
+    assert sorted(len(post["alerts"]) for post in webhooks.posts["/hook"]) == [1, 2, 2]
+    assert sorted(node for _, node, _ in alerts(webhooks.posts["/hook"])) == ["Node{0}".format(i) for i in range(5)]
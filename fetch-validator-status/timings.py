@@ -0,0 +1,105 @@
+import contextlib
+import json
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+
+class Timings(object):
+    """Records the wall time, CPU time and peak memory of the phases of a run
+    (opening the pool, the ledger request, each plug-in, ...) and the latency
+    of each node's reply.  Recording is a no-op until the timings are enabled.
+
+    CPU time and memory are measured for the whole process, so they include
+    whatever else was running on the event loop while a phase was awaiting.
+    The peak memory of a phase includes that of the phases started within it.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        # The highest peak memory of each open phase that a phase started within it has reset.
+        self.open_peaks = {}
+        self.reset()
+
+    def enable(self, trace_memory: bool = False):
+        self.enabled = True
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def reset(self):
+        self.phases = {}
+        self.node_latencies = {}
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        token = None
+        if tracemalloc.is_tracing() and hasattr(tracemalloc, "reset_peak"):
+            # The phases already open keep the peak they had so far.
+            self.carry_peak(tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            token = object()
+            self.open_peaks[token] = 0
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            peak_memory = self.peak_memory()
+            if token is not None:
+                peak_memory = max(peak_memory, self.open_peaks.pop(token))
+                self.carry_peak(peak_memory)
+            self.record(name, time.perf_counter() - wall, time.process_time() - cpu, peak_memory)
+
+    def carry_peak(self, peak_memory: int):
+        for token, peak in self.open_peaks.items():
+            self.open_peaks[token] = max(peak, peak_memory)
+
+    def record(self, name: str, wall: float, cpu: float, peak_memory: int = None):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = {"count": 0, "wall": 0.0, "cpu": 0.0, "max_wall": 0.0}
+        phase["count"] += 1
+        phase["wall"] += wall
+        phase["cpu"] += cpu
+        phase["max_wall"] = max(phase["max_wall"], wall)
+        if peak_memory is not None:
+            phase["peak_memory"] = max(phase.get("peak_memory", 0), peak_memory)
+
+    def node_latency(self, network_name: str, node: str, seconds: float):
+        if self.enabled:
+            self.node_latencies.setdefault(network_name or "pool", {})[node] = round(seconds, 6)
+
+    @staticmethod
+    def peak_memory():
+        """Peak memory in bytes; traced Python allocations when tracemalloc is
+        running, otherwise the peak resident set size of the process.
+        """
+        if tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()[1]
+        if resource:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # Linux reports kilobytes, macOS bytes.
+            return peak if sys.platform == "darwin" else peak * 1024
+        return None
+
+    def to_dict(self) -> dict:
+        phases = {}
+        for name, phase in self.phases.items():
+            phases[name] = {key: round(value, 6) if isinstance(value, float) else value for key, value in phase.items()}
+        return {"phases": phases, "node_latency": self.node_latencies}
+
+    def dump(self):
+        if self.enabled:
+            print(json.dumps({"timings": self.to_dict()}, indent=2), file=sys.stderr, flush=True)
+
+
+timings = Timings()
@@ -0,0 +1,176 @@
+import collections
+import sys
+import time
+from typing import Tuple
+
+from connectivity import bft_quorum
+
+
+def vote(values) -> Tuple[any, int]:
+    """The most common of the values, None left out, and the number of times
+    it occurs.  A tie goes to the value seen first."""
+    counts = collections.Counter(value for value in values if value is not None)
+    if not counts:
+        return None, 0
+    return counts.most_common(1)[0]
+
+
+class PoolView(object):
+    """The view of every node of a pool at one poll; each node's view number,
+    whether it is changing view, and the primary of each of its replicas
+    (instance 0 being the master).  The view number and primary of the pool
+    are those of most of its nodes.  The primary is agreed when a quorum
+    (n - f) of the pool's nodes are in the same view, not changing view, and
+    name the same primary.
+
+    A view shares its tuples with the view before it when they are the same,
+    and the nodes' primaries are interned, so a pool whose view doesn't
+    change costs next to nothing to keep.  Which nodes are changing view is
+    kept as a bitset, bit i being node i.
+    """
+
+    __slots__ = ("timestamp", "nodes", "view_nos", "in_progress", "primaries", "view_no", "primary", "agreed")
+
+    def __init__(self, timestamp: float, nodes: tuple, view_nos: tuple, in_progress: int, primaries: tuple, node_count: int):
+        self.timestamp = timestamp
+        self.nodes = nodes
+        self.view_nos = view_nos
+        self.in_progress = in_progress
+        self.primaries = primaries
+        self.view_no, _ = vote(view_nos)
+        self.primary, _ = vote(self.master_primaries())
+        agreeing = sum(1 for i, (view_no, primary) in enumerate(zip(view_nos, self.master_primaries())) if (view_no == self.view_no) and not ((in_progress >> i) & 1) and (primary == self.primary))
+        self.agreed = (self.primary is not None) and (agreeing >= bft_quorum(node_count))
+
+    def master_primaries(self) -> list:
+        return [replicas[0] if replicas else None for replicas in self.primaries]
+
+    def replica_primaries(self) -> list:
+        """The primary of each replica, by majority vote."""
+        instances = max((len(replicas) for replicas in self.primaries), default=0)
+        return [vote(replicas[instance] for replicas in self.primaries if instance < len(replicas))[0] for instance in range(instances)]
+
+    def disagreeing(self) -> dict:
+        """The nodes whose master primary isn't the pool's primary."""
+        return {node: primary for node, primary in zip(self.nodes, self.master_primaries()) if (primary is not None) and (primary != self.primary)}
+
+
+class ViewChangeTracker(object):
+    """Follows the view and primary of each network from poll to poll, in
+    rolling buffers of the last history polls and view changes, so it can be
+    left running in a long lived process (--daemon).
+
+    A view change starts at the last poll the old primary was agreed on, and
+    ends at the first poll on which a new view or primary is agreed on, so
+    its duration is an upper bound, to within the time between polls.  A view
+    change that is seen to be under way (detected) is also timed from there.
+    A pool that loses its agreed primary and gets it back, without changing
+    view, isn't counted as a view change, but still counts towards the time
+    it went without one.
+    """
+
+    def __init__(self, history: int = 1000):
+        self.history = max(2, history)
+        self.views = {}
+        self.view_changes = {}
+        # The view change under way on each network, if any.
+        self.pending = {}
+        # The replica primaries of each network's nodes, so nodes naming the same primaries share them.
+        self.interned = {}
+
+    def record(self, network_name: str, views: dict, node_count: int = None, timestamp: float = None) -> dict:
+        """Add a poll of the network; views is each node's [view_no,
+        vc_in_progress, replica_primaries].  Returns the view change that the
+        poll completed, if any."""
+        network_name = network_name or ""
+        timestamp = time.time() if timestamp is None else timestamp
+        history = self.views.setdefault(network_name, collections.deque(maxlen=self.history))
+        last = history[-1] if history else None
+        interned = self.interned.setdefault(network_name, {})
+        nodes = tuple(views)
+        view_nos = tuple(views[node][0] for node in nodes)
+        in_progress = sum(1 << i for i, node in enumerate(nodes) if views[node][1])
+        primaries = []
+        for node in nodes:
+            replicas = tuple(sys.intern(primary) if isinstance(primary, str) else None for primary in views[node][2])
+            primaries.append(interned.setdefault(replicas, replicas))
+        primaries = tuple(primaries)
+        if last:
+            nodes = last.nodes if nodes == last.nodes else nodes
+            view_nos = last.view_nos if view_nos == last.view_nos else view_nos
+            primaries = last.primaries if primaries == last.primaries else primaries
+        if len(interned) > 4 * len(nodes):
+            # Let go of the primaries of views gone by.
+            interned.clear()
+        view = PoolView(timestamp, nodes, view_nos, in_progress, primaries, node_count or len(nodes))
+        history.append(view)
+
+        pending = self.pending.get(network_name)
+        if pending is None:
+            if last is None:
+                if not view.agreed:
+                    # Started without an agreed primary; there's no view to have changed from.
+                    self.pending[network_name] = {"from_view": None, "from_primary": None, "started": None, "detected": timestamp}
+                return None
+            if not last.agreed:
+                return None
+            pending = {"from_view": last.view_no, "from_primary": last.primary, "started": last.timestamp, "detected": None}
+            if not view.agreed:
+                pending["detected"] = timestamp
+                self.pending[network_name] = pending
+                return None
+        elif not view.agreed:
+            return None
+
+        self.pending.pop(network_name, None)
+        if (pending["from_view"] is None) or ((view.view_no == pending["from_view"]) and (view.primary == pending["from_primary"])):
+            return None
+        view_change = {
+            "from_view": pending["from_view"],
+            "to_view": view.view_no,
+            "from_primary": pending["from_primary"],
+            "to_primary": view.primary,
+            "started": pending["started"],
+            "detected": pending["detected"],
+            "ended": timestamp,
+            "duration": round(timestamp - pending["started"], 3),
+        }
+        self.view_changes.setdefault(network_name, collections.deque(maxlen=self.history)).append(view_change)
+        return view_change
+
+    def get_stats(self, network_name: str) -> dict:
+        """The network's current view and primary, and its view changes over
+        the polls in the buffer."""
+        network_name = network_name or ""
+        history = self.views.get(network_name)
+        if not history:
+            return {}
+        view = history[-1]
+        since = history[0].timestamp
+        span = view.timestamp - since
+        view_changes = [view_change for view_change in self.view_changes.get(network_name, ()) if view_change["started"] >= since]
+        durations = [view_change["duration"] for view_change in view_changes]
+        without_primary = sum(later.timestamp - earlier.timestamp for earlier, later in zip(history, list(history)[1:]) if not earlier.agreed)
+
+        stats = {
+            "view": view.view_no,
+            "primary": view.primary,
+            "agreed": view.agreed,
+            "replicas": view.replica_primaries(),
+            "polls": len(history),
+            "since": since,
+            "view_changes": len(view_changes),
+            "view_changes_per_hour": round(len(view_changes) * 3600 / span, 3) if span else None,
+            "seconds_without_primary": round(without_primary, 3),
+        }
+        if durations:
+            stats["mean_duration"] = round(sum(durations) / len(durations), 3)
+            stats["max_duration"] = max(durations)
+            stats["last_view_change"] = view_changes[-1]
+        pending = self.pending.get(network_name)
+        if pending:
+            stats["view_change_in_progress"] = pending
+        disagreeing = view.disagreeing()
+        if disagreeing:
+            stats["primary_mismatch"] = disagreeing
+        return stats